@@ -4,10 +4,5 @@
 DATABASE=${1:-"lc_commons.db"}
 OUTPUT=${2:-"lc_commons_loans_over_time.csv"}
 
-# Loans by ID over time.
-sqlite3 $DATABASE <<!
-.headers on
-.mode csv
-.output $OUTPUT
-select * from loansFundedAsOfDate order by id, asOfDate;
-!
+# Loans by ID over time; see `python run.py --help` for filters and watermarks.
+python "$(dirname "$0")/../run.py" --database "$DATABASE" --export "$OUTPUT"
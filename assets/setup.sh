@@ -25,5 +25,8 @@ pip install python-dateutil
 ## add to venv/bin/activate:
 ## export PYTHONPATH="/path/to/lc_commons"
 
-# make database.
-sqlite3 lc_commons.db < assets/db_schema.sql
+# make (or upgrade) database.
+## requires SQLite 3.31+ in python's sqlite3 module; 14.04 ships 3.8, so
+## build python against a newer libsqlite3 (or use a newer release) first.
+python -c "import sqlite3; print sqlite3.sqlite_version"
+python run.py --migrate
@@ -0,0 +1,3 @@
+"""Benchmarks for Lending Club Commons. Each module may be executed with the
+`-m` switch from top-level directory, e.g. `python -m benchmarks.loan_batch`.
+"""
@@ -0,0 +1,49 @@
+"""Compares parsing a listing response into Loan instances against LoanBatch,
+including producing the tuples passed to `executemany`.
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import make_response
+from main.loans import Loan, LoanBatch
+
+
+SIZES = (1000, 10000, 100000)
+
+
+def parse_loans(response_json):
+    asOfDate = response_json['asOfDate']
+    loans = [Loan(asOfDate, loan) for loan in response_json['loans']]
+    raw = [loan.get_raw_loans_tuple() for loan in loans]
+    funded = [loan.get_funded_tuple() for loan in loans]
+    return raw, funded
+
+
+def parse_loan_batch(response_json):
+    batch = LoanBatch(response_json['asOfDate'], response_json['loans'])
+    raw = list(batch.get_raw_loans_tuples())
+    funded = list(batch.get_funded_tuples())
+    return raw, funded
+
+
+def _time(function, *args):
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+def main(sizes=SIZES):
+    print "%10s %12s %12s %8s" % ("loans", "Loan (s)", "LoanBatch (s)", "gain")
+
+    for size in sizes:
+        response_json = make_response(size)
+        loan_time = _time(parse_loans, response_json)
+        batch_time = _time(parse_loan_batch, response_json)
+        print "%10d %12.3f %12.3f %7.1fx" % (
+            size, loan_time, batch_time, loan_time / batch_time
+        )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
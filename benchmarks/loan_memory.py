@@ -0,0 +1,48 @@
+"""Compares per-loan memory footprint of the previous dictionary-backed Loan
+representation against the LoanRecord-backed Loan.
+Only container overhead is counted: field values are shared between both.
+"""
+
+import sys
+
+from benchmarks.synthetic import make_response
+from main.loans import Loan
+
+
+class _DictLoan(object):
+    """Previous representation: a per-instance `values` dictionary."""
+
+    def __init__(self, loan):
+        self.values = dict(loan.iteritems())
+
+
+def dict_loan_size(loan):
+    dict_loan = _DictLoan(loan)
+    return (
+        sys.getsizeof(dict_loan) +
+        sys.getsizeof(dict_loan.__dict__) +
+        sys.getsizeof(dict_loan.values)
+    )
+
+
+def record_loan_size(loan):
+    return sys.getsizeof(loan) + sys.getsizeof(loan.record)
+
+
+def main(count=1000):
+    response_json = make_response(count)
+    loans = [
+        Loan(response_json['asOfDate'], loan)
+        for loan in response_json['loans']
+    ]
+    before = sum(dict_loan_size(loan) for loan in loans) / float(count)
+    after = sum(record_loan_size(loan) for loan in loans) / float(count)
+
+    print "%-24s %10s" % ("representation", "bytes/loan")
+    print "%-24s %10.0f" % ("dict (values)", before)
+    print "%-24s %10.0f" % ("LoanRecord", after)
+    print "%-24s %9.1fx" % ("reduction", before / after)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,235 @@
+"""Times the collector's main paths on synthetic listings of each size:
+parsing loans, inserting them, reading them back and scoring them (per loan and
+with `analytics.FundingVelocity`). Results are printed and written as JSON
+(`--output`), so runs of different versions can be compared with `--compare`.
+e.g. `python -m benchmarks.suite --output before.json`.
+"""
+
+import argparse
+import config
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import timeit
+
+from benchmarks.synthetic import make_snapshots
+from main import analytics, database, dates
+from main.loans import Loan, LoanBatch
+
+
+SIZES = (1000, 10000, 100000)
+SNAPSHOTS = 3  # Snapshots inserted per size, giving each loan a history.
+
+
+def _get_revision():
+    """Return git revision of the working tree, or NoneType."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=open(os.devnull, 'w')
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _time(function, repeat=1):
+    """Return best of `repeat` timings of calling `function`, and its result."""
+    best = None
+    for _ in xrange(repeat):
+        start = timeit.default_timer()
+        result = function()
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def parse_loans(response_json):
+    asOfDate = response_json['asOfDate']
+    return [Loan(asOfDate, loan) for loan in response_json['loans']]
+
+
+def parse_loan_batch(response_json):
+    return LoanBatch(response_json['asOfDate'], response_json['loans'])
+
+
+def insert_snapshots(db_conn, batches):
+    """Insert each batch as `storage.SqliteStorage` does, one transaction
+    apiece.
+    """
+    tracker = database.RawLoanTracker()
+    tracker.seed(db_conn)
+
+    for batch in batches:
+        with db_conn.transaction():
+            database.add_raw_loan_dates(batch.asOfDate, db_conn)
+            new, statuses = tracker.split(batch)
+            if len(new):
+                database.add_raw_loans(new, db_conn)
+                tracker.apply(new)
+            if statuses:
+                database.update_raw_loan_statuses(statuses, db_conn)
+            database.add_loans_funded_as_of_date(batch, db_conn)
+            database.add_loan_funding_summary(
+                batch.get_funded_tuples(), db_conn
+            )
+
+
+def score_loans(db_conn):
+    return [
+        loan.get_daily_funding_score()
+        for loan in database.iter_loans_over_time(db_conn)
+    ]
+
+
+def run_size(size, directory, repeat=1):
+    """Return list of result dictionaries for listings of `size` loans."""
+    snapshots = list(make_snapshots(size, SNAPSHOTS, seed=size))
+    epoch_snapshots = [
+        {'asOfDate': dates.get_epoch(response['asOfDate']),
+         'loans': response['loans']}
+        for response in snapshots
+    ]
+    rows = size * SNAPSHOTS
+    results = []
+
+    def add(name, seconds, count):
+        results.append({
+            'name': name,
+            'loans': size,
+            'count': count,
+            'seconds': round(seconds, 6),
+            'per_second': round(count / seconds, 1) if seconds else None
+        })
+
+    seconds, _ = _time(lambda: parse_loans(snapshots[0]), repeat)
+    add("parse_loans", seconds, size)
+
+    seconds, _ = _time(lambda: parse_loan_batch(epoch_snapshots[0]), repeat)
+    add("parse_loan_batch", seconds, size)
+
+    batches = [parse_loan_batch(response) for response in epoch_snapshots]
+    path = os.path.join(directory, "benchmark-%s.db" % size)
+    with database.SqliteDatabase(path=path) as db_conn:
+        database.migrate(db_conn)
+
+    with database.SqliteDatabase(
+        path=path,
+        pragmas=config.DATABASE_PRAGMAS
+    ) as db_conn:
+        seconds, _ = _time(lambda: insert_snapshots(db_conn, batches))
+        add("insert_snapshots", seconds, rows)
+
+        seconds, loans = _time(lambda: database.get_loans(db_conn), repeat)
+        add("get_loans", seconds, len(loans))
+        del loans
+
+        seconds, scores = _time(lambda: score_loans(db_conn), repeat)
+        add("daily_funding_score", seconds, len(scores))
+
+        seconds, velocity = _time(
+            lambda: analytics.FundingVelocity.from_database(db_conn)
+            .get_daily_funding_scores(),
+            repeat
+        )
+        add("funding_velocity", seconds, len(velocity))
+
+    os.remove(path)
+    return results
+
+
+def compare(before, after):
+    """Print change in time of each benchmark of `after` relative to `before`,
+    both results as written by `main`.
+    """
+    previous = dict(
+        ((result['name'], result['loans']), result['seconds'])
+        for result in before['results']
+    )
+    print "%-20s %10s %12s %12s %8s" % (
+        "benchmark", "loans", "before (s)", "after (s)", "change"
+    )
+
+    for result in after['results']:
+        key = (result['name'], result['loans'])
+        if key not in previous:
+            continue
+        print "%-20s %10d %12.3f %12.3f %+7.1f%%" % (
+            result['name'],
+            result['loans'],
+            previous[key],
+            result['seconds'],
+            (result['seconds'] / previous[key] - 1) * 100
+        )
+
+
+def main(sizes=SIZES, repeat=1, output=None):
+    directory = tempfile.mkdtemp()
+    results = []
+
+    print "%-20s %10s %10s %12s %14s" % (
+        "benchmark", "loans", "count", "seconds", "per second"
+    )
+    try:
+        for size in sizes:
+            for result in run_size(size, directory, repeat):
+                print "%-20s %10d %10d %12.3f %14.1f" % (
+                    result['name'],
+                    result['loans'],
+                    result['count'],
+                    result['seconds'],
+                    result['per_second'] or 0
+                )
+                results.append(result)
+    finally:
+        shutil.rmtree(directory)
+
+    report = {
+        'revision': _get_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': int(time.time()),
+        'results': results
+    }
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--compare",
+        help="Results file of a previous run to compare against."
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        help="Path to write results to as JSON."
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        default=1,
+        help="Times to repeat each read-only benchmark, keeping the best.",
+        type=int
+    )
+    parser.add_argument(
+        "sizes",
+        help="Numbers of loans per listing.",
+        nargs="*",
+        type=int
+    )
+    args = parser.parse_args()
+
+    report = main(args.sizes or SIZES, repeat=args.repeat, output=args.output)
+
+    if args.compare:
+        with open(args.compare) as compare_file:
+            print
+            compare(json.load(compare_file), report)
@@ -0,0 +1,217 @@
+"""Generates synthetic Lending Club API listing responses, driven by
+`Loan.attributes`.
+Values follow roughly the distributions of real listings: loan amounts in
+multiples of $25, interest rates and installments consistent with grade and
+term, FICO ranges, dates relative to `asOfDate`, and sparse delinquency fields.
+`make_snapshots` produces a series of responses in which loans fund gradually,
+fully funded loans drop off and new loans are listed.
+"""
+
+import random
+import time
+
+from main.loans import Loan, _get_epoch, _get_float, _get_int
+
+
+_AS_OF_DATE = "2015-01-01T17:39:34.411-08:00"
+_AS_OF_EPOCH = 1420162774
+_DAY = 86400
+
+_GRADES = "ABCDEFG"
+_GRADE_WEIGHTS = (19, 29, 27, 15, 7, 2, 1)
+_GRADE_RATES = (7.0, 11.0, 14.0, 17.5, 20.5, 24.0, 26.0)
+_HOME_OWNERSHIP = ("MORTGAGE", "MORTGAGE", "RENT", "RENT", "OWN")
+_INCOME_VERIFICATION = ("VERIFIED", "SOURCE_VERIFIED", "NOT_VERIFIED")
+_JOB_TITLES = (
+    "Teacher", "Manager", "Registered Nurse", "Driver", "Owner", "Supervisor",
+    "Sales", "Project Manager", "Engineer", "Office Manager", "Director"
+)
+_PURPOSES = (
+    "debt_consolidation", "debt_consolidation", "debt_consolidation",
+    "credit_card", "credit_card", "home_improvement", "other", "major_purchase",
+    "small_business", "car", "medical", "moving", "vacation", "house"
+)
+_STATES = (
+    "CA", "CA", "CA", "NY", "NY", "TX", "TX", "FL", "FL", "IL", "NJ", "PA",
+    "OH", "GA", "VA", "NC", "MI", "MA", "MD", "AZ", "WA", "CO", "MN", "OR"
+)
+
+# Integer columns that are balances or limits, rather than small counts.
+_BALANCE_SUFFIXES = ("Bal", "Buy", "Lim", "Limit", "Mort", "CollAmt")
+
+
+def _format_date(epoch):
+    """Return `epoch` formatted as the API does, in Pacific time."""
+    return time.strftime(
+        "%Y-%m-%dT%H:%M:%S.000-08:00", time.gmtime(epoch - 8 * 3600)
+    )
+
+
+def _installment(amount, rate, term):
+    monthly = rate / 1200.0
+    return round(amount * monthly / (1 - (1 + monthly) ** -term), 2)
+
+
+def _nullable(rand, probability, value):
+    """Return NoneType with `probability`, otherwise `value`."""
+    return None if rand.random() < probability else value
+
+
+def _make_value(key, cast, rand, asOfEpoch):
+    """Return a random raw value of `key` for columns without a dedicated
+    generator in `make_loan`.
+    """
+    if cast is _get_epoch:
+        return _format_date(asOfEpoch - rand.randint(0, 14 * _DAY))
+    elif cast is _get_int:
+        if key.startswith('mths') or key.startswith('mo'):
+            return _nullable(rand, 0.5, rand.randint(1, 120))
+        elif key.endswith(_BALANCE_SUFFIXES):
+            return int(rand.lognormvariate(9.5, 1.2))
+        return rand.choice((0, 0, 0, 1, 1, 2, 3, 5, 8, 13))
+    elif cast is _get_float:
+        return round(rand.uniform(0, 100), 1)
+    return None
+
+
+def _weighted_choice(rand, values, weights):
+    point = rand.uniform(0, sum(weights))
+    for value, weight in zip(values, weights):
+        point -= weight
+        if point <= 0:
+            return value
+    return values[-1]
+
+
+def make_loan(loan_id, rand, asOfEpoch=_AS_OF_EPOCH):
+    """Return loan dictionary `loan_id` as in the API response, listed within
+    the two weeks before `asOfEpoch`, with no funding yet.
+    """
+    loan = dict(
+        (key, _make_value(key, cast, rand, asOfEpoch))
+        for key, cast in Loan.attributes.iteritems()
+        if key != 'asOfDate'
+    )
+
+    grade = _weighted_choice(rand, _GRADES, _GRADE_WEIGHTS)
+    sub_grade = rand.randint(1, 5)
+    rate = round(
+        _GRADE_RATES[_GRADES.index(grade)] + sub_grade * 0.6 +
+        rand.uniform(-0.3, 0.3),
+        2
+    )
+    term = 60 if rand.random() < 0.3 else 36
+    amount = int(rand.lognormvariate(9.3, 0.6)) // 25 * 25
+    amount = min(35000, max(1000, amount))
+    listD = asOfEpoch - rand.randint(0, 14 * _DAY)
+    fico_low = min(845, 660 + 5 * int(rand.expovariate(1 / 8.0)))
+
+    loan.update({
+        'acceptD': _format_date(listD - rand.randint(3600, 2 * _DAY)),
+        'addrState': rand.choice(_STATES),
+        'addrZip': "%03dxx" % rand.randint(10, 999),
+        'annualInc': round(rand.lognormvariate(11.0, 0.5), -2),
+        'creditPullD': _format_date(listD - rand.randint(_DAY, 10 * _DAY)),
+        'desc': _nullable(
+            rand, 0.9, "Borrower added on %s > Consolidating." % listD
+        ),
+        'dti': round(rand.uniform(0, 35), 2),
+        'earliestCrLine': _format_date(
+            listD - rand.randint(3 * 365, 30 * 365) * _DAY
+        ),
+        'empLength': _nullable(rand, 0.05, rand.randint(0, 120)),
+        'empTitle': _nullable(rand, 0.06, rand.choice(_JOB_TITLES)),
+        'expD': _format_date(listD + 14 * _DAY),
+        'expDefaultRate': round(rate / 4.0, 2),
+        'ficoRangeHigh': fico_low + 4,
+        'ficoRangeLow': fico_low,
+        'fundedAmount': 0.0,
+        'grade': grade,
+        'homeOwnership': rand.choice(_HOME_OWNERSHIP),
+        'id': loan_id,
+        'ilsExpD': _format_date(listD + 12 * 3600),
+        'initialListStatus': "F" if rand.random() < 0.6 else "W",
+        'installment': _installment(amount, rate, term),
+        'intRate': rate,
+        'investorCount': 0,
+        'isIncV': rand.choice(_INCOME_VERIFICATION),
+        'listD': _format_date(listD),
+        'loanAmount': float(amount),
+        'memberId': 10000000 + loan_id * 7 % 9000000,
+        'purpose': rand.choice(_PURPOSES),
+        'reviewStatus': "APPROVED" if rand.random() < 0.97 else "NOT_APPROVED",
+        'reviewStatusD': _format_date(listD + rand.randint(0, _DAY)),
+        'serviceFeeRate': 1.0 if term == 36 else 1.2,
+        'subGrade': "%s%s" % (grade, sub_grade),
+        'term': term
+    })
+    return loan
+
+
+def make_loans(count, seed=0, asOfEpoch=_AS_OF_EPOCH):
+    """Return list of `count` loan dictionaries as in the API response, each
+    partly funded.
+    """
+    rand = random.Random(seed)
+    loans = []
+
+    for loan_id in xrange(1, count + 1):
+        loan = make_loan(loan_id, rand, asOfEpoch)
+        loan['fundedAmount'] = rand.randint(
+            0, int(loan['loanAmount']) // 25
+        ) * 25.0
+        loan['investorCount'] = int(loan['fundedAmount'] // 40)
+        loans.append(loan)
+
+    return loans
+
+
+def make_response(count, seed=0):
+    """Return dictionary JSON as `api.get_listed_loans` would, with `count`
+    loans.
+    """
+    return {'asOfDate': _AS_OF_DATE, 'loans': make_loans(count, seed=seed)}
+
+
+def make_snapshots(count, snapshots, interval=60, seed=0):
+    """Generator yielding `snapshots` responses, `interval` seconds apart, of
+    about `count` loans each. Each loan funds at its own rate, in $25 notes,
+    and is delisted once fully funded; new loans are listed in its place.
+    """
+    rand = random.Random(seed)
+    asOfEpoch = _AS_OF_EPOCH
+    loans = make_loans(count, seed=seed)
+    # Dollars funded per second; most loans fill in days, a few in minutes.
+    rates = dict(
+        (loan['id'], rand.lognormvariate(-3.0, 1.5)) for loan in loans
+    )
+    next_id = count + 1
+
+    for _ in xrange(snapshots):
+        yield {'asOfDate': _format_date(asOfEpoch), 'loans': list(loans)}
+
+        asOfEpoch += interval
+        listed = []
+        for loan in loans:
+            notes = int(rates[loan['id']] * interval / 25 + rand.random())
+            if notes:
+                loan = dict(loan)
+                loan['fundedAmount'] = min(
+                    loan['loanAmount'],
+                    loan['fundedAmount'] + notes * 25
+                )
+                loan['investorCount'] += notes
+
+            if loan['fundedAmount'] < loan['loanAmount']:
+                listed.append(loan)
+            else:
+                del rates[loan['id']]
+
+        while len(listed) < count:
+            loan = make_loan(next_id, rand, asOfEpoch)
+            loan['listD'] = _format_date(asOfEpoch)
+            rates[next_id] = rand.lognormvariate(-3.0, 1.5)
+            listed.append(loan)
+            next_id += 1
+
+        loans = listed
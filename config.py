@@ -2,6 +2,50 @@
 API_URL = "https://api.lendingclub.com/api/investor/v1"
 API_LOANS_URI = "/loans/listing"
 API_TOKEN = ""
+API_BACKOFF = 1.0  # Seconds; base of jittered exponential backoff.
+API_BACKOFF_MAX = 10.0  # Seconds; cap on any single backoff.
+API_CONNECT_TIMEOUT = 5.0  # Seconds.
+API_DEADLINE = None  # Seconds all attempts may take; else POLLING_INTERVAL.
+API_POOL_SIZE = 2  # Keep-alive connections kept per host.
+API_READ_TIMEOUT = 20.0  # Seconds.
+API_RETRIES = 3  # Retries on connection errors, timeouts, 5xx and 429.
+ARCHIVE_COMPRESS_LEVEL = 1  # zlib level; higher is smaller but slower.
+ARCHIVE_PATH = None  # Directory raw responses are archived to; None is off.
+ARCHIVE_SEGMENT_BYTES = 67108864  # Archive segment size before rotating.
+COMPACT_AFTER = 2592000  # Seconds after a loan's last snapshot it is compacted.
+COMPACT_BATCH_SIZE = 500  # Loans compacted per transaction.
+COMPACT_INTERVAL = None  # Seconds between background compactions; None is off.
+COMPACT_PAUSE = 0.1  # Seconds slept between compaction batches.
+COMPACT_SAMPLE_INTERVAL = 3600  # Seconds per snapshot kept besides changes; 0 is none.
 DATABASE = "lc_commons.db"
+DATABASE_FETCH_SIZE = 10000  # Rows fetched at a time by streaming readers.
+DATABASE_PRAGMAS = (  # Applied to the collector's ingest connection.
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000)
+)
+EPOCH_CACHE_SIZE = 65536  # Date strings memoized by main.dates.
+EXPORT_COMPRESS_LEVEL = 6  # gzip level of exports to paths ending with ".gz".
+FUNDING_CHANGES_ONLY = False  # Record funding deltas instead of snapshots.
+LOG_BACKGROUND = True  # Write log records on a listener thread.
+LOG_BACKUP_COUNT = 5  # Rotated log files kept.
+LOG_FULL_PAYLOADS = False  # Log whole API payloads rather than a summary.
+LOG_MAX_BYTES = 10485760  # Log file size at which it is rotated.
 LOG_PATH = "lc_commons.log"
+LOG_PAYLOAD_PREVIEW = 200  # Characters of a summarized payload logged.
+LOG_QUEUE_SIZE = 10000  # Records queued for the listener before dropping.
+METRICS_PATH = None  # Prometheus textfile refreshed each cycle; None is off.
+PARTITION_PATH = None  # Directory of per-month snapshot databases; None is off.
+PIPELINE_QUEUE_SIZE = 2  # Snapshots queued for the writer before skipping fetches.
+POLLING_ADAPTIVE = False  # Poll on a schedule learnt from listing drops.
+POLLING_BUDGET = 60  # Requests an hour, on average, when polling adaptively.
 POLLING_INTERVAL = 60
+POLLING_MAX_INTERVAL = 300  # Seconds; adaptive backoff while unchanged.
+POLLING_MIN_INTERVAL = 10  # Seconds; adaptive polling around listing drops.
+QUERY_CACHE_SIZE = 128  # Pages kept by main.query.QueryCache.
+QUERY_PAGE_SIZE = 100  # Rows per page of main.query.get_page.
+REPLAY_TRANSACTION_SIZE = 100  # Snapshots written per transaction by replay.
+REPLAY_WORKERS = None  # Replay parsing processes; None is one per CPU.
+STREAM_CHUNK_SIZE = 500  # Loans parsed and inserted at a time when streaming.
+STREAM_LISTINGS = False  # Decode listing responses incrementally.
+STREAM_READ_SIZE = 65536  # Bytes read from the response at a time.
@@ -0,0 +1,133 @@
+"""Includes funding-velocity analytics over the whole recorded history.
+`FundingVelocity` holds per-loan funding statistics column-wise (aggregated by
+SQLite in one grouped pass, see `database.iter_funding_stats`) and derives
+`amountLeft`, `dateDifference`, `fundedRate` and the daily funding score for
+every loan at once. Results match building a `LoanOverTime` per loan (with
+`database.iter_loans_over_time`) and calling `get_daily_funding_score`,
+including its integer division of `DAY_EPOCH` by `dateDifference`.
+"""
+
+import database
+
+from array import array
+from itertools import izip
+from loans import DAY_EPOCH
+from operator import sub
+
+
+class FundingVelocity(object):
+    """Funding statistics of all loans, stored column-wise: ids, timestamps
+    and counts as integer arrays, amounts as float arrays with a null mask.
+    Derived columns are computed on first use.
+    """
+    # (name, array typecode, nullable), in the order of `iter_funding_stats`.
+    fields = (
+        ('id', 'l', False),
+        ('loanAmount', 'd', True),
+        ('amountStart', 'd', True),
+        ('amountEnd', 'd', True),
+        ('dateStart', 'l', False),
+        ('dateEnd', 'l', False),
+        ('snapshots', 'l', False)
+    )
+
+    def __init__(self, chunks):
+        """Initialized with `chunks`, an iterable of lists of rows as yielded
+        by `database.iter_funding_stats`.
+        """
+        self.columns = dict(
+            (name, array(typecode)) for name, typecode, _ in self.fields
+        )
+        self.nulls = dict(
+            (name, bytearray()) for name, _, nullable in self.fields if nullable
+        )
+        self._derived = None
+
+        for rows in chunks:
+            for index, (name, _, nullable) in enumerate(self.fields):
+                values = [row[index] for row in rows]
+                if nullable:
+                    self.nulls[name].extend(
+                        1 if value is None else 0 for value in values
+                    )
+                    values = [value or 0 for value in values]
+                self.columns[name].extend(values)
+
+    @classmethod
+    def from_database(cls, db_conn, size=None):
+        """Return FundingVelocity of every loan recorded in `db_conn`."""
+        return cls(database.iter_funding_stats(db_conn, size=size))
+
+    @classmethod
+    def from_storage(cls, storage, size=None):
+        """Return FundingVelocity of every loan recorded in `storage`, a
+        `storage.Storage`.
+        """
+        return cls(storage.iter_funding_stats(size=size))
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def _derive(self):
+        """Compute derived columns in a single pass over the base columns.
+        Loans without a `loanAmount` (on which `LoanOverTime` would raise) have
+        NoneType `amountLeft`, `fundedRate` and score.
+        """
+        dateDifference = array(
+            'l', map(sub, self.columns['dateEnd'], self.columns['dateStart'])
+        )
+        amountLeft = []
+        fundedRate = []
+        score = []
+
+        for loanAmount, loanNull, amountStart, amountEnd, difference in izip(
+            self.columns['loanAmount'],
+            self.nulls['loanAmount'],
+            self.columns['amountStart'],
+            self.columns['amountEnd'],
+            dateDifference
+        ):
+            if loanNull:
+                amountLeft.append(None)
+                fundedRate.append(None)
+                score.append(None if difference else 0)
+                continue
+
+            # Unfunded (NULL) amounts count as 0, as in LoanOverTime.
+            left = loanAmount - amountStart
+            rate = amountEnd / float(loanAmount) if left != 0 else 0
+            amountLeft.append(left)
+            fundedRate.append(rate)
+            score.append(rate * (DAY_EPOCH // difference) if difference else 0)
+
+        self._derived = {
+            'amountLeft': amountLeft,
+            'dateDifference': dateDifference,
+            'fundedRate': fundedRate,
+            'dailyFundingScore': score
+        }
+
+    def column(self, key):
+        """Return column `key` as a list, where nulls are NoneType. Besides
+        `fields`, derived columns are `amountLeft`, `dateDifference`,
+        `fundedRate` and `dailyFundingScore`.
+        """
+        if key in self.columns:
+            if key not in self.nulls:
+                return list(self.columns[key])
+            return [
+                None if null else value
+                for value, null in izip(self.columns[key], self.nulls[key])
+            ]
+
+        if self._derived is None:
+            self._derive()
+        return list(self._derived[key])
+
+    @property
+    def ids(self):
+        return self.column('id')
+
+    def get_daily_funding_scores(self):
+        """Return dictionary of daily funding score keyed by loan id."""
+        return dict(izip(self.columns['id'], self.column('dailyFundingScore')))
@@ -1,33 +1,302 @@
 """Includes methods for interacting with Lending Club API.
+Requests go through an `ApiClient`, which keeps a pooled keep-alive session,
+negotiates compressed transfer, enforces timeouts and retries with jittered
+exponential backoff within an overall deadline. Module methods use a shared
+client from `get_client`.
 """
 
 import config
 import log
+import metrics
+import random
 import requests
+import time
 
+from requests.adapters import HTTPAdapter
+from stream import ListingStream
 
-_LOG_API_RESP = "API response [{0}]: {1}"
 
+_LOG_API_RESP = "API response [%s]: %s"
+_LOG_API_RETRY = "API request failed (%s); retry %s in %.2fs."
+_LOG_API_DEADLINE = "API request failed (%s); deadline of %ss reached."
 
-def get_listed_loans(token=None, show_all=True):
+_client = None
+
+
+def _is_retryable(status_code):
+    """Return True for responses worth retrying: 5xx and 429."""
+    return status_code >= 500 or status_code == 429
+
+
+class ApiClient(object):
+    """Lending Club API client.
+    Keeps one `requests.Session` (and so a persistent connection pool) for the
+    life of the instance. Each request has connect/read timeouts, and failed
+    attempts (connection errors, timeouts, 5xx and 429) are retried with
+    jittered exponential backoff. All attempts of a request, and the waits
+    between them, must fit within `deadline` seconds (defaults to
+    `config.API_DEADLINE`, or else `config.POLLING_INTERVAL`, so a request
+    never outlasts a poll; unbounded if 0). Latency and byte counts of the
+    last request and running totals are available from `stats`.
+    May be used with the with statement.
+    """
+    def __init__(self, token=None, deadline=None):
+        self.token = token
+        self.timeout = (config.API_CONNECT_TIMEOUT, config.API_READ_TIMEOUT)
+        self.deadline = (
+            deadline or config.API_DEADLINE or config.POLLING_INTERVAL
+        )
+        self.retries = config.API_RETRIES
+        self.backoff = config.API_BACKOFF
+        self.backoff_max = config.API_BACKOFF_MAX
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=config.API_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            'Accept-Encoding': "gzip, deflate",
+            'Content-type': "application/json"
+        })
+
+        self.last_latency = None
+        self.last_bytes = None
+        self.last_wire_bytes = None
+        self.request_count = 0
+        self.retry_count = 0
+        self.total_bytes = 0
+        self.total_latency = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _get_delay(self, attempt, response=None):
+        """Return seconds to wait before retry `attempt` (starting at 0).
+        Honours a numeric Retry-After header, capped at `backoff_max`.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.backoff_max))
+
+    def _get_timeout(self, deadline):
+        """Return (connect, read) timeouts, capped at the seconds left until
+        epoch `deadline`, if any.
+        """
+        if deadline is None:
+            return self.timeout
+        remaining = max(deadline - time.time(), 0.0)
+        return tuple(min(timeout, remaining) for timeout in self.timeout)
+
+    def _record(self, response, latency, stream):
+        """Update latency and byte counters for a completed request."""
+        self.last_latency = latency
+        self.request_count += 1
+        self.total_latency += latency
+
+        if stream:
+            self.last_bytes = self.last_wire_bytes = None
+            return
+
+        self.last_bytes = len(response.content)
+        try:
+            self.last_wire_bytes = int(response.raw.tell())
+        except (AttributeError, TypeError, ValueError):
+            self.last_wire_bytes = self.last_bytes
+        self.total_bytes += self.last_wire_bytes
+        metrics.FETCHED_BYTES.inc(self.last_wire_bytes)
+
+    def get(self, uri, params=None, token=None, stream=False):
+        """Return response of GET `uri` (relative to `config.API_URL`), after
+        retrying as needed. The last response is returned once retries are
+        exhausted, or once the next retry would not start before the deadline;
+        the last exception is raised if there was no response.
+        When `stream` is True, the body is left to be read by the caller.
+        """
+        logger = log.get_logger(__name__)
+        url = config.API_URL + uri
+        headers = {'Authorization': token or self.token or config.API_TOKEN}
+        deadline = time.time() + self.deadline if self.deadline else None
+
+        for attempt in xrange(self.retries + 1):
+            start = time.time()
+            response = None
+
+            try:
+                response = self.session.get(
+                    url,
+                    headers=headers,
+                    params=params,
+                    timeout=self._get_timeout(deadline),
+                    stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = e.__class__.__name__
+                delay = self._get_delay(attempt)
+                if attempt == self.retries:
+                    raise
+                if deadline is not None and time.time() + delay >= deadline:
+                    logger.warn(_LOG_API_DEADLINE, reason, self.deadline)
+                    raise
+            else:
+                self._record(response, time.time() - start, stream)
+                if attempt == self.retries or not _is_retryable(
+                    response.status_code
+                ):
+                    return response
+                reason = response.status_code
+                delay = self._get_delay(attempt, response)
+                if deadline is not None and time.time() + delay >= deadline:
+                    logger.warn(_LOG_API_DEADLINE, reason, self.deadline)
+                    return response
+                response.close()
+
+            logger.warn(_LOG_API_RETRY, reason, attempt + 1, delay)
+            self.retry_count += 1
+            time.sleep(delay)
+
+    def get_listed_loans(self, token=None, show_all=True, archive=None):
+        """Fetches and returns dictionary JSON containing loan listings.
+        If token is not specified, will use the client's or config value.
+        Logs error and returns NoneType if response is not 200 or the request
+        could not be made.
+        The raw response is appended to `archive` (`archive.SnapshotArchive`),
+        when given.
+        """
+        logger = log.get_logger(__name__)
+        params = {'showAll': show_all}
+
+        try:
+            with metrics.STAGE_SECONDS.time(stage="fetch"):
+                response = self.get(
+                    config.API_LOANS_URI,
+                    params=params,
+                    token=token
+                )
+        except requests.RequestException as e:
+            logger.error("API request failed: %s", e)
+            return
+
+        if response.status_code == 200:
+            logger.debug(
+                _LOG_API_RESP,
+                response.status_code,
+                log.summarize(response)
+            )
+            with metrics.STAGE_SECONDS.time(stage="decode"):
+                response_json = response.json()
+
+            if archive is not None:
+                try:
+                    archive.append(response_json['asOfDate'], response.content)
+                except (IOError, OSError) as e:
+                    logger.error("Failed to archive snapshot: %s", e)
+
+            return response_json
+        else:
+            logger.error(
+                _LOG_API_RESP,
+                response.status_code,
+                log.summarize(response)
+            )
+
+    def stream_listed_loans(self, token=None, show_all=True, archive=None):
+        """As `get_listed_loans`, but returns a `stream.ListingStream` which
+        decodes the body incrementally as loans are consumed. The stream
+        should be closed once done with, to release the connection.
+        The body is archived only if it is read in full.
+        """
+        logger = log.get_logger(__name__)
+        params = {'showAll': show_all}
+
+        try:
+            with metrics.STAGE_SECONDS.time(stage="fetch"):
+                response = self.get(
+                    config.API_LOANS_URI,
+                    params=params,
+                    token=token,
+                    stream=True
+                )
+        except requests.RequestException as e:
+            logger.error("API request failed: %s", e)
+            return
+
+        if response.status_code == 200:
+            chunks = response.iter_content(config.STREAM_READ_SIZE)
+            tee = archive.tee(chunks) if archive is not None else None
+
+            try:
+                listing = ListingStream(tee or chunks, response=response)
+                if tee:
+                    tee.asOfDate = listing.asOfDate
+                return listing
+            except (ValueError, requests.RequestException) as e:
+                logger.error("API response could not be streamed: %s", e)
+                response.close()
+        else:
+            logger.error(
+                _LOG_API_RESP,
+                response.status_code,
+                log.summarize(response)
+            )
+            response.close()
+
+    def stats(self):
+        """Return dictionary of request latency (seconds) and byte counters."""
+        return {
+            'last_latency': self.last_latency,
+            'last_bytes': self.last_bytes,
+            'last_wire_bytes': self.last_wire_bytes,
+            'request_count': self.request_count,
+            'retry_count': self.retry_count,
+            'total_bytes': self.total_bytes,
+            'total_latency': self.total_latency
+        }
+
+
+def close_client():
+    """Close the shared client, if open."""
+    global _client
+    if _client:
+        _client.close()
+        _client = None
+
+
+def get_client():
+    """Return the shared ApiClient, creating it on first use."""
+    global _client
+    if not _client:
+        _client = ApiClient()
+    return _client
+
+
+def get_listed_loans(token=None, show_all=True, archive=None):
     """Fetches and returns dictionary JSON containing loan listings.
     If token is not specified, will use config value.
     Logs error and returns NoneType if response is not 200.
     """
-    # Logging.
-    logger = log.get_logger(__name__)
-
-    # Prepare and make request.
-    url = config.API_URL + config.API_LOANS_URI
-    headers = {
-        'Authorization': token or config.API_TOKEN,
-        'Content-type': "application/json"
-    }
-    params = {'showAll': show_all}
-    response = requests.get(url, headers=headers, params=params)
-
-    if response.status_code == 200:
-        logger.debug(_LOG_API_RESP.format(response.status_code, response.text))
-        return response.json()
-    else:
-        logger.error(_LOG_API_RESP.format(response.status_code, response.text))
+    return get_client().get_listed_loans(
+        token=token,
+        show_all=show_all,
+        archive=archive
+    )
+
+
+def stream_listed_loans(token=None, show_all=True, archive=None):
+    """Returns `stream.ListingStream` of loan listings, decoded incrementally.
+    If token is not specified, will use config value.
+    Logs error and returns NoneType if response is not 200.
+    """
+    return get_client().stream_listed_loans(
+        token=token,
+        show_all=show_all,
+        archive=archive
+    )
@@ -0,0 +1,221 @@
+"""Includes the append-only archive of raw API listing responses.
+Each response is zlib-compressed on its own and appended to the current
+segment file; segments are rotated once they reach `config.ARCHIVE_SEGMENT_BYTES`.
+An index of `asOfDate` (unix timestamp) to segment, offset and length is kept
+alongside, so any snapshot can be read back without decompressing the rest.
+"""
+
+import config
+import dates
+import log
+import os
+import zlib
+
+
+_INDEX_FILE = "index"
+_SEGMENT_FILE = "segment-%06d.z"
+
+
+def _get_key(asOfDate):
+    """Return index key (unix timestamp) of `asOfDate`."""
+    if isinstance(asOfDate, (int, long)):
+        return asOfDate
+    return dates.get_epoch(asOfDate)
+
+
+def read_segment(path, offset, length):
+    """Return decompressed snapshot of `length` bytes at `offset` of segment
+    file `path`, as given by `SnapshotArchive.locate`.
+    """
+    with open(path, 'rb') as segment_file:
+        segment_file.seek(offset)
+        return zlib.decompress(segment_file.read(length))
+
+
+class SnapshotArchive(object):
+    """Archive of raw listing responses kept in `directory` (created if need
+    be). Snapshots are keyed by `asOfDate`, as a date string or timestamp, and
+    each is archived once. There should be a single writer per directory.
+    With `read_only`, nothing in `directory` is created or modified (so it may
+    be a read-only or frozen copy), and appending raises IOError.
+    May be used with the with statement.
+    """
+    def __init__(self, directory, segment_bytes=None, level=None,
+                 read_only=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes or config.ARCHIVE_SEGMENT_BYTES
+        self.level = config.ARCHIVE_COMPRESS_LEVEL if level is None else level
+        self.read_only = read_only
+
+        if not read_only and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.index = {}
+        self.segment = 1
+        size = self._load_index()
+
+        self._index_file = None
+        self._segment_file = None
+        if not read_only:
+            self._index_file = open(self._path(_INDEX_FILE), 'ab')
+            # Drop a partially written last line, so that the next entry
+            # starts on a line of its own.
+            self._index_file.truncate(size)
+
+    def __contains__(self, asOfDate):
+        return _get_key(asOfDate) in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        """Read the index. A partially written last line (from a crash while
+        appending) is ignored. Returns size in bytes of the complete lines.
+        """
+        try:
+            index_file = open(self._path(_INDEX_FILE), 'rb')
+        except IOError:
+            return 0
+
+        size = 0
+        with index_file:
+            for line in index_file:
+                if not line.endswith("\n"):
+                    break
+                size += len(line)
+
+                fields = line.split()
+                if len(fields) != 4:
+                    continue
+
+                asOfDate, segment, offset, length = [int(f) for f in fields]
+                self.index[asOfDate] = (segment, offset, length)
+                self.segment = max(self.segment, segment)
+
+        return size
+
+    def _open_segment(self, length):
+        """Return segment file to append `length` bytes to, rotating to a new
+        segment if the current one would exceed `segment_bytes`.
+        """
+        if self._segment_file is None:
+            self._segment_file = open(
+                self._path(_SEGMENT_FILE % self.segment), 'ab'
+            )
+            self._segment_file.seek(0, os.SEEK_END)
+
+        size = self._segment_file.tell()
+        if size and size + length > self.segment_bytes:
+            self._segment_file.close()
+            self.segment += 1
+            self._segment_file = open(
+                self._path(_SEGMENT_FILE % self.segment), 'ab'
+            )
+
+        return self._segment_file
+
+    def append(self, asOfDate, payload):
+        """Compress and append `payload`, the raw response body, as snapshot
+        `asOfDate`. Returns False if it is already archived.
+        """
+        return self.append_compressed(
+            asOfDate,
+            zlib.compress(payload, self.level)
+        )
+
+    def append_compressed(self, asOfDate, data):
+        """As `append`, for a payload already compressed by zlib."""
+        if self.read_only:
+            raise IOError("Archive %s is read-only." % self.directory)
+
+        asOfDate = _get_key(asOfDate)
+        if asOfDate in self.index:
+            return False
+
+        segment_file = self._open_segment(len(data))
+        offset = segment_file.tell()
+        segment_file.write(data)
+        segment_file.flush()
+
+        # Segment data is written before the index, so an entry never points
+        # at missing data.
+        self.index[asOfDate] = (self.segment, offset, len(data))
+        self._index_file.write(
+            "%s %s %s %s\n" % (asOfDate, self.segment, offset, len(data))
+        )
+        self._index_file.flush()
+        return True
+
+    def close(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    def dates(self):
+        """Return sorted list of archived `asOfDate` timestamps."""
+        return sorted(self.index)
+
+    def locate(self, asOfDate):
+        """Return (segment path, offset, length) of snapshot `asOfDate`, for
+        `read_segment`. Raises KeyError if it is not archived.
+        """
+        segment, offset, length = self.index[_get_key(asOfDate)]
+        return (self._path(_SEGMENT_FILE % segment), offset, length)
+
+    def read(self, asOfDate):
+        """Return raw response body of snapshot `asOfDate`.
+        Raises KeyError if it is not archived.
+        """
+        location = self.locate(asOfDate)
+
+        if self._segment_file is not None:
+            self._segment_file.flush()
+
+        return read_segment(*location)
+
+    def tee(self, chunks):
+        """Return `ArchiveTee` compressing `chunks` as they are read."""
+        return ArchiveTee(self, chunks)
+
+
+class ArchiveTee(object):
+    """Iterable passing through `chunks` of a response body, compressing each
+    as it goes. Once `asOfDate` is set and the body has been read in full, the
+    snapshot is appended to `archive`; a partly read body is not archived.
+    """
+    def __init__(self, archive, chunks):
+        self.archive = archive
+        self.asOfDate = None
+        self.archived = False
+        self._chunks = chunks
+        self._compressor = zlib.compressobj(archive.level)
+
+    def __iter__(self):
+        data = []
+        for chunk in self._chunks:
+            data.append(self._compressor.compress(chunk))
+            yield chunk
+
+        data.append(self._compressor.flush())
+        if self.asOfDate is None:
+            return
+
+        try:
+            self.archived = self.archive.append_compressed(
+                self.asOfDate,
+                b"".join(data)
+            )
+        except (IOError, OSError) as e:
+            log.get_logger(__name__).error("Failed to archive snapshot: %s", e)
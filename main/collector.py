@@ -0,0 +1,165 @@
+"""Pipelined collector. Fetches are scheduled on absolute wall-clock ticks
+(`start + n * delay`), so the poll period does not drift with processing time.
+Parsing and database writes run on a separate writer stage fed through a
+bounded queue, so fetch N+1 overlaps with the write of snapshot N.
+
+When the writer falls behind and the queue is full at a tick, that tick's fetch
+is skipped (and counted) rather than queueing without bound. Ticks already
+passed when a fetch overruns are skipped as well, instead of fetched in a burst.
+
+Responses are always read whole before being queued: `config.STREAM_LISTINGS`
+is not supported, as a streamed body would still be read by the writer while
+the fetch stage reuses the API connection. A `cycle` stage spans each fetch
+and its write, as for the sequential collector.
+"""
+
+import Queue
+import api
+import config
+import lc_commons
+import log
+import metrics
+import storage
+import threading
+import time
+
+
+_STOP = object()  # Queue sentinel for the writer stage.
+
+
+class PipelinedCollector(object):
+    """Runs the fetch stage on the calling thread and the parse/write stage on
+    a writer thread, which owns its own `storage.Storage` (see `storage.get_storage`).
+    """
+    def __init__(self, delay=None, token=None, path=None, queue_size=None):
+        if delay == None:
+            delay = config.POLLING_INTERVAL
+
+        self.delay = delay
+        self.token = token
+        self.path = path
+        self.queue = Queue.Queue(maxsize=queue_size or config.PIPELINE_QUEUE_SIZE)
+
+        self.fetched = 0
+        self.missed = 0
+        self.skipped = 0
+        self.written = 0
+
+        self._stopping = threading.Event()
+        self._ready = threading.Event()
+        self._writer_error = None
+
+    def _fetch(self):
+        """Fetch a snapshot and queue it for the writer, unless the writer has
+        fallen behind (queue full), in which case the tick is skipped.
+        """
+        logger = log.get_logger(__name__)
+
+        if self.queue.full():
+            self.skipped += 1
+            metrics.SKIPPED_FETCHES.inc(reason="writer_behind")
+            logger.warn(
+                "Writer behind (%s snapshots queued); skipping fetch.",
+                self.queue.qsize()
+            )
+            return
+
+        start = time.time()
+        response_json = api.get_listed_loans(
+            token=self.token,
+            archive=lc_commons.get_archive()
+        )
+        if not response_json:
+            logger.warn("Aborting. No API response.")
+            metrics.CYCLES.inc(outcome="no_response")
+            metrics.STAGE_SECONDS.observe(time.time() - start, stage="cycle")
+            return
+
+        self.fetched += 1
+        self.queue.put((start, response_json))
+
+    def _get_next_tick(self, start, tick, now):
+        """Return index of next tick after `tick` that is not yet due at `now`,
+        counting any ticks passed over as missed.
+        """
+        next_tick = tick + 1
+        due = int((now - start) // self.delay) + 1 if self.delay else next_tick
+
+        if due > next_tick:
+            self.missed += due - next_tick
+            metrics.SKIPPED_FETCHES.inc(due - next_tick, reason="missed_tick")
+            return due
+        return next_tick
+
+    def _write(self):
+        """Writer stage: records queued responses until stopped."""
+        logger = log.get_logger(__name__)
+
+        try:
+            session = storage.get_storage(path=self.path)
+        except Exception as e:
+            self._writer_error = e
+            self._ready.set()
+            return
+
+        self._ready.set()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+
+                start, response_json = item
+                try:
+                    lc_commons.record(response_json, session=session)
+                    self.written += 1
+                except Exception:
+                    metrics.CYCLES.inc(outcome="error")
+                    logger.exception("Failed to record snapshot.")
+                metrics.STAGE_SECONDS.observe(
+                    time.time() - start, stage="cycle"
+                )
+                metrics.write_textfile()
+        finally:
+            session.close()
+
+    def run(self, number_requests=0):
+        """Run until `stop` is called, or `number_requests` ticks when
+        non-zero. Raises the writer's error if it cannot open the database
+        (e.g. `database.SchemaVersionError`), and ValueError if
+        `config.STREAM_LISTINGS` is set.
+        """
+        if config.STREAM_LISTINGS:
+            raise ValueError("Streamed listings cannot be pipelined.")
+
+        writer = threading.Thread(target=self._write, name="lc_commons-writer")
+        writer.daemon = True
+        writer.start()
+        self._ready.wait()
+
+        if self._writer_error:
+            raise self._writer_error
+
+        start = time.time()
+        tick = 0
+        ticks = 0
+
+        try:
+            while not self._stopping.is_set():
+                self._stopping.wait(max(0, start + tick * self.delay - time.time()))
+                if self._stopping.is_set():
+                    break
+
+                self._fetch()
+                ticks += 1
+                if number_requests and ticks >= number_requests:
+                    break
+
+                tick = self._get_next_tick(start, tick, time.time())
+        finally:
+            self.queue.put(_STOP)
+            writer.join()
+
+    def stop(self):
+        """Stop fetching; queued snapshots are still written."""
+        self._stopping.set()
@@ -0,0 +1,237 @@
+"""Includes compaction of old funding history. Once a loan has had no snapshot
+for `config.COMPACT_AFTER` seconds (it has been fully funded or expired), its
+rows in `loansFundedAsOfDate` are reduced to its first and last snapshots, the
+snapshots at which `fundedAmount` changed, and the first snapshot of every
+`config.COMPACT_SAMPLE_INTERVAL` seconds. Every amount and the first and last
+dates are kept, so `LoanOverTime.get_daily_funding_score` (and the funding
+summary) are unchanged; `snapshots` of `loanFundingSummary` is updated to the
+rows kept.
+
+Loans are compacted `config.COMPACT_BATCH_SIZE` at a time, one transaction
+each, pausing `config.COMPACT_PAUSE` seconds between them so that the
+collector's writes are never held up for long. `Compactor` repeats this every
+`config.COMPACT_INTERVAL` seconds on a background thread. History recorded as
+`loanFundingChanges` is already reduced to change points, and is left as is;
+as are rows in frozen partitions.
+
+When partitioned, only the partitions of the `PARTITION_WINDOW` seconds before
+the cutoff are attached (see `open_database`), and only loans whose history
+lies entirely within them are compacted.
+"""
+
+import config
+import database
+import log
+import threading
+import time
+
+from loans import DAY_EPOCH
+
+
+# Spans at most `database.MAX_PARTITIONS - 1` months.
+PARTITION_WINDOW = (database.MAX_PARTITIONS - 3) * 28 * DAY_EPOCH
+
+
+def get_cutoff(age=None, now=None):
+    """Return epoch `age` seconds (defaults to `config.COMPACT_AFTER`) before
+    `now` (defaults to the current time); loans with no snapshot since are
+    compacted.
+    """
+    if age is None:
+        age = config.COMPACT_AFTER
+    return int(time.time() if now is None else now) - age
+
+
+def open_database(path=None, before=None):
+    """Return database at `path` to compact history before epoch `before`
+    (defaults to `get_cutoff()`) in, spanning the partitions of the
+    `PARTITION_WINDOW` before it when partitioned.
+    """
+    if before is None:
+        before = get_cutoff()
+    return database.get_database(
+        path=path, start=before - PARTITION_WINDOW, end=before
+    )
+
+
+def get_candidates(db_conn, before, after_id=0, size=None, since=None):
+    """Return list of up to `size` ids, greater than `after_id` and ascending,
+    of loans with more than two snapshots and none since epoch `before` (nor
+    before epoch `since`, if given).
+    """
+    sql = """
+        SELECT id
+          FROM loanFundingSummary
+         WHERE dateEnd < ?
+           AND dateStart >= ?
+           AND snapshots > 2
+           AND id > ?
+         ORDER BY id
+         LIMIT ?
+    """
+    params = (
+        before, since or 0, after_id, size or config.COMPACT_BATCH_SIZE
+    )
+    return [row[0] for row in db_conn.select(sql, params)]
+
+
+def get_redundant_rows(db_conn, ids, interval=None):
+    """Return list of `(id, asOfDate)` of the rows of loans `ids` that are
+    neither first, last, a change of `fundedAmount` nor the first of their
+    `interval` seconds (no samples are kept if NoneType or 0). Rows in frozen
+    partitions are not returned.
+    """
+    frozen = []
+    if isinstance(db_conn, database.PartitionedDatabase):
+        frozen = db_conn.get_frozen_bounds()
+    sql = """
+        SELECT id, asOfDate
+          FROM (
+                SELECT id,
+                       asOfDate,
+                       fundedAmount IS NOT LAG(fundedAmount, 1, -1) OVER loan
+                           AS changed,
+                       ROW_NUMBER() OVER loan AS position,
+                       COUNT(*) OVER (PARTITION BY id) AS total,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY id, asOfDate / ?1 ORDER BY asOfDate
+                       ) AS sample
+                  FROM loansFundedAsOfDate
+                 WHERE id IN (%s)
+                WINDOW loan AS (PARTITION BY id ORDER BY asOfDate)
+               )
+         WHERE NOT changed
+           AND position < total
+           AND (?1 IS NULL OR sample > 1)
+           %s
+    """ % (
+        ",".join("?" * len(ids)),
+        "".join(
+            "AND NOT (asOfDate >= %d AND asOfDate < %d)" % bounds
+            for bounds in frozen
+        )
+    )
+    return db_conn.select(sql, [interval or None] + list(ids)).fetchall()
+
+
+def compact_loans(db_conn, ids, interval=None):
+    """Delete redundant rows (see `get_redundant_rows`) of loans `ids` and
+    update their summary, in a single transaction. Returns rows deleted, as
+    counted by SQLite.
+    """
+    delete_sql = """
+        DELETE FROM %s
+         WHERE id = ? AND asOfDate = ?
+    """
+    summary_sql = """
+        UPDATE loanFundingSummary
+           SET snapshots = (
+                SELECT COUNT(*)
+                  FROM loansFundedAsOfDate
+                 WHERE loansFundedAsOfDate.id = loanFundingSummary.id
+               )
+         WHERE id IN (%s)
+    """ % ",".join("?" * len(ids))
+
+    deleted = 0
+    with db_conn.transaction():
+        rows = get_redundant_rows(db_conn, ids, interval)
+        if rows:
+            changes = db_conn.database.total_changes
+            db_conn.executemany(delete_sql % "loansFundedAsOfDate", rows)
+            if isinstance(db_conn, database.PartitionedDatabase):
+                # The partition views only delete from partitions.
+                db_conn.executemany(
+                    delete_sql % "main.loansFundedAsOfDate", rows
+                )
+            deleted = db_conn.database.total_changes - changes
+            db_conn.execute(summary_sql, ids)
+    return deleted
+
+
+def compact(db_conn, before=None, interval=None, size=None, pause=None,
+            stopping=None, logger=None):
+    """Compact history of every loan with no snapshot since epoch `before`
+    (defaults to `get_cutoff()`), keeping a sample every `interval` seconds
+    (defaults to `config.COMPACT_SAMPLE_INTERVAL`; 0 keeps change points
+    only), `size` loans per transaction. Stops early once the optional threading.Event `stopping` is
+    set. Returns number of rows deleted.
+    """
+    if config.FUNDING_CHANGES_ONLY:
+        return 0
+
+    if before is None:
+        before = get_cutoff()
+    if interval is None:
+        interval = config.COMPACT_SAMPLE_INTERVAL
+    if pause is None:
+        pause = config.COMPACT_PAUSE
+
+    since = None
+    if isinstance(db_conn, database.PartitionedDatabase):
+        since = db_conn.start
+    last_id = 0
+    loans = 0
+    deleted = 0
+
+    while not (stopping and stopping.is_set()):
+        ids = get_candidates(db_conn, before, last_id, size, since)
+        if not ids:
+            break
+
+        deleted += compact_loans(db_conn, ids, interval)
+        loans += len(ids)
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
+
+    if logger:
+        logger.info(
+            "Compacted %s loans, deleting %s snapshot rows.", loans, deleted
+        )
+    return deleted
+
+
+class Compactor(object):
+    """Runs `compact` every `interval` seconds (defaults to
+    `config.COMPACT_INTERVAL`) on a background thread, with its own connection
+    to the database at `path`.
+    """
+    def __init__(self, path=None, interval=None):
+        self.path = path
+        self.interval = interval or config.COMPACT_INTERVAL
+        self.deleted = 0
+
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        logger = log.get_logger(__name__)
+
+        while not self._stopping.is_set():
+            before = get_cutoff()
+            try:
+                with open_database(path=self.path, before=before) as db_conn:
+                    self.deleted += compact(
+                        db_conn,
+                        before=before,
+                        stopping=self._stopping,
+                        logger=logger
+                    )
+            except Exception:
+                logger.exception("Failed to compact history.")
+            self._stopping.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="lc_commons-compactor"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop after the current batch, and wait for the thread to exit."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -1,8 +1,257 @@
 """Inclues database connection class, and methods for interacting with database.
 """
 
+import calendar
 import config
+import contextlib
+import dates
+import os
+import re
 import sqlite3
+import stat
+import time
+import urllib
+
+from collections import OrderedDict
+from itertools import groupby
+from loans import LoanOverTime, LoanRecord
+from operator import itemgetter
+
+
+class SchemaVersionError(Exception):
+    """Raised when a database schema does not match `SCHEMA_VERSION`."""
+
+
+# Ordered (version, script) pairs. Each script is applied by `migrate` in a
+# single transaction along with recording its version as `user_version`.
+# Scripts may use the SQL function `epoch(value)` to convert date strings.
+MIGRATIONS = (
+    # Baseline layout, formerly applied by hand from `assets/db_schema.sql`.
+    (1, """
+        CREATE TABLE IF NOT EXISTS rawLoanDates(
+            asOfDate DATETIME PRIMARY KEY
+        );
+
+        CREATE TABLE IF NOT EXISTS loansFundedAsOfDate(
+            asOfDate DATETIME REFERENCES rawLoanDates(asOfDate),
+            fundedAmount REAL,
+            id INTEGER REFERENCES rawLoans(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS loanFundingChanges(
+            asOfDate DATETIME REFERENCES rawLoanDates(asOfDate),
+            fundedAmount REAL,
+            id INTEGER REFERENCES rawLoans(id),
+            listed INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS rawLoans(
+            acceptD INTEGER,
+            accNowDelinq INTEGER,
+            accOpenPast24Mths INTEGER,
+            addrState VARCHAR(64),
+            addrZip VARCHAR(3),
+            annualInc REAL,
+            avgCurBal INTEGER,
+            bcOpenToBuy INTEGER,
+            bcUtil REAL,
+            chargeoffWithin12Mths INTEGER,
+            collections12MthsExMed INTEGER,
+            creditPullD INTEGER,
+            delinq2Yrs INTEGER,
+            delinqAmnt REAL,
+            desc TEXT,
+            dti REAL,
+            earliestCrLine INTEGER,
+            empLength INTEGER,
+            empTitle VARCHAR(64),
+            expD INTEGER,
+            expDefaultRate REAL,
+            ficoRangeHigh INTEGER,
+            ficoRangeLow INTEGER,
+            grade CHARACTER(1),
+            homeOwnership VARCHAR(16),
+            id INTEGER PRIMARY KEY,
+            ilsExpD INTEGER,
+            initialListStatus CHARACTER(1),
+            inqLast6Mths INTEGER,
+            installment REAL,
+            intRate REAL,
+            investorCount INTEGER,
+            isIncV VARCHAR(16),
+            listD INTEGER,
+            loanAmount REAL,
+            memberId INTEGER,
+            mortAcc INTEGER,
+            moSinOldIlAcct INTEGER,
+            moSinOldRevTlOp INTEGER,
+            moSinRcntRevTlOp INTEGER,
+            moSinRcntTl INTEGER,
+            mthsSinceLastDelinq INTEGER,
+            mthsSinceLastMajorDerog INTEGER,
+            mthsSinceLastRecord INTEGER,
+            mthsSinceRecentBc INTEGER,
+            mthsSinceRecentBcDlq INTEGER,
+            mthsSinceRecentInq INTEGER,
+            mthsSinceRecentRevolDelinq INTEGER,
+            numAcctsEver120Ppd INTEGER,
+            numActvBcTl INTEGER,
+            numActvRevTl INTEGER,
+            numBcSats INTEGER,
+            numBcTl INTEGER,
+            numIlTl INTEGER,
+            numOpRevTl INTEGER,
+            numRevAccts INTEGER,
+            numRevTlBalGt0 INTEGER,
+            numSats INTEGER,
+            numTl120dpd2m INTEGER,
+            numTl30dpd INTEGER,
+            numTl90gDpd24m INTEGER,
+            numTlOpPast12m INTEGER,
+            openAcc INTEGER,
+            pctTlNvrDlq INTEGER,
+            percentBcGt75 REAL,
+            pubRec INTEGER,
+            pubRecBankruptcies INTEGER,
+            purpose VARCHAR(32),
+            reviewStatus VARCHAR(16),
+            reviewStatusD INTEGER,
+            revolBal REAL,
+            revolUtil REAL,
+            serviceFeeRate REAL,
+            subGrade CHARACTER(2),
+            taxLiens INTEGER,
+            term INTEGER,
+            totalAcc INTEGER,
+            totalBalExMort INTEGER,
+            totalBcLimit INTEGER,
+            totalIlHighCreditLimit INTEGER,
+            totalRevHiLim INTEGER,
+            totCollAmt INTEGER,
+            totCurBal INTEGER,
+            totHiCredLim INTEGER
+        );
+    """),
+    # Integer epoch `asOfDate` keys, snapshot ids, and clustered history tables.
+    (2, """
+        CREATE TABLE rawLoanDatesV2(
+            snapshotId INTEGER PRIMARY KEY,
+            asOfDate INTEGER NOT NULL UNIQUE
+        );
+        INSERT OR IGNORE INTO rawLoanDatesV2(asOfDate)
+            SELECT epoch(asOfDate) FROM rawLoanDates ORDER BY 1;
+        DROP TABLE rawLoanDates;
+        ALTER TABLE rawLoanDatesV2 RENAME TO rawLoanDates;
+
+        CREATE TABLE loansFundedAsOfDateV2(
+            asOfDate INTEGER REFERENCES rawLoanDates(asOfDate),
+            fundedAmount REAL,
+            id INTEGER REFERENCES rawLoans(id),
+            PRIMARY KEY (id, asOfDate)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO loansFundedAsOfDateV2
+            SELECT epoch(asOfDate), fundedAmount, id FROM loansFundedAsOfDate;
+        DROP TABLE loansFundedAsOfDate;
+        ALTER TABLE loansFundedAsOfDateV2 RENAME TO loansFundedAsOfDate;
+        CREATE INDEX loansFundedAsOfDateByDate
+            ON loansFundedAsOfDate(asOfDate);
+
+        CREATE TABLE loanFundingChangesV2(
+            asOfDate INTEGER REFERENCES rawLoanDates(asOfDate),
+            fundedAmount REAL,
+            id INTEGER REFERENCES rawLoans(id),
+            listed INTEGER,
+            PRIMARY KEY (id, asOfDate)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO loanFundingChangesV2
+            SELECT epoch(asOfDate), fundedAmount, id, listed
+              FROM loanFundingChanges;
+        DROP TABLE loanFundingChanges;
+        ALTER TABLE loanFundingChangesV2 RENAME TO loanFundingChanges;
+        CREATE INDEX loanFundingChangesByDate
+            ON loanFundingChanges(asOfDate);
+    """),
+    # Per-loan funding summary, maintained on ingest. The score matches
+    # `LoanOverTime.get_daily_funding_score`, including integer division.
+    (3, """
+        CREATE TABLE loanFundingSummary(
+            id INTEGER PRIMARY KEY,
+            loanAmount REAL,
+            dateStart INTEGER NOT NULL,
+            dateEnd INTEGER NOT NULL,
+            amountStart REAL,
+            amountEnd REAL,
+            snapshots INTEGER NOT NULL,
+            dailyFundingScore REAL GENERATED ALWAYS AS (
+                CASE WHEN dateEnd = dateStart THEN 0
+                     WHEN loanAmount IS NULL THEN NULL
+                     WHEN loanAmount - IFNULL(amountStart, 0) = 0 THEN 0
+                     ELSE IFNULL(amountEnd, 0) / loanAmount *
+                          (86400 / (dateEnd - dateStart))
+                END
+            ) STORED
+        );
+        CREATE INDEX loanFundingSummaryByScore
+            ON loanFundingSummary(dailyFundingScore);
+
+        INSERT INTO loanFundingSummary(
+            id, loanAmount, dateStart, dateEnd, amountStart, amountEnd, snapshots
+        )
+        SELECT funded.id,
+               rawLoans.loanAmount,
+               MIN(funded.asOfDate),
+               MAX(funded.asOfDate),
+               CASE WHEN COUNT(funded.fundedAmount) < COUNT(*) THEN NULL
+                    ELSE MIN(funded.fundedAmount)
+               END,
+               MAX(funded.fundedAmount),
+               COUNT(*)
+          FROM loansFundedAsOfDate AS funded
+          LEFT JOIN rawLoans ON rawLoans.id = funded.id
+         GROUP BY funded.id;
+    """),
+    # Indexes for the filters of `query.get_query`.
+    (4, """
+        CREATE INDEX rawLoansByGrade ON rawLoans(grade, subGrade);
+        CREATE INDEX rawLoansByState ON rawLoans(addrState);
+        CREATE INDEX rawLoansByListDate ON rawLoans(listD);
+    """),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+# Oldest SQLite library the schema and queries run on: generated columns
+# (3.31), upsert (3.24) and window functions (3.25).
+MIN_SQLITE_VERSION = (3, 31, 0)
+
+# Snapshot tables split into per-month partitions by `PartitionedDatabase`, with
+# their columns. Within a partition, each table is suffixed by its month (e.g.
+# `loansFundedAsOfDate_2015_01`), as triggers may only name tables unqualified.
+PARTITION_TABLES = (
+    ('loansFundedAsOfDate', ('asOfDate', 'fundedAmount', 'id')),
+    ('loanFundingChanges', ('asOfDate', 'fundedAmount', 'id', 'listed'))
+)
+PARTITION_SCRIPT = """
+    CREATE TABLE IF NOT EXISTS loansFundedAsOfDate_%(suffix)s(
+        asOfDate INTEGER,
+        fundedAmount REAL,
+        id INTEGER,
+        PRIMARY KEY (id, asOfDate)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS loansFundedAsOfDateByDate_%(suffix)s
+        ON loansFundedAsOfDate_%(suffix)s(asOfDate);
+
+    CREATE TABLE IF NOT EXISTS loanFundingChanges_%(suffix)s(
+        asOfDate INTEGER,
+        fundedAmount REAL,
+        id INTEGER,
+        listed INTEGER,
+        PRIMARY KEY (id, asOfDate)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS loanFundingChangesByDate_%(suffix)s
+        ON loanFundingChanges_%(suffix)s(asOfDate);
+"""
+MAX_PARTITIONS = 10  # SQLite's default limit on attached databases.
+
+_PARTITION_RE = re.compile(r"^snapshots-(\d{4})-(\d{2})\.db$")
 
 
 def _dict_factory(cursor, row):
@@ -17,16 +266,102 @@ def _dict_factory(cursor, row):
     return d
 
 
+def _iter_fetchmany(cursor, size):
+    """Generator yielding rows of executed `cursor`, fetched `size` at a time."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+def _epoch(value):
+    """SQL function `epoch` for migrations: date strings to unix timestamps."""
+    if isinstance(value, basestring):
+        return dates.get_epoch(value)
+    return value
+
+
+def get_funded_params(loans):
+    """Return funded tuples for `loans`, a list of Loan instances or a
+    LoanBatch instance.
+    """
+    if hasattr(loans, 'get_funded_tuples'):
+        return loans.get_funded_tuples()  # LoanBatch
+    return map(lambda loan: loan.get_funded_tuple(), loans)
+
+
 def add_loans_funded_as_of_date(loans, db_conn):
     sql = """
         INSERT INTO loansFundedAsOfDate VALUES(?,?,?)
     """
-    params = map(lambda loan: loan.get_funded_tuple(), loans)
-    db_conn.executemany(sql, params)
+    db_conn.executemany(sql, get_funded_params(loans))
+
+
+def add_loan_funding_changes(asOfDate, loans, db_conn, tracker):
+    """Change-data-capture alternative to `add_loans_funded_as_of_date`.
+    Only loans whose `fundedAmount` differs from the last known value, or that
+    appeared or disappeared since the previous snapshot, are written to
+    `loanFundingChanges`. Returns the number of change rows written.
+    """
+    return add_funding_changes(
+        asOfDate, get_funded_params(loans), db_conn, tracker
+    )
+
+
+def add_funding_changes(asOfDate, funded, db_conn, tracker):
+    """Write changes between `tracker` state and `funded`, the funded tuples
+    of every loan listed as of `asOfDate`. Returns number of rows written.
+    """
+    sql = """
+        INSERT INTO loanFundingChanges VALUES(?,?,?,?)
+    """
+    if tracker.amounts is None:
+        tracker.seed(db_conn)
+
+    changes = tracker.get_changes(asOfDate, funded)
+    if changes:
+        db_conn.executemany(sql, changes)
+    tracker.apply(changes)
+    return len(changes)
+
+
+def add_loan_funding_summary(funded, db_conn):
+    """Fold `funded`, funded tuples of a snapshot, into `loanFundingSummary`.
+    `amountStart` becomes NULL once an unfunded (NULL) amount is seen, and
+    `amountEnd` is NULL only while every amount seen is, as in `LoanOverTime`.
+    The snapshot must not have been folded in before.
+    """
+    sql = """
+        INSERT INTO loanFundingSummary(
+            id, loanAmount, dateStart, dateEnd, amountStart, amountEnd, snapshots
+        )
+        VALUES(
+            ?3, (SELECT loanAmount FROM rawLoans WHERE id = ?3),
+            ?1, ?1, ?2, ?2, 1
+        )
+        ON CONFLICT(id) DO UPDATE SET
+            loanAmount = IFNULL(excluded.loanAmount, loanAmount),
+            dateStart = MIN(dateStart, excluded.dateStart),
+            dateEnd = MAX(dateEnd, excluded.dateEnd),
+            amountStart = CASE
+                WHEN amountStart IS NULL OR excluded.amountStart IS NULL
+                THEN NULL
+                ELSE MIN(amountStart, excluded.amountStart)
+            END,
+            amountEnd = CASE
+                WHEN amountEnd IS NULL THEN excluded.amountEnd
+                WHEN excluded.amountEnd IS NULL THEN amountEnd
+                ELSE MAX(amountEnd, excluded.amountEnd)
+            END,
+            snapshots = snapshots + 1
+    """
+    db_conn.executemany(sql, funded)
 
 
 def add_raw_loan_dates(date_string, db_conn):
-    sql = """ INSERT OR IGNORE INTO rawLoanDates VALUES(?)"""
+    sql = """ INSERT OR IGNORE INTO rawLoanDates(asOfDate) VALUES(?)"""
     params = (date_string,)
     db_conn.execute(sql, params)
 
@@ -45,10 +380,30 @@ def add_raw_loans(loans, db_conn):
             ?,?,?,?
         )
     """
-    params = map(lambda loan: loan.get_raw_loans_tuple(), loans)
+    if hasattr(loans, 'get_raw_loans_tuples'):
+        params = loans.get_raw_loans_tuples()  # LoanBatch
+    else:
+        params = map(lambda loan: loan.get_raw_loans_tuple(), loans)
     db_conn.executemany(sql, params)
 
 
+def update_raw_loan_statuses(statuses, db_conn):
+    """Bring the `STATUS_FIELDS` of already stored `rawLoans` rows up to date
+    with `statuses`, an iterable of tuples of the `STATUS_FIELDS` (see
+    `Loan.get_status_tuple`), such as those of `RawLoanTracker.split`. Rows
+    whose status is unchanged are not written.
+    """
+    sql = """
+        UPDATE rawLoans
+           SET investorCount = ?1, reviewStatus = ?2, reviewStatusD = ?3
+         WHERE id = ?4
+           AND (investorCount IS NOT ?1
+                OR reviewStatus IS NOT ?2
+                OR reviewStatusD IS NOT ?3)
+    """
+    db_conn.executemany(sql, statuses)
+
+
 def has_been_recorded(date_string, db_conn):
     """Return True if the epoch passed has been recorded already."""
     sql = """
@@ -60,14 +415,536 @@ def has_been_recorded(date_string, db_conn):
     return (db_conn.execute(sql, params, results='fetchone')[0] > 0)
 
 
+def get_fastest_funded(db_conn, limit=10):
+    """Return the `limit` rows of `loanFundingSummary` with the highest daily
+    funding score, highest first, honouring the row factory.
+    """
+    sql = """
+        SELECT *
+          FROM loanFundingSummary
+         WHERE dailyFundingScore IS NOT NULL
+         ORDER BY dailyFundingScore DESC
+         LIMIT (?)
+    """
+    return db_conn.execute(sql, (limit,), results='fetchall')
+
+
+def get_recorded_dates(db_conn):
+    """Return set of every `asOfDate` recorded."""
+    sql = """
+        SELECT asOfDate
+          FROM rawLoanDates
+    """
+    return set(row[0] for row in db_conn.select(sql))
+
+
 def get_loans(db_conn):
-    """Fetch all the loans."""
+    """Fetch all the loans, a group of partitions at a time when partitioned
+    (see `iter_partition_groups`).
+    When `config.FUNDING_CHANGES_ONLY` is set, the per-snapshot rows are
+    rebuilt from `loanFundingChanges` instead.
+    """
+    if config.FUNDING_CHANGES_ONLY:
+        return list(get_loans_from_changes(db_conn))
+
     sql = """
         SELECT *
           FROM loansFundedAsOfDate
          INNER JOIN rawLoans ON loansFundedAsOfDate.id = rawLoans.id
     """
-    return db_conn.execute(sql, results='fetchall')
+    loans = []
+    for _ in iter_partition_groups(db_conn):
+        loans.extend(db_conn.execute(sql, results='fetchall'))
+    return loans
+
+
+def get_snapshots_sql():
+    """Return SQL selecting `(id, asOfDate, fundedAmount)` of every snapshot
+    of every loan: the rows of `loansFundedAsOfDate`, or when
+    `config.FUNDING_CHANGES_ONLY` is set, every date of `rawLoanDates` while
+    the loan was listed with the amount of its latest change, as in
+    `get_loans_from_changes`.
+    """
+    if not config.FUNDING_CHANGES_ONLY:
+        return """
+            SELECT id, asOfDate, fundedAmount
+              FROM loansFundedAsOfDate
+        """
+
+    return """
+        SELECT changes.id, rawLoanDates.asOfDate, changes.fundedAmount
+          FROM (
+                SELECT id,
+                       asOfDate,
+                       fundedAmount,
+                       listed,
+                       LEAD(asOfDate) OVER (
+                           PARTITION BY id ORDER BY asOfDate
+                       ) AS nextDate
+                  FROM loanFundingChanges
+               ) AS changes
+         INNER JOIN rawLoanDates
+            ON rawLoanDates.asOfDate >= changes.asOfDate
+           AND (changes.nextDate IS NULL
+                OR rawLoanDates.asOfDate < changes.nextDate)
+         WHERE changes.listed
+    """
+
+
+def iter_loans_over_time(db_conn, size=None, logger=None):
+    """Generator yielding one fully loaded LoanOverTime instance per loan id,
+    in id order. Snapshots are streamed from `loansFundedAsOfDate` (or rebuilt
+    from `loanFundingChanges`, see `get_snapshots_sql`) ordered by
+    `(id, asOfDate)` and fetched `size` rows at a time (defaults to
+    `config.DATABASE_FETCH_SIZE`); the static `rawLoans` columns are read once
+    per loan by merging on id. Only one loan is held in memory at a time.
+    As with `get_loans`, loans without a `rawLoans` row are skipped.
+    When partitioned, the history is collected first (see `collect_history`).
+    """
+    size = size or config.DATABASE_FETCH_SIZE
+    funded_sql = """
+        SELECT id, asOfDate, fundedAmount
+          FROM (%s)
+         ORDER BY id, asOfDate
+    """ % get_snapshots_sql()
+    raw_sql = """
+        SELECT *
+          FROM rawLoans
+         ORDER BY id
+    """
+    with collect_history(db_conn):
+        funded_cursor = db_conn.select(funded_sql)
+        raw_cursor = db_conn.select(raw_sql)
+        try:
+            for loan_over_time in _merge_loans_over_time(
+                funded_cursor, raw_cursor, size, logger
+            ):
+                yield loan_over_time
+        finally:
+            # Pending statements would lock the collected tables.
+            funded_cursor.close()
+            raw_cursor.close()
+
+
+def _merge_loans_over_time(funded_cursor, raw_cursor, size, logger):
+    """Generator of `iter_loans_over_time`, merging the rows of its cursors."""
+    # Position of each LoanRecord field within a rawLoans row.
+    columns = [description[0] for description in raw_cursor.description]
+    indexes = [
+        columns.index(field) if field in columns else None
+        for field in LoanRecord._fields
+    ]
+    id_index = columns.index('id')
+
+    raw_rows = _iter_fetchmany(raw_cursor, size)
+    raw = next(raw_rows, None)
+
+    for loan_id, snapshots in groupby(
+        _iter_fetchmany(funded_cursor, size), key=itemgetter(0)
+    ):
+        while raw is not None and raw[id_index] < loan_id:
+            raw = next(raw_rows, None)
+
+        if raw is None or raw[id_index] != loan_id:
+            continue
+
+        loan_over_time = LoanOverTime.from_record(
+            LoanRecord._make([
+                None if index is None else raw[index] for index in indexes
+            ]),
+            logger=logger
+        )
+        for _, asOfDate, fundedAmount in snapshots:
+            loan_over_time.add_snapshot(asOfDate, fundedAmount)
+
+        yield loan_over_time
+
+
+def get_funding_stats_sql(db_conn):
+    """Return SQL selecting per-loan funding statistics of the snapshots (see
+    `get_snapshots_sql`): `(id, amountStart, amountEnd, dateStart, dateEnd,
+    snapshots)`. As in `LoanOverTime`, `amountStart` is NULL if any snapshot
+    was unfunded (recorded as NULL).
+    When partitioned, the statistics of each group of partitions (see
+    `iter_partition_groups`) are first aggregated into the temporary table
+    `fundingStats`, and the SQL combines them; this must be called outside of
+    a transaction. Changes recorded under `config.FUNDING_CHANGES_ONLY` apply
+    across groups, so are collected (see `collect_history`) instead.
+    """
+    group_sql = """
+        SELECT id,
+               MIN(fundedAmount) AS amountStart,
+               MAX(fundedAmount) AS amountEnd,
+               MIN(asOfDate) AS dateStart,
+               MAX(asOfDate) AS dateEnd,
+               COUNT(fundedAmount) AS amounts,
+               COUNT(*) AS snapshots
+          FROM (%s)
+         GROUP BY id
+    """ % get_snapshots_sql()
+    create_sql = """
+        CREATE TEMP TABLE fundingStats(
+            id INTEGER,
+            amountStart REAL,
+            amountEnd REAL,
+            dateStart INTEGER,
+            dateEnd INTEGER,
+            amounts INTEGER,
+            snapshots INTEGER
+        )
+    """
+    sql = """
+        SELECT id,
+               CASE WHEN SUM(amounts) < SUM(snapshots) THEN NULL
+                    ELSE MIN(amountStart)
+               END AS amountStart,
+               MAX(amountEnd) AS amountEnd,
+               MIN(dateStart) AS dateStart,
+               MAX(dateEnd) AS dateEnd,
+               SUM(snapshots) AS snapshots
+          FROM %s
+         GROUP BY id
+    """
+    if not isinstance(db_conn, PartitionedDatabase):
+        return sql % ("(%s)" % group_sql)
+
+    db_conn.execute("DROP TABLE IF EXISTS temp.fundingStats")
+    db_conn.execute(create_sql)
+    if config.FUNDING_CHANGES_ONLY:
+        with collect_history(db_conn, ['loanFundingChanges']):
+            db_conn.execute("INSERT INTO temp.fundingStats %s" % group_sql)
+    else:
+        for _ in iter_partition_groups(db_conn):
+            db_conn.execute("INSERT INTO temp.fundingStats %s" % group_sql)
+    return sql % "temp.fundingStats"
+
+
+def iter_funding_stats(db_conn, size=None):
+    """Generator yielding lists of up to `size` (defaults to
+    `config.DATABASE_FETCH_SIZE`) rows of per-loan funding statistics, in id
+    order, aggregated from `loansFundedAsOfDate` (or `loanFundingChanges`, see
+    `get_funding_stats_sql`) in a single grouped pass (a pass per group of
+    partitions, when partitioned):
+    `(id, loanAmount, amountStart, amountEnd, dateStart, dateEnd, snapshots)`.
+    As with `iter_loans_over_time`, loans without a `rawLoans` row are skipped.
+    """
+    size = size or config.DATABASE_FETCH_SIZE
+    sql = """
+        SELECT funded.id,
+               rawLoans.loanAmount,
+               funded.amountStart,
+               funded.amountEnd,
+               funded.dateStart,
+               funded.dateEnd,
+               funded.snapshots
+          FROM (%s) AS funded
+         INNER JOIN rawLoans ON rawLoans.id = funded.id
+         ORDER BY funded.id
+    """ % get_funding_stats_sql(db_conn)
+    cursor = db_conn.select(sql)
+
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+
+def get_loans_from_changes(db_conn):
+    """Generator rebuilding the full per-snapshot view from the deltas in
+    `loanFundingChanges`. Rows are yielded in the same shape as `get_loans`
+    (funding columns followed by `rawLoans` columns), honouring the row factory.
+    Every recorded date in `rawLoanDates` yields a row for each listed loan.
+    When partitioned, the changes are collected first (see `collect_history`).
+    """
+    dates_sql = """
+        SELECT asOfDate
+          FROM rawLoanDates
+         ORDER BY asOfDate
+    """
+    changes_sql = """
+        SELECT asOfDate, fundedAmount, id, listed
+          FROM loanFundingChanges
+         ORDER BY asOfDate
+    """
+    raw_sql = """
+        SELECT *
+          FROM rawLoans
+         WHERE id = (?)
+    """
+    with collect_history(db_conn, ['loanFundingChanges']):
+        dates_cursor = db_conn.select(dates_sql)
+        changes_cursor = db_conn.select(changes_sql)
+        try:
+            amounts = {}
+            raw_rows = {}
+            change = changes_cursor.fetchone()
+
+            for (asOfDate,) in dates_cursor:
+                # Apply every change up to and including this snapshot.
+                while change and change[0] <= asOfDate:
+                    date, amount, loan_id, listed = change
+                    if listed:
+                        amounts[loan_id] = amount
+                    else:
+                        amounts.pop(loan_id, None)
+                        raw_rows.pop(loan_id, None)
+                    change = changes_cursor.fetchone()
+
+                for loan_id in sorted(amounts):
+                    if loan_id not in raw_rows:
+                        raw_rows[loan_id] = db_conn.execute(
+                            raw_sql, (loan_id,), results='fetchone'
+                        )
+
+                    raw = raw_rows[loan_id]
+                    if raw is None:
+                        continue  # Mirrors the inner join of `get_loans`.
+
+                    if isinstance(raw, dict):
+                        row = dict(raw)
+                        row.update(
+                            asOfDate=asOfDate,
+                            fundedAmount=amounts[loan_id],
+                            id=loan_id
+                        )
+                        yield row
+                    else:
+                        yield (
+                            (asOfDate, amounts[loan_id], loan_id) + tuple(raw)
+                        )
+        finally:
+            # Pending statements would lock the collected tables.
+            dates_cursor.close()
+            changes_cursor.close()
+
+
+def rebuild_funding_summary(db_conn, logger=None):
+    """Recreate `loanFundingSummary` from the funding history, in a single
+    transaction: from `loansFundedAsOfDate`, or from `loanFundingChanges` when
+    `config.FUNDING_CHANGES_ONLY` is set. When partitioned, the history is
+    aggregated a group of partitions at a time beforehand (see
+    `get_funding_stats_sql`). Returns number of loans summarized.
+    """
+    delete_sql = """
+        DELETE FROM loanFundingSummary
+    """
+    insert_sql = """
+        INSERT INTO loanFundingSummary(
+            id, loanAmount, dateStart, dateEnd, amountStart, amountEnd, snapshots
+        )
+        SELECT funded.id,
+               rawLoans.loanAmount,
+               funded.dateStart,
+               funded.dateEnd,
+               funded.amountStart,
+               funded.amountEnd,
+               funded.snapshots
+          FROM (%s) AS funded
+          LEFT JOIN rawLoans ON rawLoans.id = funded.id
+    """ % get_funding_stats_sql(db_conn)
+    count_sql = """
+        SELECT COUNT(*)
+          FROM loanFundingSummary
+    """
+    with db_conn.transaction():
+        db_conn.execute(delete_sql)
+        db_conn.execute(insert_sql)
+        count = db_conn.select(count_sql).fetchone()[0]
+
+    if logger:
+        logger.info("Rebuilt funding summary of %s loans.", count)
+    return count
+
+
+def check_sqlite_version():
+    """Raise SchemaVersionError if the SQLite library is older than
+    `MIN_SQLITE_VERSION`.
+    """
+    version = sqlite3.sqlite_version_info
+    if version < MIN_SQLITE_VERSION:
+        raise SchemaVersionError(
+            "SQLite %s is too old; %s or newer is required." % (
+                ".".join(map(str, version)),
+                ".".join(map(str, MIN_SQLITE_VERSION))
+            )
+        )
+
+
+def check_schema_version(db_conn):
+    """Raise SchemaVersionError unless the schema is at `SCHEMA_VERSION`, and
+    the SQLite library at least `MIN_SQLITE_VERSION`.
+    """
+    check_sqlite_version()
+    version = get_schema_version(db_conn)
+    if version != SCHEMA_VERSION:
+        raise SchemaVersionError(
+            "Database schema is version %s, expected %s. "
+            "Upgrade with `run.py --migrate`." % (version, SCHEMA_VERSION)
+        )
+
+
+def get_schema_version(db_conn):
+    """Return the schema version recorded in the database (0 if none)."""
+    return db_conn.select("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_conn, logger=None):
+    """Upgrade the schema in place to `SCHEMA_VERSION`, applying each pending
+    migration in its own transaction. Returns list of versions applied.
+    Raises SchemaVersionError if the database is newer than this code, or the
+    SQLite library older than `MIN_SQLITE_VERSION`; nothing is applied then.
+    """
+    check_sqlite_version()
+    version = get_schema_version(db_conn)
+    if version > SCHEMA_VERSION:
+        raise SchemaVersionError(
+            "Database schema is version %s, newer than %s." %
+            (version, SCHEMA_VERSION)
+        )
+
+    connection = db_conn.database
+    connection.create_function("epoch", 1, _epoch)
+    applied = []
+
+    for migration_version, script in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        # executescript bypasses the driver's transaction handling, so the
+        # transaction is managed explicitly.
+        try:
+            connection.executescript(
+                "BEGIN;\n%s\nPRAGMA user_version = %d;\nCOMMIT;" %
+                (script, migration_version)
+            )
+        except sqlite3.Error:
+            try:
+                connection.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            raise
+
+        applied.append(migration_version)
+        if logger:
+            logger.info("Migrated database schema to %s.", migration_version)
+
+    return applied
+
+
+class FundingChangeTracker(object):
+    """Keeps the last known `fundedAmount` per listed loan id, so that only
+    changes need to be recorded between snapshots. State is lazily seeded from
+    `loanFundingChanges` the first time it is used against a database.
+    """
+    def __init__(self):
+        self.amounts = None
+
+    def seed(self, db_conn):
+        """Load the latest recorded state of each still-listed loan, from every
+        partition when partitioned (see `iter_partition_groups`), a group at a
+        time; later groups supersede earlier ones.
+        """
+        sql = """
+            SELECT c.id, c.fundedAmount, c.listed
+              FROM loanFundingChanges c
+             INNER JOIN (
+                    SELECT id, MAX(asOfDate) AS asOfDate
+                      FROM loanFundingChanges
+                     GROUP BY id
+                   ) latest
+                ON c.id = latest.id AND c.asOfDate = latest.asOfDate
+        """
+        amounts = {}
+        for _ in iter_partition_groups(db_conn, whole=True):
+            for loan_id, amount, listed in db_conn.select(sql):
+                if listed:
+                    amounts[loan_id] = amount
+                else:
+                    amounts.pop(loan_id, None)
+        self.amounts = amounts
+
+    def get_changes(self, asOfDate, funded):
+        """Return change tuples `(asOfDate, fundedAmount, id, listed)` between
+        last known state and `funded`, an iterable of funded tuples as given by
+        `Loan.get_funded_tuple`. Loans no longer listed get `listed` of 0.
+        State is not altered; see `apply`.
+        """
+        amounts = self.amounts or {}
+        listed = set()
+        changes = []
+
+        for date, amount, loan_id in funded:
+            listed.add(loan_id)
+            if loan_id not in amounts or amounts[loan_id] != amount:
+                changes.append((asOfDate, amount, loan_id, 1))
+
+        for loan_id in amounts:
+            if loan_id not in listed:
+                changes.append((asOfDate, None, loan_id, 0))
+
+        return changes
+
+    def apply(self, changes):
+        """Update last known state with changes once they have been written."""
+        if self.amounts is None:
+            self.amounts = {}
+
+        for asOfDate, amount, loan_id, listed in changes:
+            if listed:
+                self.amounts[loan_id] = amount
+            else:
+                self.amounts.pop(loan_id, None)
+
+
+class RawLoanTracker(object):
+    """Keeps the set of loan ids stored in `rawLoans`, so that only loans not
+    seen before are encoded and inserted. State is lazily seeded from
+    `rawLoans` the first time it is used against a database.
+    """
+    def __init__(self):
+        self.ids = None
+
+    def seed(self, db_conn):
+        """Load the id of every stored loan."""
+        sql = """
+            SELECT id
+              FROM rawLoans
+        """
+        self.ids = set(row[0] for row in db_conn.select(sql))
+
+    def split(self, loans):
+        """Return tuple `(new, statuses)` of `loans`, a list of Loan instances
+        or a LoanBatch instance, partitioned by whether their id is known:
+        the new loans, of the same type as `loans`, and a list of status tuples
+        (see `Loan.get_status_tuple`) of the known loans, for
+        `update_raw_loan_statuses`. Either may be empty. State is not altered;
+        see `apply`.
+        """
+        ids = self.ids or set()
+
+        if hasattr(loans, 'take'):
+            new = []
+            known = []
+            for index, loan_id in enumerate(loans.columns['id']):
+                (known if loan_id in ids else new).append(index)
+            if not known:
+                return loans, []
+            return loans.take(new), list(loans.get_status_tuples(known))
+
+        new = [loan for loan in loans if loan.id not in ids]
+        statuses = [loan.get_status_tuple() for loan in loans if loan.id in ids]
+        return new, statuses
+
+    def apply(self, loans):
+        """Add ids of `loans` once they have been written."""
+        if self.ids is None:
+            self.ids = set()
+
+        if hasattr(loans, 'columns'):
+            self.ids.update(loans.columns['id'])  # LoanBatch
+        else:
+            self.ids.update(loan.id for loan in loans)
 
 
 class SqliteDatabase(object):
@@ -75,9 +952,14 @@ class SqliteDatabase(object):
     May be used with the with statement. This only guarantees connection state
     for instance. This will not prevent multiple database instances from
     attempting to use connections simeotaneously (driver is not threadsafe).
+    `path` defaults to `config.DATABASE`. `pragmas` is an optional sequence of
+    (name, value) pairs applied whenever the connection is opened.
     """
-    def __init__(self):
+    def __init__(self, path=None, pragmas=None):
         self._database = None
+        self._in_transaction = False
+        self.path = path
+        self.pragmas = pragmas
 
     def __enter__(self):
         return self  # lazy-load
@@ -88,7 +970,10 @@ class SqliteDatabase(object):
     @property
     def database(self):
         if not self._database:
-            self._database = sqlite3.connect(config.DATABASE)
+            self._database = sqlite3.connect(self.path or config.DATABASE)
+
+            for name, value in self.pragmas or ():
+                self._database.execute("PRAGMA %s = %s" % (name, value))
         return self._database
 
     def close(self):
@@ -109,7 +994,8 @@ class SqliteDatabase(object):
             else:
                 cursor.execute(sql)
 
-            self.database.commit()
+            if not self._in_transaction:
+                self.database.commit()
         except Exception as e:
             self.database.rollback()
             self.close()
@@ -127,12 +1013,439 @@ class SqliteDatabase(object):
         cursor = self.database.cursor()
         try:
             cursor.executemany(sql, params)
-            self.database.commit()
+
+            if not self._in_transaction:
+                self.database.commit()
         except Exception as e:
             self.database.rollback()
             self.close()
             raise e
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """Context manager deferring the commits of `execute`/`executemany`
+        calls made within it to a single commit on exit. On exception, the
+        transaction is rolled back and the connection closed. Nested uses join
+        the outer transaction.
+        """
+        if self._in_transaction:
+            yield self
+            return
+
+        self._in_transaction = True
+        try:
+            yield self
+            self.database.commit()
+        except Exception:
+            if self._database:
+                self._database.rollback()
+            self.close()
+            raise
+        finally:
+            self._in_transaction = False
+
+    def select(self, sql, params=None):
+        """Return a cursor having executed `sql` with optional `params`, for
+        iterating over large result sets. Rows are always tuples, regardless of
+        row factory. Nothing is committed.
+        """
+        cursor = self.database.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params or ())
+        return cursor
+
     def set_row_factory(self, function=_dict_factory):
         """Set the row factory to function passed. Defaults to dict factory."""
         self.database.row_factory = function
+
+
+def _get_month(asOfDate):
+    """Return tuple (year, month) of epoch `asOfDate`, in UTC."""
+    return tuple(time.gmtime(asOfDate)[:2])
+
+
+def _get_month_bounds(month):
+    """Return tuple of the first epoch of `month` and of the month after."""
+    year, number = month
+    following = (year + 1, 1) if number == 12 else (year, number + 1)
+    return (
+        calendar.timegm(month + (1, 0, 0, 0)),
+        calendar.timegm(following + (1, 0, 0, 0))
+    )
+
+
+def _get_suffix(month):
+    return "%04d_%02d" % month
+
+
+def get_partition_path(directory, asOfDate):
+    """Return path of the partition in `directory` holding `asOfDate`."""
+    return os.path.join(
+        directory, "snapshots-%04d-%02d.db" % _get_month(asOfDate)
+    )
+
+
+def get_partitions(directory):
+    """Return list of tuples `((year, month), path)` of the partitions in
+    `directory`, oldest first.
+    """
+    if not directory or not os.path.isdir(directory):
+        return []
+
+    partitions = []
+    for name in sorted(os.listdir(directory)):
+        match = _PARTITION_RE.match(name)
+        if match:
+            month = (int(match.group(1)), int(match.group(2)))
+            partitions.append((month, os.path.join(directory, name)))
+    return partitions
+
+
+def is_frozen(path):
+    """Return True if partition `path` has been frozen by `freeze_partition`."""
+    return not os.stat(path).st_mode & stat.S_IWUSR
+
+
+def freeze_partition(path):
+    """Compact partition `path` into a single self-contained file and make it
+    read-only; it is attached read-only from then on, and may be archived or
+    moved on its own.
+    """
+    with SqliteDatabase(path=path) as db_conn:
+        db_conn.execute("PRAGMA journal_mode = DELETE")
+        db_conn.execute("VACUUM")
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def freeze_partitions(directory, before=None, logger=None):
+    """Freeze every partition in `directory` of a month before that of epoch
+    `before` (defaults to now). Returns list of paths frozen.
+    """
+    month = _get_month(time.time() if before is None else before)
+    frozen = []
+
+    for partition_month, path in get_partitions(directory):
+        if partition_month >= month or is_frozen(path):
+            continue
+
+        freeze_partition(path)
+        frozen.append(path)
+        if logger:
+            logger.info("Froze partition %s.", path)
+
+    return frozen
+
+
+def get_database(path=None, pragmas=None, start=None, end=None):
+    """Return a PartitionedDatabase when `config.PARTITION_PATH` is set,
+    spanning the partitions of `start` to `end`; otherwise a SqliteDatabase.
+    """
+    if config.PARTITION_PATH:
+        return PartitionedDatabase(
+            path=path, pragmas=pragmas, start=start, end=end
+        )
+    return SqliteDatabase(path=path, pragmas=pragmas)
+
+
+class PartitionedDatabase(SqliteDatabase):
+    """SqliteDatabase whose snapshot tables (`PARTITION_TABLES`) are split into
+    one database file per month, in `directory` (defaults to
+    `config.PARTITION_PATH`). The main database keeps `rawLoans`,
+    `rawLoanDates` and `loanFundingSummary`, and any history recorded before
+    partitioning.
+    Partitions overlapping epochs `start` to `end` (unbounded if NoneType) are
+    attached on connecting, and temporary views named after each snapshot
+    table span them and the main database, so reads are unchanged. Rows
+    inserted through the views go to the partition of their `asOfDate`, which
+    must be attached (see `attach_partition`); rows deleted through them are
+    deleted from unfrozen partitions only. Frozen partitions are attached
+    read-only.
+    At most `MAX_PARTITIONS` may be attached at once; when more overlap the
+    range, the latest are attached on connecting. Reads of the whole history
+    go through `iter_groups` (or `collect`), as the functions of this module
+    do, so that older partitions are read as well.
+    In WAL mode, transactions are atomic per file rather than across them.
+    """
+    def __init__(self, path=None, pragmas=None, directory=None, start=None,
+                 end=None):
+        SqliteDatabase.__init__(self, path=path, pragmas=pragmas)
+        self.directory = directory or config.PARTITION_PATH
+        self.start = start
+        self.end = end
+        self.attached = OrderedDict()  # Month to path, least recently used first.
+
+    def get_window(self):
+        """Return list of tuples `((year, month), path)` of the partitions
+        overlapping `start` to `end`, oldest first.
+        """
+        window = []
+        for month, path in get_partitions(self.directory):
+            lower, upper = _get_month_bounds(month)
+            if (
+                (self.start is None or upper > self.start) and
+                (self.end is None or lower <= self.end)
+            ):
+                window.append((month, path))
+        return window
+
+    def get_frozen_bounds(self):
+        """Return list of tuples `(start, end)` of the epochs spanned by each
+        frozen partition in the window; rows in them cannot be deleted.
+        """
+        return [
+            _get_month_bounds(month) for month, path in self.get_window()
+            if is_frozen(path)
+        ]
+
+    @property
+    def database(self):
+        if not self._database:
+            window = self.get_window()[-MAX_PARTITIONS:]
+            SqliteDatabase.database.fget(self)
+            self.attached = OrderedDict()
+
+            try:
+                for month, path in window:
+                    self._attach(month, path)
+                self._create_views()
+            except sqlite3.Error:
+                self.close()
+                raise
+        return self._database
+
+    def _attach(self, month, path):
+        if is_frozen(path):
+            path = "file:%s?mode=ro" % urllib.pathname2url(
+                os.path.abspath(path)
+            )
+        self._database.execute(
+            "ATTACH DATABASE ? AS snapshots_%s" % _get_suffix(month), (path,)
+        )
+        self.attached[month] = path
+
+    def _create_views(self, main=True):
+        """(Re)create the temporary views and triggers over the partitions,
+        and over the history of the main database if `main`.
+        """
+        connection = self._database
+
+        for table, columns in PARTITION_TABLES:
+            column_list = ", ".join(columns)
+            selects = ["SELECT %s FROM main.%s%s" % (
+                column_list, table, "" if main else " WHERE 0"
+            )]
+            ranges = []
+            deletes = []
+
+            connection.execute("DROP VIEW IF EXISTS temp.%s" % table)
+            for month, path in self.attached.iteritems():
+                selects.append("SELECT %s FROM snapshots_%s.%s_%s" % (
+                    column_list, _get_suffix(month), table, _get_suffix(month)
+                ))
+            connection.execute("CREATE TEMP VIEW %s AS %s" % (
+                table, " UNION ALL ".join(selects)
+            ))
+
+            for month, path in self.attached.iteritems():
+                partition_table = "%s_%s" % (table, _get_suffix(month))
+                condition = "NEW.asOfDate >= %d AND NEW.asOfDate < %d" % (
+                    _get_month_bounds(month)
+                )
+                ranges.append("(%s)" % condition)
+                connection.execute("""
+                    CREATE TEMP TRIGGER %s_insert
+                    INSTEAD OF INSERT ON %s WHEN %s
+                    BEGIN
+                        INSERT INTO %s(%s) VALUES(%s);
+                    END
+                """ % (
+                    partition_table, table, condition, partition_table,
+                    column_list,
+                    ", ".join("NEW.%s" % column for column in columns)
+                ))
+
+                if not path.startswith("file:"):
+                    deletes.append(
+                        "DELETE FROM %s WHERE id = OLD.id "
+                        "AND asOfDate = OLD.asOfDate;" % partition_table
+                    )
+
+            connection.execute("""
+                CREATE TEMP TRIGGER %s_insert
+                INSTEAD OF INSERT ON %s WHEN NOT (%s)
+                BEGIN
+                    SELECT RAISE(ABORT, 'No partition attached for asOfDate');
+                END
+            """ % (table, table, " OR ".join(ranges) or "0"))
+
+            connection.execute("""
+                CREATE TEMP TRIGGER %s_delete
+                INSTEAD OF DELETE ON %s
+                BEGIN
+                    %s
+                END
+            """ % (table, table, "\n".join(deletes) or "SELECT NULL;"))
+
+    def attach_partition(self, asOfDate):
+        """Attach the partition holding `asOfDate`, creating it if need be.
+        Beyond `MAX_PARTITIONS`, the least recently used partition is detached.
+        Within a transaction, the partition must already be attached.
+        """
+        month = _get_month(asOfDate)
+        connection = self.database
+
+        if month in self.attached:
+            self.attached[month] = self.attached.pop(month)
+            return
+
+        if self._in_transaction:
+            raise sqlite3.OperationalError(
+                "Cannot attach partition %04d-%02d within a transaction." %
+                month
+            )
+
+        path = get_partition_path(self.directory, asOfDate)
+        if not os.path.exists(path):
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with SqliteDatabase(path=path) as partition:
+                partition.database.executescript(
+                    PARTITION_SCRIPT % {'suffix': _get_suffix(month)}
+                )
+
+        for table, _ in PARTITION_TABLES:
+            connection.execute("DROP VIEW IF EXISTS temp.%s" % table)
+        while len(self.attached) >= MAX_PARTITIONS:
+            oldest, _ = self.attached.popitem(last=False)
+            connection.execute(
+                "DETACH DATABASE snapshots_%s" % _get_suffix(oldest)
+            )
+
+        self._attach(month, path)
+        self._create_views()
+
+    def _attach_group(self, group, main=True):
+        """Detach every partition and attach those of `group`, a list of
+        tuples `((year, month), path)`, in their place; the views span them,
+        and the history of the main database if `main`.
+        """
+        if self._in_transaction:
+            raise sqlite3.OperationalError(
+                "Cannot attach partitions within a transaction."
+            )
+        connection = self.database
+
+        for table, _ in PARTITION_TABLES:
+            connection.execute("DROP VIEW IF EXISTS temp.%s" % table)
+        while self.attached:
+            month, _ = self.attached.popitem(last=False)
+            connection.execute(
+                "DETACH DATABASE snapshots_%s" % _get_suffix(month)
+            )
+
+        for month, path in group:
+            self._attach(month, path)
+        self._create_views(main=main)
+
+    def iter_groups(self, partitions=None):
+        """Generator attaching `partitions` (defaults to the window), a list
+        of tuples `((year, month), path)` oldest first, `MAX_PARTITIONS` at a
+        time in place of the others, and yielding each group once attached.
+        The history of the main database is read in the first group only, so
+        every row is read through the views in exactly one group. Yields once,
+        attaching nothing, if `partitions` are all attached already. Once
+        done, the partitions attached before are attached again.
+        Raises sqlite3.OperationalError within a transaction, unless nothing
+        is attached.
+        """
+        if partitions is None:
+            partitions = self.get_window()
+        self.database  # Connects, attaching the latest partitions.
+
+        if all(month in self.attached for month, _ in partitions):
+            yield partitions
+            return
+
+        paths = dict(get_partitions(self.directory))
+        previous = [(month, paths[month]) for month in self.attached]
+        try:
+            for index in range(0, len(partitions), MAX_PARTITIONS):
+                group = partitions[index:index + MAX_PARTITIONS]
+                self._attach_group(group, main=not index)
+                yield group
+        finally:
+            self._attach_group(previous)
+
+    @contextlib.contextmanager
+    def collect(self, tables=None):
+        """Context manager under which the snapshot tables named `tables`
+        (defaults to every one of `PARTITION_TABLES`) read the history of the
+        whole window at once, for reads that cannot be split by partition
+        (such as ordered by loan). If the window is not attached at once,
+        their rows are copied a group at a time (see `iter_groups`) into
+        temporary tables named after them, in place of the views until exit;
+        these must not be written to.
+        """
+        window = self.get_window()
+        self.database  # Connects, attaching the latest partitions.
+        if all(month in self.attached for month, _ in window):
+            yield self
+            return
+
+        columns = dict(PARTITION_TABLES)
+        tables = tables or [table for table, _ in PARTITION_TABLES]
+        for table in tables:
+            self.execute("DROP TABLE IF EXISTS temp.%sHistory" % table)
+            self.execute("CREATE TEMP TABLE %sHistory(%s)" % (
+                table, ", ".join(columns[table])
+            ))
+
+        for _ in self.iter_groups(window):
+            for table in tables:
+                self.execute(
+                    "INSERT INTO temp.%sHistory SELECT %s FROM %s" %
+                    (table, ", ".join(columns[table]), table)
+                )
+
+        for table in tables:
+            self.execute("DROP VIEW temp.%s" % table)
+            self.execute(
+                "ALTER TABLE temp.%sHistory RENAME TO %s" % (table, table)
+            )
+        try:
+            yield self
+        finally:
+            if self._database:
+                for table in tables:
+                    self.execute("DROP TABLE temp.%s" % table)
+                self._create_views()
+
+
+def iter_partition_groups(db_conn, whole=False):
+    """Generator yielding once per group of partitions attached in turn (see
+    `PartitionedDatabase.iter_groups`), spanning the window of `db_conn`, or
+    every partition if `whole`; or once if `db_conn` is not partitioned.
+    Queries run at each yield read every row exactly once in all.
+    """
+    if not isinstance(db_conn, PartitionedDatabase):
+        yield []
+        return
+
+    partitions = get_partitions(db_conn.directory) if whole else None
+    for group in db_conn.iter_groups(partitions):
+        yield group
+
+
+@contextlib.contextmanager
+def collect_history(db_conn, tables=None):
+    """Context manager under which the snapshot tables named `tables` read
+    the whole history through `db_conn` at once (see
+    `PartitionedDatabase.collect`); does nothing if `db_conn` is not
+    partitioned.
+    """
+    if not isinstance(db_conn, PartitionedDatabase):
+        yield db_conn
+        return
+
+    with db_conn.collect(tables) as collected:
+        yield collected
@@ -0,0 +1,120 @@
+"""Includes conversion of Lending Club date strings to unix timestamps.
+The `get_epoch` method should be used rather than parsing dates directly: it
+takes a strict fast path for the timestamp format used by the API, falls back
+to `dateutil` for anything else, and memoizes results in a bounded LRU cache.
+"""
+
+import calendar
+import config
+import datetime
+import dateutil.parser
+import re
+import threading
+
+from collections import OrderedDict
+
+
+# e.g. "2015-01-01T17:39:34.411-08:00"; offset may also be "Z" or absent.
+_LC_DATE_RE = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?"
+    r"(?:(Z)|([+-])(\d{2}):?(\d{2}))?$"
+)
+_ORDINAL_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+def _parse_epoch(date_string):
+    """Return unix timestamp (integer) of `date_string`. The UTC offset of the
+    string is honoured; strings without one are taken to be UTC.
+    """
+    match = _LC_DATE_RE.match(date_string)
+
+    if not match:
+        parsed = dateutil.parser.parse(date_string)
+        return calendar.timegm(parsed.utctimetuple())
+
+    year, month, day, hour, minute, second, zulu, sign, off_h, off_m = (
+        match.groups()
+    )
+    days = datetime.date(int(year), int(month), int(day)).toordinal()
+    epoch = (
+        (days - _ORDINAL_EPOCH) * 86400 +
+        int(hour) * 3600 + int(minute) * 60 + int(second)
+    )
+
+    if sign:
+        offset = int(off_h) * 3600 + int(off_m) * 60
+        epoch = epoch - offset if sign == '+' else epoch + offset
+
+    return epoch
+
+
+class EpochCache(object):
+    """Size-bounded LRU cache of date string to unix timestamp.
+    Counts hits and misses, which are reported by `info`. Safe to share between
+    threads.
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or config.EPOCH_CACHE_SIZE
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_epoch(self, date_string):
+        """Return unix timestamp of `date_string`, converting on a miss."""
+        with self._lock:
+            epoch = self._cache.pop(date_string, None)
+            if epoch is not None:
+                self.hits += 1
+                self._cache[date_string] = epoch  # Most recently used.
+                return epoch
+
+        epoch = _parse_epoch(date_string)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[date_string] = epoch
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+        return epoch
+
+    def info(self):
+        """Return dictionary of cache hits, misses, size and maxsize."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'maxsize': self.maxsize
+        }
+
+
+_cache = EpochCache()
+
+
+def cache_info():
+    """Return hit/miss counters of the shared cache used by `get_epoch`."""
+    return _cache.info()
+
+
+def get_epoch(date_string):
+    """Return unix timestamp (integer) of `date_string` using shared cache."""
+    return _cache.get_epoch(date_string)
+
+
+def parse_date(value):
+    """Return `value`, an epoch or date string, as an epoch."""
+    if value is None or isinstance(value, (int, long)):
+        return value
+    if value.isdigit():
+        return int(value)
+    return get_epoch(value)
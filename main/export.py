@@ -0,0 +1,156 @@
+"""Includes export of the funding history to CSV, replacing
+`assets/export_csv.sh`. Rows are streamed from the database
+`config.DATABASE_FETCH_SIZE` at a time and written as they are fetched, gzipped
+when the output path ends with ".gz". Exports may be limited to a range of
+`asOfDate` and to loan grades, and may include the `rawLoans` columns of each
+loan.
+
+A watermark file records the last snapshot exported (by `snapshotId`, so
+snapshots replayed out of date order are not missed); exporting with the same
+watermark again writes only snapshots recorded since. The watermark is only
+advanced once the export has been written completely.
+"""
+
+import config
+import csv
+import dates
+import database
+import gzip
+import log
+import os
+
+
+def _encode(row):
+    return [
+        value.encode('utf-8') if isinstance(value, unicode) else value
+        for value in row
+    ]
+
+
+def get_watermark(path):
+    """Return `snapshotId` recorded in watermark file `path`, or 0 if none."""
+    try:
+        with open(path) as watermark_file:
+            return int(watermark_file.read().strip() or 0)
+    except IOError:
+        return 0
+
+
+def set_watermark(path, snapshot_id):
+    """Record `snapshot_id` in watermark file `path`, via a temporary file
+    renamed into place.
+    """
+    temp_path = "%s.%s.tmp" % (path, os.getpid())
+    with open(temp_path, 'w') as watermark_file:
+        watermark_file.write("%d\n" % snapshot_id)
+    os.rename(temp_path, path)
+
+
+def get_export_query(start=None, end=None, grades=None, raw=False,
+                     after=0, until=None):
+    """Return (sql, params) selecting funding history ordered by id and
+    `asOfDate`, as the columns of `loansFundedAsOfDate` (or of
+    `loanFundingChanges` when `config.FUNDING_CHANGES_ONLY` is set) followed by
+    those of `rawLoans` when `raw` is True. Snapshots are limited to `asOfDate`
+    between `start` and `end` inclusive, and to `snapshotId` greater than
+    `after` and no greater than `until`. Loans are limited to `grades`.
+    """
+    table = (
+        "loanFundingChanges" if config.FUNDING_CHANGES_ONLY
+        else "loansFundedAsOfDate"
+    )
+    conditions = ["snapshots.snapshotId > ?"]
+    params = [after]
+
+    if until is not None:
+        conditions.append("snapshots.snapshotId <= ?")
+        params.append(until)
+    if start is not None:
+        conditions.append("funded.asOfDate >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("funded.asOfDate <= ?")
+        params.append(end)
+    if grades:
+        conditions.append(
+            "rawLoans.grade IN (%s)" % ",".join("?" * len(grades))
+        )
+        params.extend(grades)
+
+    sql = """
+        SELECT funded.*%s
+          FROM %s AS funded
+         INNER JOIN rawLoanDates AS snapshots
+            ON snapshots.asOfDate = funded.asOfDate
+          %s
+         WHERE %s
+         ORDER BY funded.id, funded.asOfDate
+    """ % (
+        ", rawLoans.*" if raw else "",
+        table,
+        "INNER JOIN rawLoans ON rawLoans.id = funded.id"
+        if raw or grades else "",
+        "\n           AND ".join(conditions)
+    )
+    return sql, params
+
+
+def export(db_conn, path, start=None, end=None, grades=None, raw=False,
+           watermark=None, size=None):
+    """Write funding history of `db_conn` to CSV file `path` (gzipped if it
+    ends with ".gz"), with a header row. `start` and `end` limit the
+    `asOfDate` range (epochs or date strings), `grades` the loan grades, and
+    `raw` adds the `rawLoans` columns; loans without a `rawLoans` row are then
+    skipped. With a `watermark` file path, only snapshots recorded since the
+    last export with that watermark are written. Returns number of rows
+    written.
+    When partitioned, rows are written a group of partitions at a time (see
+    `database.iter_partition_groups`), and ordered within each group.
+    """
+    size = size or config.DATABASE_FETCH_SIZE
+    after = get_watermark(watermark) if watermark else 0
+    # Snapshots recorded while exporting are left for the next export.
+    until = db_conn.select(
+        "SELECT IFNULL(MAX(snapshotId), 0) FROM rawLoanDates"
+    ).fetchone()[0]
+
+    sql, params = get_export_query(
+        start=dates.parse_date(start),
+        end=dates.parse_date(end),
+        grades=grades,
+        raw=raw,
+        after=after,
+        until=until
+    )
+    rows = 0
+
+    if path.endswith(".gz"):
+        export_file = gzip.open(path, 'wb', config.EXPORT_COMPRESS_LEVEL)
+    else:
+        export_file = open(path, 'wb')
+
+    with export_file:
+        writer = csv.writer(export_file)
+
+        for index, _ in enumerate(database.iter_partition_groups(db_conn)):
+            cursor = db_conn.select(sql, params)
+            if not index:
+                writer.writerow(
+                    [description[0] for description in cursor.description]
+                )
+
+            while True:
+                chunk = cursor.fetchmany(size)
+                if not chunk:
+                    break
+                writer.writerows(_encode(row) for row in chunk)
+                rows += len(chunk)
+
+    if watermark:
+        set_watermark(watermark, until)
+
+    log.get_logger(__name__).info(
+        "Exported %s rows of snapshots %s to %s to %s.",
+        rows, after + 1, until, path
+    )
+    return rows
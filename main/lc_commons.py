@@ -3,39 +3,361 @@ successful response into database.
 """
 
 import api
+import archive
 import config
 import database
+import dates
 import log
+import metrics
+import storage
 import time
 
-from loans import Loan
+from collections import Counter
+from loans import DAY_EPOCH, LoanBatch
+
+
+DROP_BUCKET = 300  # Seconds of the day per bucket of observed listing drops.
+DROP_LEAD = 60  # Seconds before an expected drop that fast polling starts.
+DROP_OBSERVATIONS = 2  # Listing jumps in a bucket before a drop is expected.
+DROP_WINDOW = 900  # Seconds after an expected drop that fast polling lasts.
+LISTING_JUMP = 0.05  # Fractional growth in listed loans counted as a drop.
+POLLING_BACKOFF = 1.5  # Interval growth after each unchanged snapshot.
+SEED_DAYS = 14  # Days of recorded snapshots learnt from at startup.
+
+_archive = None
+_scheduler = None
+_session = None
+
+
+class PollScheduler(object):
+    """Adaptive polling schedule, learnt from the snapshots observed.
+    Polls every `interval` seconds (defaults to `config.POLLING_INTERVAL`)
+    while `asOfDate` keeps changing, backing off by `POLLING_BACKOFF` up to
+    `max_interval` (defaults to `config.POLLING_MAX_INTERVAL`) for each
+    unchanged snapshot. Times of day at which the number of listed loans
+    jumped (listing drops) are counted in `DROP_BUCKET` second buckets; once a
+    bucket has `DROP_OBSERVATIONS`, polls are made every `min_interval`
+    (defaults to `config.POLLING_MIN_INTERVAL`) from `DROP_LEAD` seconds
+    before it until `DROP_WINDOW` seconds after.
+    Requests are drawn from a token bucket refilled at `budget` (defaults to
+    `config.POLLING_BUDGET`) requests an hour and holding at most an hour's
+    worth, so fast polling is paid for by backing off, and the average rate
+    never exceeds the budget.
+    """
+    def __init__(self, interval=None, min_interval=None, max_interval=None,
+                 budget=None):
+        if interval is None:
+            interval = config.POLLING_INTERVAL
+
+        self.base_interval = interval
+        self.interval = interval
+        self.min_interval = min_interval or config.POLLING_MIN_INTERVAL
+        self.max_interval = max(
+            max_interval or config.POLLING_MAX_INTERVAL, interval
+        )
+        self.budget = budget or config.POLLING_BUDGET
+        self.drops = Counter()  # Observed listing jumps, by bucket of day.
+        self.tokens = 1.0
+
+        self._asOfDate = None
+        self._loan_count = None
+        self._refilled = None
+
+    def seed(self, db_conn, now=None):
+        """Learn listing drops from the snapshots recorded in the `SEED_DAYS`
+        before `now` (see `database.get_snapshots_sql`).
+        """
+        sql = """
+            SELECT asOfDate, COUNT(*)
+              FROM (%s)
+             WHERE asOfDate >= ?
+             GROUP BY asOfDate
+             ORDER BY asOfDate
+        """ % database.get_snapshots_sql()
+        since = int(time.time() if now is None else now) - SEED_DAYS * DAY_EPOCH
+        for asOfDate, loan_count in db_conn.select(sql, (since,)):
+            self._observe_count(asOfDate, loan_count)
+            self._asOfDate = asOfDate
+
+    def _observe_count(self, asOfDate, loan_count):
+        if loan_count is None:
+            return
+
+        if (
+            self._loan_count is not None and
+            loan_count - self._loan_count > LISTING_JUMP * self._loan_count
+        ):
+            self.drops[asOfDate % DAY_EPOCH // DROP_BUCKET] += 1
+        self._loan_count = loan_count
+
+    def observe(self, asOfDate, loan_count=None):
+        """Learn from a polled snapshot of epoch `asOfDate`, listing
+        `loan_count` loans (NoneType if unknown, e.g. already recorded).
+        """
+        if asOfDate == self._asOfDate:
+            self.interval = min(
+                self.max_interval, self.interval * POLLING_BACKOFF
+            )
+            return
+
+        self.interval = self.base_interval
+        self._observe_count(asOfDate, loan_count)
+        self._asOfDate = asOfDate
+
+    def get_next_drop(self, now):
+        """Return seconds until the fast polling window of the next expected
+        listing drop opens; 0 if `now` is within one, NoneType if none are
+        expected.
+        """
+        time_of_day = now % DAY_EPOCH
+        waits = []
+
+        for bucket, count in self.drops.iteritems():
+            if count < DROP_OBSERVATIONS:
+                continue
+
+            start = bucket * DROP_BUCKET - DROP_LEAD
+            end = (bucket + 1) * DROP_BUCKET + DROP_WINDOW
+            if start <= time_of_day < end or (
+                start <= time_of_day - DAY_EPOCH < end
+            ):
+                return 0
+            waits.append((start - time_of_day) % DAY_EPOCH)
+
+        return min(waits) if waits else None
+
+    def _refill(self, now):
+        if self._refilled is not None:
+            self.tokens = min(
+                float(self.budget),
+                self.tokens + (now - self._refilled) * self.budget / 3600.0
+            )
+        self._refilled = now
+
+    def get_delay(self, now=None):
+        """Return seconds to wait from `now` before the next poll."""
+        now = time.time() if now is None else now
+        self._refill(now)
+
+        next_drop = self.get_next_drop(now)
+        if next_drop == 0:
+            delay = self.min_interval
+        elif next_drop is not None:
+            delay = min(self.interval, next_drop)
+        else:
+            delay = self.interval
+
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) * 3600.0 / self.budget)
+        return delay
+
+    def record_request(self, now=None):
+        """Spend a request from the budget."""
+        self._refill(time.time() if now is None else now)
+        self.tokens -= 1
+
+
+def _log_recorded(asOfDate, loan_count, funded_rows):
+    """Log outcome of recording a snapshot."""
+    logger = log.get_logger(__name__)
+
+    if funded_rows is None:
+        logger.info("%s already exists.", asOfDate)
+    elif config.FUNDING_CHANGES_ONLY:
+        logger.info(
+            "%s added %s loans (%s funding changes).",
+            asOfDate,
+            loan_count,
+            funded_rows
+        )
+    else:
+        logger.info("%s added %s loans.", asOfDate, loan_count)
+
+
+def _record_metrics(loan_count, funded_rows, seconds):
+    """Update metrics for a snapshot of `loan_count` loans recorded in
+    `seconds`.
+    """
+    metrics.LOANS.inc(loan_count)
+
+    if funded_rows is None:
+        metrics.CYCLES.inc(outcome="duplicate")
+        metrics.DUPLICATES.inc()
+    else:
+        metrics.CYCLES.inc(outcome="recorded")
+        metrics.ROWS_WRITTEN.inc(funded_rows)
+        if seconds:
+            metrics.LOANS_PER_SECOND.set(loan_count / seconds)
+
+
+def close_archive():
+    """Close the snapshot archive, if open."""
+    global _archive
+    if _archive:
+        _archive.close()
+        _archive = None
+
+
+def close_session():
+    """Close the ingest session, if open."""
+    global _session
+    if _session:
+        _session.close()
+        _session = None
+
+
+def get_scheduler(delay=None):
+    """Return the process-wide PollScheduler, creating it on first use with
+    base interval `delay`, and seeding it from the ingest session's database
+    (SQLite storage only).
+    """
+    global _scheduler
+    if not _scheduler:
+        _scheduler = PollScheduler(interval=delay)
+        session = get_session()
+        if isinstance(session, storage.SqliteStorage):
+            _scheduler.seed(session.db_conn)
+    return _scheduler
+
+
+def get_archive(path=None):
+    """Return the process-wide `archive.SnapshotArchive`, opening it on first
+    use, or NoneType when archiving is off. `path` defaults to
+    `config.ARCHIVE_PATH` and only applies when opening.
+    """
+    global _archive
+    path = path or config.ARCHIVE_PATH
+    if not _archive and path:
+        _archive = archive.SnapshotArchive(path)
+    return _archive
+
+
+def get_session(path=None):
+    """Return the process-wide ingest session, a `storage.Storage` (see
+    `storage.get_storage`), opening it on first use. `path` defaults to
+    `config.DATABASE` and only applies when opening.
+    Raises `database.SchemaVersionError` if the database is not migrated.
+    """
+    global _session
+    if not _session:
+        _session = storage.get_storage(path=path)
+    return _session
 
 
 def execute(token=None):
+    """Fetch and record one snapshot. Metrics are refreshed at the end of the
+    cycle (see `metrics.write_textfile`).
+    """
+    try:
+        with metrics.STAGE_SECONDS.time(stage="cycle"):
+            if config.STREAM_LISTINGS:
+                execute_streaming(token=token)
+            else:
+                _execute(token=token)
+    except Exception:
+        metrics.CYCLES.inc(outcome="error")
+        raise
+    finally:
+        metrics.write_textfile()
+
+
+def _execute(token=None):
     logger = log.get_logger(__name__)
 
     # Get the raw loans and loan information.
-    response_json = api.get_listed_loans(token=token)
+    response_json = api.get_listed_loans(token=token, archive=get_archive())
 
     if not response_json:
         logger.warn("Aborting. No API response.")
+        metrics.CYCLES.inc(outcome="no_response")
         return
 
+    record(response_json)
+
+
+def record(response_json, session=None):
+    """Parse an API listing response and record it to the database as a single
+    transaction, through `session` (defaults to `get_session()`). Returns the
+    number of funding rows written, or NoneType if already recorded.
+    """
+    start = time.time()
     asOfDate = response_json['asOfDate']
-    loans = [Loan(asOfDate, loan) for loan in response_json['loans']]
 
-    # Port over to database.
-    with database.SqliteDatabase() as db_conn:
+    with metrics.STAGE_SECONDS.time(stage="parse"):
+        loans = LoanBatch(dates.get_epoch(asOfDate), response_json['loans'])
 
-        if not database.has_been_recorded(asOfDate, db_conn):
-            # Populate tables.
-            database.add_raw_loan_dates(asOfDate, db_conn)
-            database.add_raw_loans(loans, db_conn)
-            database.add_loans_funded_as_of_date(loans, db_conn)
+    # Port over to database, as a single transaction.
+    session = session or get_session()
+    with metrics.STAGE_SECONDS.time(stage="write"):
+        funded_rows = session.record_snapshot(loans.asOfDate, loans)
+
+    _log_recorded(asOfDate, len(loans), funded_rows)
+    _record_metrics(len(loans), funded_rows, time.time() - start)
+    if _scheduler:
+        _scheduler.observe(loans.asOfDate, len(loans))
+    return funded_rows
 
-            logger.info("%s added %s loans." % (asOfDate, len(loans)))
-        else:
-            logger.info("%s already exists." % asOfDate)
+
+def execute_streaming(token=None, session=None):
+    """As `execute`, but the response is decoded incrementally and loans are
+    parsed and inserted `config.STREAM_CHUNK_SIZE` at a time, within a single
+    transaction, so memory use does not grow with the number of listings.
+    The body is not read past `asOfDate` if it has already been recorded.
+    As the stages interleave, time spent reading and decoding chunks counts as
+    `decode`, building batches as `parse`, and the remainder as `write`.
+    Returns the number of funding rows written, or NoneType if already
+    recorded or there was no response.
+    """
+    logger = log.get_logger(__name__)
+
+    listing = api.stream_listed_loans(token=token, archive=get_archive())
+
+    if not listing:
+        logger.warn("Aborting. No API response.")
+        metrics.CYCLES.inc(outcome="no_response")
+        return
+
+    start = time.time()
+    with listing:
+        asOfDate = listing.asOfDate
+        asOfEpoch = dates.get_epoch(asOfDate)
+        counts = {'loans': 0, 'decode': 0.0, 'parse': 0.0}
+
+        def iter_batches():
+            chunks = listing.iter_chunks(config.STREAM_CHUNK_SIZE)
+            while True:
+                mark = time.time()
+                chunk = next(chunks, None)
+                counts['decode'] += time.time() - mark
+                if chunk is None:
+                    return
+
+                mark = time.time()
+                batch = LoanBatch(asOfEpoch, chunk)
+                counts['parse'] += time.time() - mark
+                counts['loans'] += len(chunk)
+                yield batch
+
+        session = session or get_session()
+        funded_rows = session.record_snapshot_batches(asOfEpoch, iter_batches())
+
+    seconds = time.time() - start
+    metrics.FETCHED_BYTES.inc(listing.bytes_read)
+    metrics.STAGE_SECONDS.observe(counts['decode'], stage="decode")
+    metrics.STAGE_SECONDS.observe(counts['parse'], stage="parse")
+    metrics.STAGE_SECONDS.observe(
+        seconds - counts['decode'] - counts['parse'],
+        stage="write"
+    )
+
+    _log_recorded(asOfDate, counts['loans'], funded_rows)
+    _record_metrics(counts['loans'], funded_rows, seconds)
+    if _scheduler:
+        # The body is not read when already recorded, so the count is unknown.
+        _scheduler.observe(
+            asOfEpoch, None if funded_rows is None else counts['loans']
+        )
+    return funded_rows
 
 
 def execute_with_delay(delay=None, token=None):
@@ -48,6 +370,18 @@ def execute_with_delay(delay=None, token=None):
 
     if remaining_time > 0:
         time.sleep(remaining_time)
+    elif delay:
+        metrics.CYCLE_OVERRUNS.inc()
+
+
+def execute_with_schedule(token=None, scheduler=None):
+    """As `execute_with_delay`, but waiting before the request as `scheduler`
+    (defaults to `get_scheduler()`) decides.
+    """
+    scheduler = scheduler or get_scheduler()
+    time.sleep(scheduler.get_delay())
+    scheduler.record_request()
+    execute(token=token)
 
 
 if __name__ == "__main__":
@@ -55,7 +389,11 @@ if __name__ == "__main__":
     between requests and database inserts. For full functionality, execute the
     top level `run.py` instead.
     """
-    log.setup_logging(config.LOG_PATH)
+    log.setup_logging(logfile=config.LOG_PATH)
 
-    while True:
-        execute_with_delay()
+    try:
+        while True:
+            execute_with_delay()
+    finally:
+        close_session()
+        close_archive()
@@ -1,13 +1,18 @@
 """Includes loan entity class, and methods for validating and casting variables.
 """
 
-import dateutil.parser
-import time
+import dates
 
-from collections import OrderedDict
+from array import array
+from collections import OrderedDict, namedtuple
+from itertools import izip, repeat
+from operator import itemgetter
 
 
 DAY_EPOCH = 60 * 60 * 24  # One day, in seconds.
+# `rawLoans` columns that change while a loan is listed, kept current by
+# `database.update_raw_loan_statuses`; `id` last, as the key.
+STATUS_FIELDS = ('investorCount', 'reviewStatus', 'reviewStatusD', 'id')
 
 
 def _get_epoch(date_string):
@@ -15,7 +20,7 @@ def _get_epoch(date_string):
     if date_string:
         if type(date_string) == int:
             return date_string
-        return int(time.mktime(dateutil.parser.parse(date_string).timetuple()))
+        return dates.get_epoch(date_string)
 
 
 def _get_float(value):
@@ -131,64 +136,306 @@ class Loan(object):
         ('totHiCredLim', _get_int)
     ])
 
+    __slots__ = ('record',)
+
     def __init__(self, asOfDate, loan):
         """Initialized with date string asOfDate, and loan, a JSON dictionary
         containing loan data as part of the API response.
         """
-        self.values = {'asOfDate': asOfDate}
+        self.record = LoanRecord._make([
+            asOfDate if key == 'asOfDate' else cast(loan[key])
+            for key, cast in Loan.attributes.iteritems()
+        ])
 
-        for key, cast in Loan.attributes.iteritems():
+    @classmethod
+    def from_record(cls, record):
+        """Return Loan instance wrapping `record`, a LoanRecord instance."""
+        loan = cls.__new__(cls)
+        loan.record = record
+        return loan
 
-            if key == 'asOfDate':
-                continue
-
-            self.values[key] = cast(loan[key])
+    @property
+    def values(self):
+        """Dictionary copy of the record, keyed by attribute name."""
+        return dict(self.record.iteritems())
 
     def iteritems(self):
-        for key in Loan.attributes:
-            yield key, self.values[key]
+        return self.record.iteritems()
 
     @property
     def asOfDate(self):
-        return self.values.get('asOfDate')
+        return self.record.asOfDate
 
     @property
     def fundedAmount(self):
-        return self.values.get('fundedAmount')
+        return self.record.fundedAmount
 
     @property
     def id(self):
-        return self.values.get('id')
+        return self.record.id
+
+    def get_raw_loans_tuple(self):
+        return self.record.get_raw_loans_tuple()
+
+    def get_funded_tuple(self):
+        return self.record.get_funded_tuple()
+
+    def get_status_tuple(self):
+        return self.record.get_status_tuple()
+
+
+def make_record_type(name, attributes, excluded=('asOfDate', 'fundedAmount')):
+    """Return a compact, tuple-backed record class generated from the keys of
+    `attributes` (such as `Loan.attributes`). Fields are accessible by name or
+    by position, and instances carry no per-instance dictionary. `excluded`
+    fields are left out of `get_raw_loans_tuple`; `get_status_tuple` returns
+    the `STATUS_FIELDS`.
+    """
+    fields = list(attributes)
+    raw_getter = itemgetter(*[
+        index for index, field in enumerate(fields) if field not in excluded
+    ])
+    funded_getter = itemgetter(
+        fields.index('asOfDate'),
+        fields.index('fundedAmount'),
+        fields.index('id')
+    )
+    status_getter = itemgetter(*[fields.index(field) for field in STATUS_FIELDS])
+
+    def iteritems(self):
+        return izip(self._fields, self)
 
     def get_raw_loans_tuple(self):
-        return tuple([
-            v for k, v in self.iteritems() if k not in (
+        return raw_getter(self)
+
+    def get_funded_tuple(self):
+        return funded_getter(self)
+
+    def get_status_tuple(self):
+        return status_getter(self)
+
+    return type(name, (namedtuple(name, fields),), {
+        '__slots__': (),
+        'iteritems': iteritems,
+        'get_raw_loans_tuple': get_raw_loans_tuple,
+        'get_funded_tuple': get_funded_tuple,
+        'get_status_tuple': get_status_tuple
+    })
+
+
+LoanRecord = make_record_type('LoanRecord', Loan.attributes)
+_EMPTY_RECORD = LoanRecord._make([None] * len(Loan.attributes))
+
+
+def _make_column(cast, values):
+    """Returns tuple `(column, nulls)` for raw `values` cast as `cast` would.
+    Integer, epoch and float columns are packed into arrays; strings are kept as
+    a list. `nulls` is a bytearray mask, 1 where the cast yields NoneType.
+    """
+    nulls = bytearray(0 if value else 1 for value in values)
+
+    if cast is _get_int:
+        column = array('l', map(int, [value or 0 for value in values]))
+    elif cast is _get_float:
+        column = array('d', map(float, [value or 0 for value in values]))
+    elif cast is _get_epoch:
+        # Dates repeat heavily across loans; convert each distinct value once.
+        epochs = dict((value, _get_epoch(value)) for value in set(values))
+        column = array('l', [epochs[value] or 0 for value in values])
+    else:
+        column = map(cast, values)
+
+    return column, nulls
+
+
+class LoanBatch(object):
+    """LoanBatch instances reflect all loans of a single API response, stored
+    column-wise. Each entry of `Loan.attributes` is parsed in one pass over the
+    response into a typed column with an explicit null mask. Every value is
+    still visited in Python; what is saved is the per-loan object and record
+    churn, and repeated dates are converted once per batch. It may be passed
+    to the database methods in place of a list of Loan instances.
+    """
+
+    def __init__(self, asOfDate, loans):
+        """Initialized with date string asOfDate, and loans, the list of JSON
+        dictionaries containing loan data as part of the API response.
+        """
+        self.asOfDate = asOfDate
+        self.columns = OrderedDict()
+        self.nulls = OrderedDict()
+        self._size = len(loans)
+
+        for key, cast in Loan.attributes.iteritems():
+
+            if key == 'asOfDate':
+                continue
+
+            self.columns[key], self.nulls[key] = _make_column(
+                cast, [loan[key] for loan in loans]
+            )
+
+    def __len__(self):
+        return self._size
+
+    def column(self, key):
+        """Return column `key` as a list, where nulls are NoneType."""
+        if key == 'asOfDate':
+            return [self.asOfDate] * self._size
+
+        return [
+            None if null else value
+            for value, null in izip(self.columns[key], self.nulls[key])
+        ]
+
+    @property
+    def ids(self):
+        return self.column('id')
+
+    def take(self, indexes):
+        """Return LoanBatch of the loans at positions `indexes` only."""
+        batch = LoanBatch.__new__(LoanBatch)
+        batch.asOfDate = self.asOfDate
+        batch.columns = OrderedDict()
+        batch.nulls = OrderedDict()
+        batch._size = len(indexes)
+
+        for key, column in self.columns.iteritems():
+            values = [column[index] for index in indexes]
+            if isinstance(column, array):
+                values = array(column.typecode, values)
+            batch.columns[key] = values
+            nulls = self.nulls[key]
+            batch.nulls[key] = bytearray(nulls[index] for index in indexes)
+
+        return batch
+
+    @classmethod
+    def from_records(cls, asOfDate, records):
+        """Return LoanBatch of `records`, LoanRecord instances (such as
+        `Loan.record`) of a snapshot as of epoch `asOfDate`.
+        """
+        batch = cls.__new__(cls)
+        batch.asOfDate = asOfDate
+        batch.columns = OrderedDict()
+        batch.nulls = OrderedDict()
+        batch._size = len(records)
+
+        for index, (key, cast) in enumerate(Loan.attributes.iteritems()):
+
+            if key == 'asOfDate':
+                continue
+
+            batch.columns[key], batch.nulls[key] = _make_column(
+                cast, [record[index] for record in records]
+            )
+
+        return batch
+
+    def get_records(self):
+        """Return iterator of LoanRecord instances, one per loan."""
+        return (
+            LoanRecord._make(values)
+            for values in izip(*[self.column(key) for key in Loan.attributes])
+        )
+
+    def get_raw_loans_tuples(self):
+        """Return iterator of tuples, as `Loan.get_raw_loans_tuple` per loan."""
+        return izip(*[
+            self.column(key) for key in Loan.attributes if key not in (
                 'asOfDate', 'fundedAmount'
             )
         ])
 
-    def get_funded_tuple(self):
-        return (self.asOfDate, self.fundedAmount, self.id)
+    def get_funded_tuples(self):
+        """Return iterator of tuples, as `Loan.get_funded_tuple` per loan."""
+        return izip(
+            repeat(self.asOfDate),
+            self.column('fundedAmount'),
+            self.column('id')
+        )
+
+    def get_status_tuples(self, indexes=None):
+        """Return iterator of tuples, as `Loan.get_status_tuple` per loan, or
+        per loan at positions `indexes` only. Only the `STATUS_FIELDS` columns
+        are read.
+        """
+        if indexes is None:
+            return izip(*[self.column(key) for key in STATUS_FIELDS])
+
+        columns = []
+        for key in STATUS_FIELDS:
+            column = self.columns[key]
+            nulls = self.nulls[key]
+            columns.append([
+                None if nulls[index] else column[index] for index in indexes
+            ])
+        return izip(*columns)
 
 
 class LoanOverTime(Loan):
     """LoanOverTime instances reflect an individual loan over time. It inherits
     from `Loan` but includes a list of tuples which reflects a time and amount.
+    Summary statistics are maintained as snapshots are loaded, so all derived
+    properties besides `dates` and `amounts` are constant time regardless of
+    the number of snapshots.
     """
 
     def __init__(self, logger=None):
-        self.__loanTuples = []
         self.logger = logger
-        self.values = {}
+        self.record = _EMPTY_RECORD
         self._reset_properties()
 
+    @classmethod
+    def from_record(cls, record, logger=None):
+        """Return LoanOverTime instance with static fields of `record`, a
+        LoanRecord instance, and no snapshots loaded.
+        """
+        loan_over_time = cls(logger=logger)
+        loan_over_time.record = record._replace(
+            asOfDate=None,
+            fundedAmount=None
+        )
+        return loan_over_time
+
     def _reset_properties(self):
-        """Sets all dynamic properties to None. This method is called internally
-        when instantiating or when methods are used to alter loans object is
-        tracking.
+        """Sets all running statistics to their empty state. This method is
+        called internally when instantiating.
         """
-        self._amounts = None
-        self._dates = None
+        self._snapshots = []  # (asOfDate, fundedAmount) in order loaded.
+        self._seen = set()
+        self._unfunded = False
+        self._amountStart = None
+        self._amountEnd = None
+        self._dateStart = None
+        self._dateEnd = None
+
+    def add_snapshot(self, asOfDate, fundedAmount):
+        """Record `fundedAmount` as of `asOfDate`, updating running statistics.
+        Returns False (and records nothing) if `asOfDate` was already recorded.
+        Unfunded snapshots (`fundedAmount` of NoneType) leave `amountStart`
+        NoneType, and are otherwise skipped by the amount statistics.
+        """
+        if asOfDate in self._seen:
+            return False
+
+        if self._snapshots:
+            self._dateStart = min(self._dateStart, asOfDate)
+            self._dateEnd = max(self._dateEnd, asOfDate)
+        else:
+            self._dateStart = self._dateEnd = asOfDate
+
+        if fundedAmount is None:
+            self._unfunded = True
+        elif self._amountEnd is None:
+            self._amountStart = self._amountEnd = fundedAmount
+        else:
+            self._amountStart = min(self._amountStart, fundedAmount)
+            self._amountEnd = max(self._amountEnd, fundedAmount)
+
+        self._seen.add(asOfDate)
+        self._snapshots.append((asOfDate, fundedAmount))
+        return True
 
     def load(self, *loans):
         """Accepts any number of Loan instances recording their asOfDate and
@@ -197,88 +444,78 @@ class LoanOverTime(Loan):
         If any loans beyond the first do not match the id recorded, will throw
         an exception.
         """
-        self._reset_properties()  # No longer valid. Lazy-loaded as needed.
-
         for loan in loans:
             if type(loan) != Loan:
                 raise TypeError("method params must only be Loan instances.")
 
             # If it is the first loan, set values of static fields.
             if not self.id:
-                for key in Loan.attributes.iterkeys():
-
-                    if key in ('asOfDate', 'fundedAmount'):
-                        continue
-
-                    self.values[key] = loan.values[key]
+                self.record = loan.record._replace(
+                    asOfDate=None,
+                    fundedAmount=None
+                )
 
             # Ignore if the date has already been recorded.
-            if loan.asOfDate in self.dates:
+            if not self.add_snapshot(loan.asOfDate, loan.fundedAmount):
                 if self.logger:
                     self.logger.warn(
                         "Skipping %s: has already been loaded." % loan.asOfDate
                     )
                 print "Skipping %s: has already been loaded." % loan.asOfDate ##
-                continue
-
-            self.__loanTuples.append((loan.asOfDate, loan.fundedAmount))
 
     @property
     def amounts(self):
-        if self._amounts == None:
-            self._amounts = [lt[1] for lt in self.__loanTuples]
-        return self._amounts
+        """Return list of the amounts funded, in order loaded."""
+        return [fundedAmount for _, fundedAmount in self._snapshots]
 
     @property
     def amountStart(self):
-        if self.amounts:
-            return sorted(self.amounts)[0]
+        if not self._unfunded:
+            return self._amountStart
 
     @property
     def amountEnd(self):
-        if self.amounts:
-            return sorted(self.amounts)[-1]
+        return self._amountEnd
 
     @property
     def amountLeft(self):
-        """Return integer difference between total and starting amount."""
-        if self.amounts:
-            return self.loanAmount - self.amountStart
+        """Return integer difference between total and starting amount.
+        Unfunded snapshots are stored as NULL and count as 0 here.
+        """
+        if self._snapshots:
+            return self.loanAmount - (self.amountStart or 0)
 
     @property
     def dates(self):
-        if self._dates == None:
-            self._dates = [lt[0] for lt in self.__loanTuples]
-        return self._dates
+        """Return list of the dates recorded, in order loaded."""
+        return [asOfDate for asOfDate, _ in self._snapshots]
 
     @property
     def dateStart(self):
-        if self.dates:
-            return sorted(self.dates)[0]
+        return self._dateStart
 
     @property
     def dateDifference(self):
         """Returns epoch difference between first and last loan date."""
-        if self.dates:
+        if self._snapshots:
             return _get_epoch(self.dateEnd) - _get_epoch(self.dateStart)
 
     @property
     def dateEnd(self):
-        if self.dates:
-            return sorted(self.dates)[-1]
+        return self._dateEnd
 
     @property
     def fundedRate(self):
         """Returns rate in which amounts have been funded, as float."""
-        if self.amounts:
+        if self._snapshots:
             if self.amountLeft != 0:
-                return self.amountEnd / float(self.loanAmount)
+                return (self.amountEnd or 0) / float(self.loanAmount)
             else:
                 return 0
 
     @property
     def loanAmount(self):
-        return self.values.get('loanAmount')
+        return self.record.loanAmount
 
     def get_daily_funding_score(self):
         """Represents the rate in which the a loan was funded. It is then
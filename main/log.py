@@ -1,17 +1,27 @@
 """Includes logging management methods. `setup_logging` should be called when
 beginning execution. The `get_logger` method should always be used for fetching
 log instances.
+Messages should be passed with %-style args (not pre-formatted), so that no
+formatting happens unless the level is enabled. `Lazy` and `summarize` defer
+expensive arguments, such as API payloads, in the same way. With `background`
+set, records are handed to a queue and written by a listener thread.
 """
 
+import Queue
+import atexit
+import config
+import hashlib
 import logging
 import logging.handlers
 import os
 import socket
 import sys
+import threading
 
 
 _ch = None
 _fh = None
+_listener = None
 host = socket.gethostname()
 
 
@@ -24,49 +34,177 @@ def _make_path(logfile):
         os.makedirs(filepath)
 
 
-def get_logger(name):
-    """Return a log instance.
-    Stream/File handlers are added based on `setup_logging`.
-    name parameter should be passed as `__name__`.
+class Lazy(object):
+    """Log argument evaluated only when the message is actually formatted.
+    e.g. `logger.debug("Result: %s", Lazy(expensive, value))`.
+    """
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.function(*self.args, **self.kwargs))
+
+
+class PayloadSummary(object):
+    """Log argument summarizing a (possibly multi-megabyte) payload: its size,
+    SHA-1 and a truncated preview. `payload` may be a string or a response,
+    whose `content` is only read when formatted. The full payload is logged
+    when `full` (defaults to `config.LOG_FULL_PAYLOADS`) is True.
+    """
+    def __init__(self, payload, full=None, preview=None):
+        self.payload = payload
+        self.full = config.LOG_FULL_PAYLOADS if full is None else full
+        self.preview = preview or config.LOG_PAYLOAD_PREVIEW
+
+    def __str__(self):
+        payload = getattr(self.payload, 'content', self.payload)
+        if isinstance(payload, unicode):
+            payload = payload.encode('utf-8')
+
+        if self.full or len(payload) <= self.preview:
+            return payload
+
+        return "<%s bytes, sha1 %s> %s..." % (
+            len(payload),
+            hashlib.sha1(payload).hexdigest(),
+            payload[:self.preview]
+        )
+
+
+def summarize(payload, full=None):
+    """Return lazily formatted PayloadSummary of `payload`."""
+    return PayloadSummary(payload, full=full)
+
+
+class QueueHandler(logging.Handler):
+    """Handler passing records to `queue` rather than writing them; a
+    QueueListener does the writing on its own thread. Records are dropped
+    (and counted) rather than blocking when the queue is full.
+    """
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Merge args into the message now, so that lazy args reflect the
+        state at time of logging.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """Thread writing records from `queue` to `handlers`, each of which applies
+    its own level.
     """
-    logger = logging.getLogger(name)
+    _sentinel = None
+
+    def __init__(self, queue, *handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is self._sentinel:
+                break
 
-    if not logger.handlers:
-        if _ch:
-            logger.addHandler(_ch)
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
 
-        if _fh:
-            logger.addHandler(_fh)
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor, name="log-writer")
+        self._thread.daemon = True
+        self._thread.start()
 
-    return logger
+    def stop(self):
+        """Write any queued records, then stop the thread."""
+        if self._thread:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+
+def get_logger(name):
+    """Return a log instance.
+    Stream/File handlers are added to the root logger by `setup_logging`.
+    name parameter should be passed as `__name__`.
+    """
+    return logging.getLogger(name)
 
 
 def setup_logging(
         stream=True,
         logfile=None,
         stream_level=logging.INFO,
-        file_level=logging.ERROR
+        file_level=logging.ERROR,
+        background=False
     ):
     """Set-up format and verbosity.
     `stream` when True will turn on stream handler.
-    `logfile` when passed (string path to log), file handler is activated.
+    `logfile` when passed (string path to log), file handler is activated. It
+    is rotated at `config.LOG_MAX_BYTES`, keeping `config.LOG_BACKUP_COUNT`.
+    `background` when True will write records on a listener thread.
     """
+    global _ch, _fh, _listener
+
     formatter = logging.Formatter(
         "[%(asctime)s] {0}/%(levelname)s/%(name)s: %(message)s".format(host)
     )
+    handlers = []
 
     if stream:
-        global _ch
         _ch = logging.StreamHandler()
         _ch.setLevel(stream_level)
         _ch.setFormatter(formatter)
-        logging.getLogger('').addHandler(_ch)
+        handlers.append(_ch)
 
     if logfile:
         _make_path(logfile)
 
-        global _fh
-        _fh = logging.FileHandler(logfile)
+        _fh = logging.handlers.RotatingFileHandler(
+            logfile,
+            maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT
+        )
         _fh.setLevel(file_level)
         _fh.setFormatter(formatter)
-        logging.getLogger('').addHandler(_fh)
+        handlers.append(_fh)
+
+    if not handlers:
+        return
+
+    root = logging.getLogger('')
+    root.setLevel(min(handler.level for handler in handlers))
+
+    if background:
+        queue = Queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+        root.addHandler(QueueHandler(queue))
+        _listener = QueueListener(queue, *handlers)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+
+
+def shutdown_logging():
+    """Stop the background listener, if any, writing out queued records."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
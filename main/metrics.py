@@ -0,0 +1,235 @@
+"""Includes collector metrics: per-stage timings, throughput and row counts for
+each poll cycle. Metrics are held in a `Registry` and rendered in the
+Prometheus text format; `write_textfile` writes them atomically to
+`config.METRICS_PATH` (e.g. for the node exporter's textfile collector), which
+the collector does after every cycle.
+
+Stages are `fetch` (the request and download; for a streamed response, just
+the request), `decode` (JSON decoding, including the download when streamed),
+`parse` (building `LoanBatch` instances), `write` (database writes) and
+`cycle` (all of it).
+"""
+
+import config
+import log
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of stage timing histogram buckets.
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace('"', '\\"'))
+        for name, value in pairs
+    )
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric(object):
+    """Base of labelled metrics. Values are kept per tuple of label values,
+    in the order of `labels`.
+    """
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(label, "") for label in self.labels)
+
+    def get(self, **labels):
+        """Return current value for `labels`, or NoneType if never set."""
+        return self._values.get(self._key(labels))
+
+    def render(self):
+        """Return list of lines in the Prometheus text format."""
+        lines = [
+            "# HELP %s %s" % (self.name, self.help),
+            "# TYPE %s %s" % (self.name, self.kind)
+        ]
+        with self._lock:
+            for key in sorted(self._values):
+                lines.append("%s%s %s" % (
+                    self.name,
+                    _format_labels(self.labels, key),
+                    _format_value(self._values[key])
+                ))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that may go up or down, e.g. loans per second of last cycle."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over cumulative `buckets`."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=STAGE_BUCKETS):
+        _Metric.__init__(self, name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def get(self, **labels):
+        """Return tuple of (count, sum) for `labels`, or NoneType."""
+        value = self._values.get(self._key(labels))
+        if value:
+            return (value[0][-1], value[1])
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager observing the seconds spent within it."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.help),
+            "# TYPE %s %s" % (self.name, self.kind)
+        ]
+        with self._lock:
+            for key in sorted(self._values):
+                counts, total = self._values[key]
+                for bound, count in zip(self.buckets, counts):
+                    lines.append("%s_bucket%s %s" % (
+                        self.name,
+                        _format_labels(
+                            self.labels, key, [('le', _format_value(bound))]
+                        ),
+                        count
+                    ))
+                labels = _format_labels(self.labels, key)
+                lines.append("%s_sum%s %s" % (
+                    self.name, labels, _format_value(total)
+                ))
+                lines.append("%s_count%s %s" % (
+                    self.name, labels, counts[-1]
+                ))
+        return lines
+
+
+class Registry(object):
+    """Ordered collection of metrics, rendered together."""
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Write metrics to `path`, via a temporary file renamed into place so
+        readers never see a partial file.
+        """
+        temp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(temp_path, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.rename(temp_path, path)
+
+
+registry = Registry()
+
+CYCLES = registry.add(Counter(
+    "lc_commons_cycles_total",
+    "Poll cycles run, by outcome.",
+    ("outcome",)
+))
+CYCLE_OVERRUNS = registry.add(Counter(
+    "lc_commons_cycle_overruns_total",
+    "Poll cycles that took longer than the polling interval."
+))
+DUPLICATES = registry.add(Counter(
+    "lc_commons_duplicate_snapshots_total",
+    "Snapshots skipped as already recorded."
+))
+FETCHED_BYTES = registry.add(Counter(
+    "lc_commons_fetched_bytes_total",
+    "Response bytes fetched from the API, as transferred."
+))
+LOANS = registry.add(Counter(
+    "lc_commons_loans_total",
+    "Loans parsed from listing responses."
+))
+LOANS_PER_SECOND = registry.add(Gauge(
+    "lc_commons_loans_per_second",
+    "Loans recorded per second of parsing and writing, last snapshot."
+))
+ROWS_WRITTEN = registry.add(Counter(
+    "lc_commons_rows_written_total",
+    "Funding rows written to the database."
+))
+SKIPPED_FETCHES = registry.add(Counter(
+    "lc_commons_skipped_fetches_total",
+    "Fetches skipped by the pipelined collector, by reason.",
+    ("reason",)
+))
+STAGE_SECONDS = registry.add(Histogram(
+    "lc_commons_stage_seconds",
+    "Seconds spent per poll cycle stage.",
+    ("stage",)
+))
+
+
+def write_textfile(path=None):
+    """Write the shared registry to `path` (defaults to `config.METRICS_PATH`);
+    does nothing when neither is set. Failures are logged, not raised.
+    """
+    path = path or config.METRICS_PATH
+    if not path:
+        return
+
+    try:
+        registry.write_textfile(path)
+    except (IOError, OSError) as e:
+        log.get_logger(__name__).error("Failed to write metrics: %s", e)
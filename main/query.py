@@ -0,0 +1,176 @@
+"""Includes the filtered query API over recorded loans. `get_query` builds a
+parameterized query of the loans matching filters on grade, sub grade, term,
+state, listing date and interest rate, projected to the requested columns of
+`rawLoans` and `loanFundingSummary`, and paginated by id. `iter_loans` yields
+its rows lazily; `get_page` fetches a page, and `QueryCache` memoizes pages
+in-process until the database is next written to. Queries are over the SQLite
+database (see `storage.SqliteStorage`).
+"""
+
+import config
+import dates
+
+from collections import OrderedDict
+from loans import Loan
+
+
+# Columns of `loanFundingSummary`, joined only when selected.
+SUMMARY_COLUMNS = (
+    'dateStart', 'dateEnd', 'amountStart', 'amountEnd', 'snapshots',
+    'dailyFundingScore'
+)
+# Columns that may be selected, to their SQL expressions.
+COLUMNS = OrderedDict(
+    [
+        (key, "rawLoans.%s" % key) for key in Loan.attributes
+        if key not in ('asOfDate', 'fundedAmount')
+    ] +
+    [(key, "loanFundingSummary.%s" % key) for key in SUMMARY_COLUMNS]
+)
+
+
+def _get_columns(columns):
+    """Return list of `columns` (defaults to every column) with `id` first,
+    validated against `COLUMNS`.
+    """
+    if not columns:
+        return list(COLUMNS)
+
+    unknown = [column for column in columns if column not in COLUMNS]
+    if unknown:
+        raise ValueError("Unknown columns: %s." % ", ".join(unknown))
+    return ['id'] + [column for column in columns if column != 'id']
+
+
+def get_query(columns=None, grades=None, sub_grades=None, terms=None,
+              states=None, listed_start=None, listed_end=None, rate_min=None,
+              rate_max=None, after_id=0, limit=None):
+    """Return (sql, params) selecting `id` followed by `columns` (any of
+    `COLUMNS`; defaults to all) of loans with a `rawLoans` row, ordered by id.
+    Loans are limited to `grades`, `sub_grades`, `terms` and `states`
+    (`addrState`), to `listD` between `listed_start` and `listed_end` (epochs
+    or date strings) and to `intRate` between `rate_min` and `rate_max`, all
+    inclusive, and to ids greater than `after_id`. At most `limit` rows are
+    selected, if given. Raises ValueError on unknown columns.
+    """
+    columns = _get_columns(columns)
+    conditions = ["rawLoans.id > ?"]
+    params = [after_id or 0]
+
+    for column, values in (
+        ('grade', grades),
+        ('subGrade', sub_grades),
+        ('term', terms),
+        ('addrState', states)
+    ):
+        if values:
+            conditions.append(
+                "rawLoans.%s IN (%s)" % (column, ",".join("?" * len(values)))
+            )
+            params.extend(values)
+
+    for condition, value in (
+        ("rawLoans.listD >= ?", dates.parse_date(listed_start)),
+        ("rawLoans.listD <= ?", dates.parse_date(listed_end)),
+        ("rawLoans.intRate >= ?", rate_min),
+        ("rawLoans.intRate <= ?", rate_max)
+    ):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    summary = any(column in SUMMARY_COLUMNS for column in columns)
+    sql = """
+        SELECT %s
+          FROM rawLoans
+          %s
+         WHERE %s
+         ORDER BY rawLoans.id
+    """ % (
+        ", ".join("%s AS %s" % (COLUMNS[column], column) for column in columns),
+        "LEFT JOIN loanFundingSummary ON loanFundingSummary.id = rawLoans.id"
+        if summary else "",
+        "\n           AND ".join(conditions)
+    )
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def iter_loans(db_conn, size=None, **filters):
+    """Generator yielding the rows of `get_query(**filters)` lazily, fetched
+    `size` at a time (defaults to `config.DATABASE_FETCH_SIZE`), honouring the
+    row factory.
+    """
+    size = size or config.DATABASE_FETCH_SIZE
+    sql, params = get_query(**filters)
+    cursor = db_conn.select(sql, params)
+
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+def get_page(db_conn, limit=None, after_id=0, **filters):
+    """Return list of up to `limit` (defaults to `config.QUERY_PAGE_SIZE`)
+    rows of `get_query(**filters)` with ids greater than `after_id`; the next
+    page follows the `id` of the last row.
+    """
+    sql, params = get_query(
+        limit=limit or config.QUERY_PAGE_SIZE, after_id=after_id, **filters
+    )
+    return db_conn.execute(sql, params, results='fetchall')
+
+
+class QueryCache(object):
+    """In-process LRU cache of the pages (see `get_page`) of the `size`
+    (defaults to `config.QUERY_CACHE_SIZE`) queries of `db_conn` most recently
+    used. Every lookup first checks the generation of the database (see
+    `get_generation`) and empties the cache if it changed; so results never
+    predate a write, whichever connection made it: a new snapshot, compaction
+    or a summary rebuild. Pages are returned as copies.
+    """
+    def __init__(self, db_conn, size=None):
+        self.db_conn = db_conn
+        self.size = size or config.QUERY_CACHE_SIZE
+        self.results = OrderedDict()
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_generation(self):
+        """Return tuple of `PRAGMA data_version`, which changes on commits by
+        other connections, and the rows changed by this connection.
+        """
+        data_version = self.db_conn.select("PRAGMA data_version").fetchone()[0]
+        return data_version, self.db_conn.database.total_changes
+
+    def invalidate(self):
+        self.results.clear()
+
+    def get_page(self, limit=None, after_id=0, **filters):
+        """As `get_page`, from the cache where possible."""
+        generation = self.get_generation()
+        if generation != self.generation:
+            self.invalidate()
+            self.generation = generation
+
+        sql, params = get_query(
+            limit=limit or config.QUERY_PAGE_SIZE, after_id=after_id, **filters
+        )
+        key = (sql, tuple(params))
+        rows = self.results.pop(key, None)
+        if rows is None:
+            self.misses += 1
+            rows = tuple(self.db_conn.execute(sql, params, results='fetchall'))
+        else:
+            self.hits += 1
+
+        self.results[key] = rows
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+        return [dict(row) if isinstance(row, dict) else row for row in rows]
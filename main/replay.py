@@ -0,0 +1,146 @@
+"""Includes re-ingestion of saved listing responses, e.g. after the database has
+been rebuilt. Responses are decoded and parsed into `LoanBatch` instances by a
+process pool, while the calling process writes them through a single
+`storage.SqliteStorage`, `config.REPLAY_TRANSACTION_SIZE` snapshots per
+transaction. The next group of snapshots is parsed while the current one is
+written.
+
+Snapshots are replayed in order: sorted by `asOfDate` from a
+`archive.SnapshotArchive`, or by file name from a directory of responses. When
+`config.FUNDING_CHANGES_ONLY` is set, only snapshots newer than those already
+recorded should be replayed, as changes are taken against the latest amounts.
+"""
+
+import archive
+import config
+import database
+import dates
+import gzip
+import log
+import multiprocessing
+import os
+import storage
+
+from loans import LoanBatch
+from stream import ListingStream
+
+
+_recorded = frozenset()  # Dates already recorded; set in each worker.
+
+
+def _init_worker(recorded):
+    global _recorded
+    _recorded = recorded
+
+
+def _iter_file(path):
+    """Generator yielding chunks of (optionally gzipped) file `path`."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rb') as response_file:
+        while True:
+            chunk = response_file.read(config.STREAM_READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _parse(source):
+    """Worker: return (asOfDate, LoanBatch) of `source`, a file path or an
+    archive location. The batch is NoneType if `asOfDate` is already recorded,
+    in which case only the head of the response is decoded.
+    """
+    if isinstance(source, tuple):
+        chunks = [archive.read_segment(*source)]
+    else:
+        chunks = _iter_file(source)
+
+    listing = ListingStream(chunks)
+    asOfDate = dates.get_epoch(listing.asOfDate)
+
+    if asOfDate in _recorded:
+        return (asOfDate, None)
+    return (asOfDate, LoanBatch(asOfDate, list(listing.iter_loans())))
+
+
+def get_sources(path, recorded=()):
+    """Return ordered list of snapshots to replay from `path`: an archive
+    directory, a directory of JSON responses (`.json` or `.json.gz`), or a
+    single response file. Archived dates in `recorded` are left out.
+    """
+    if not os.path.isdir(path):
+        return [path]
+
+    if os.path.exists(os.path.join(path, "index")):
+        with archive.SnapshotArchive(path, read_only=True) as snapshots:
+            return [
+                snapshots.locate(asOfDate)
+                for asOfDate in snapshots.dates()
+                if asOfDate not in recorded
+            ]
+
+    return [
+        os.path.join(path, name)
+        for name in sorted(os.listdir(path))
+        if name.endswith(".json") or name.endswith(".json.gz")
+    ]
+
+
+def replay(path, db_path=None, workers=None, transaction_size=None):
+    """Replay snapshots from `path` (see `get_sources`) into the database at
+    `db_path` (defaults to `config.DATABASE`), with `workers` processes (defaults
+    to `config.REPLAY_WORKERS`, or one per CPU). Returns tuple of the number of
+    snapshots replayed and skipped as already recorded.
+    Raises `database.SchemaVersionError` if the database is not migrated.
+    """
+    logger = log.get_logger(__name__)
+    size = transaction_size or config.REPLAY_TRANSACTION_SIZE
+    replayed = 0
+    skipped = 0
+
+    with storage.SqliteStorage(path=db_path) as session:
+        recorded = frozenset(database.get_recorded_dates(session.db_conn))
+        sources = get_sources(path, recorded)
+        groups = [sources[i:i + size] for i in xrange(0, len(sources), size)]
+
+        pool = multiprocessing.Pool(
+            workers or config.REPLAY_WORKERS,
+            _init_worker,
+            (recorded,)
+        )
+
+        try:
+            pending = pool.map_async(_parse, groups[0]) if groups else None
+
+            for i in xrange(len(groups)):
+                results = pending.get()
+                if i + 1 < len(groups):
+                    pending = pool.map_async(_parse, groups[i + 1])
+
+                session.prepare(
+                    asOfDate for asOfDate, loans in results if loans is not None
+                )
+                with session.transaction():
+                    for asOfDate, loans in results:
+                        if (
+                            loans is None or
+                            session.record_snapshot(asOfDate, loans) is None
+                        ):
+                            skipped += 1
+                        else:
+                            replayed += 1
+
+                logger.info(
+                    "Replayed %s of %s snapshots (%s skipped).",
+                    replayed + skipped,
+                    len(sources),
+                    skipped
+                )
+
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    return (replayed, skipped)
@@ -0,0 +1,227 @@
+"""Includes the storage interface through which the collector records snapshots
+and analyses read them back. `Storage` records each snapshot through its
+primitives (`add_raw_loan_dates`, `add_raw_loans`,
+`add_loans_funded_as_of_date`), which a backend implements; `SqliteStorage`,
+over the SQLite database of `main.database`, is the only backend.
+`get_storage` opens it.
+
+Change-data-capture, the funding summary, partitions and the maintenance
+commands (export, compaction) are specific to SQLite.
+"""
+
+import abc
+import config
+import contextlib
+import database
+import time
+
+from loans import DAY_EPOCH
+
+
+class Storage(object):
+    """Interface of storage backends. Loans are passed as a list of Loan
+    instances or a LoanBatch instance, and dates as epochs.
+    May be used with the with statement.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def transaction(self):
+        """Context manager grouping writes made within it, which land
+        completely or not at all. Nested uses join the outer transaction.
+        """
+
+    @abc.abstractmethod
+    def has_been_recorded(self, asOfDate):
+        """Return True if the snapshot `asOfDate` has been recorded already."""
+
+    @abc.abstractmethod
+    def add_raw_loan_dates(self, asOfDate):
+        """Record the snapshot `asOfDate`, if not recorded already."""
+
+    @abc.abstractmethod
+    def add_raw_loans(self, loans):
+        """Record the static attributes of `loans` not recorded already."""
+
+    @abc.abstractmethod
+    def add_loans_funded_as_of_date(self, loans):
+        """Record the funded amount of `loans` as of their snapshot. Returns
+        the number of funding rows written.
+        """
+
+    @abc.abstractmethod
+    def get_loans(self):
+        """Return list of tuples, one per loan per snapshot: `asOfDate`,
+        `fundedAmount` and `id`, followed by the `rawLoans` columns. Loans
+        without raw attributes are left out.
+        """
+
+    @abc.abstractmethod
+    def iter_funding_stats(self, size=None):
+        """Generator yielding lists of per-loan funding statistics, as
+        `database.iter_funding_stats`.
+        """
+
+    def begin_snapshot(self, asOfDate):
+        """Called by `record_snapshot_batches` before the transaction of the
+        snapshot `asOfDate`.
+        """
+        pass
+
+    def end_snapshot(self, asOfDate):
+        """Called by `record_snapshot_batches` once every batch of the
+        snapshot `asOfDate` is added, within its transaction. Returns the
+        number of further funding rows written.
+        """
+        return 0
+
+    def record_snapshot(self, asOfDate, loans):
+        """Record the loans listed as of `asOfDate` in a single transaction.
+        Returns NoneType if `asOfDate` has already been recorded, otherwise the
+        number of funding rows written.
+        """
+        return self.record_snapshot_batches(asOfDate, [loans])
+
+    def record_snapshot_batches(self, asOfDate, batches):
+        """As `record_snapshot`, for a snapshot arriving as an iterable of
+        `batches`, such as from a streamed response. `batches` is not consumed
+        if `asOfDate` has already been recorded.
+        """
+        self.begin_snapshot(asOfDate)
+
+        with self.transaction():
+            if self.has_been_recorded(asOfDate):
+                return None
+
+            self.add_raw_loan_dates(asOfDate)
+            funded_rows = 0
+            for loans in batches:
+                self.add_raw_loans(loans)
+                funded_rows += self.add_loans_funded_as_of_date(loans)
+            return funded_rows + self.end_snapshot(asOfDate)
+
+
+class SqliteStorage(Storage):
+    """Storage in a SQLite database at `path` (defaults to `config.DATABASE`),
+    through `main.database`, used by the collector for the life of the
+    process.
+    Keeps a single connection open (so prepared statements are reused from
+    the connection's statement cache) and applies `config.DATABASE_PRAGMAS`.
+    Only loans not yet in `rawLoans` are inserted; the status of the others
+    is updated in place. The funding summary is kept as snapshots are
+    recorded; when `config.FUNDING_CHANGES_ONLY` is set, only changes are
+    written, once the whole snapshot is known. When `config.PARTITION_PATH`
+    is set, snapshots are written to per-month partitions (see
+    `database.PartitionedDatabase`), with those of the last month read; the
+    funding changes recorded are seeded from every partition.
+    Raises `database.SchemaVersionError` if the database is not migrated.
+    """
+    def __init__(self, path=None, pragmas=None):
+        if pragmas is None:
+            pragmas = config.DATABASE_PRAGMAS
+
+        self.db_conn = database.get_database(
+            path=path,
+            pragmas=pragmas,
+            start=int(time.time()) - 31 * DAY_EPOCH
+        )
+        self.funding_tracker = database.FundingChangeTracker()
+        self.raw_loan_tracker = database.RawLoanTracker()
+        self._funded = []  # Funded tuples of the snapshot, when diffed.
+
+        try:
+            database.check_schema_version(self.db_conn)
+        except database.SchemaVersionError:
+            self.close()
+            raise
+
+    def close(self):
+        self.db_conn.close()
+
+    def prepare(self, asOfDates):
+        """Attach the partitions that `asOfDates` are written to, if
+        partitioned. Must be called outside of a transaction; the record
+        methods do so themselves.
+        """
+        if isinstance(self.db_conn, database.PartitionedDatabase):
+            for asOfDate in asOfDates:
+                self.db_conn.attach_partition(asOfDate)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        try:
+            with self.db_conn.transaction():
+                yield self
+        except Exception:
+            # Tracker state may be ahead of what was committed; re-seed.
+            self.funding_tracker.amounts = None
+            self.raw_loan_tracker.ids = None
+            raise
+
+    def has_been_recorded(self, asOfDate):
+        return database.has_been_recorded(asOfDate, self.db_conn)
+
+    def add_raw_loan_dates(self, asOfDate):
+        database.add_raw_loan_dates(asOfDate, self.db_conn)
+
+    def add_raw_loans(self, loans):
+        if self.raw_loan_tracker.ids is None:
+            self.raw_loan_tracker.seed(self.db_conn)
+
+        new, statuses = self.raw_loan_tracker.split(loans)
+        if len(new):
+            database.add_raw_loans(new, self.db_conn)
+            self.raw_loan_tracker.apply(new)
+        if statuses:
+            database.update_raw_loan_statuses(statuses, self.db_conn)
+
+    def add_loans_funded_as_of_date(self, loans):
+        funded = database.get_funded_params(loans)
+        if config.FUNDING_CHANGES_ONLY:
+            # Disappearances need the whole snapshot; diffed in `end_snapshot`.
+            self._funded.extend(funded)
+            return 0
+
+        database.add_loans_funded_as_of_date(loans, self.db_conn)
+        database.add_loan_funding_summary(funded, self.db_conn)
+        return len(loans)
+
+    def get_loans(self):
+        return database.get_loans(self.db_conn)
+
+    def iter_funding_stats(self, size=None):
+        return database.iter_funding_stats(self.db_conn, size=size)
+
+    def begin_snapshot(self, asOfDate):
+        if (
+            config.FUNDING_CHANGES_ONLY and
+            self.funding_tracker.amounts is None
+        ):
+            # Seeded from every partition, so outside of the transaction.
+            self.funding_tracker.seed(self.db_conn)
+        self.prepare([asOfDate])
+        self._funded = []
+
+    def end_snapshot(self, asOfDate):
+        if not config.FUNDING_CHANGES_ONLY:
+            return 0
+
+        funded, self._funded = self._funded, []
+        database.add_loan_funding_summary(funded, self.db_conn)
+        return database.add_funding_changes(
+            asOfDate, funded, self.db_conn, self.funding_tracker
+        )
+
+
+def get_storage(path=None):
+    """Return `SqliteStorage` of the database at `path`."""
+    return SqliteStorage(path=path)
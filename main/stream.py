@@ -0,0 +1,198 @@
+"""Includes incremental decoding of listing responses.
+A `ListingStream` reads the response body chunk by chunk, decodes `asOfDate`
+first, and then yields loans one at a time (or in fixed-size chunks) without
+holding the whole payload in memory.
+"""
+
+import codecs
+import json
+
+
+_WHITESPACE = u" \t\n\r"
+
+
+class ListingStream(object):
+    """Incrementally decodes a listing response, i.e. a JSON object with keys
+    `asOfDate` and `loans`, from `chunks`, an iterable of byte strings (such
+    as `response.iter_content()`).
+    `asOfDate` is decoded on instantiation. Loans are then decoded lazily by
+    `iter_loans`/`iter_chunks`; only one loan is buffered at a time. Should
+    `loans` precede `asOfDate` in the payload, loans are buffered until it is
+    found. `response`, when given, is closed by `close`.
+    May be used with the with statement.
+    """
+    def __init__(self, chunks, response=None):
+        self.asOfDate = None
+        self.bytes_read = 0
+        self.response = response
+
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u""
+        self._pos = 0
+        self._eof = False
+        self._in_loans = False
+        self._buffered_loans = None
+
+        self._read_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+
+    def _read(self):
+        """Append the next chunk to the buffer. Returns False at end of body."""
+        if self._eof:
+            return False
+
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(
+                b"", final=True
+            )
+            self._pos = 0
+            return False
+
+        self.bytes_read += len(chunk)
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Return next non-whitespace character (not consumed), or NoneType at
+        end of body.
+        """
+        while True:
+            while (
+                self._pos < len(self._buffer) and
+                self._buffer[self._pos] in _WHITESPACE
+            ):
+                self._pos += 1
+
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            if not self._read():
+                return None
+
+    def _expect(self, characters):
+        """Consume and return next non-whitespace character, which must be one
+        of `characters`.
+        """
+        character = self._peek()
+        if character is None or character not in characters:
+            raise ValueError(
+                "Expected one of %r in listing, found %r." %
+                (characters, character)
+            )
+        self._pos += 1
+        return character
+
+    def _decode(self):
+        """Decode and consume the next complete JSON value."""
+        self._peek()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self._read():
+                    raise
+                continue
+
+            # A value ending the buffer (e.g. a number) may be incomplete.
+            if end == len(self._buffer) and self._read():
+                continue
+
+            self._pos = end
+            return value
+
+    def _next_loan(self):
+        """Return next loan of the `loans` array, or NoneType at its end."""
+        if self._peek() == u"]":
+            self._pos += 1
+            self._in_loans = False
+            return None
+
+        loan = self._decode()
+        if self._expect(u",]") == u"]":
+            self._in_loans = False
+        return loan
+
+    def _read_header(self):
+        """Read top-level keys until `asOfDate` is known and the `loans` array
+        is reached (or the object ends).
+        """
+        self._expect(u"{")
+
+        while True:
+            if self._peek() == u"}":
+                self._pos += 1
+                break
+
+            key = self._decode()
+            self._expect(u":")
+
+            if key == u"loans":
+                self._expect(u"[")
+                if self._peek() == u"]":
+                    self._pos += 1
+                else:
+                    self._in_loans = True
+
+                if self.asOfDate is not None:
+                    return
+
+                # Unusual ordering: buffer loans until `asOfDate` is found.
+                self._buffered_loans = []
+                while self._in_loans:
+                    loan = self._next_loan()
+                    if loan is not None:
+                        self._buffered_loans.append(loan)
+            else:
+                value = self._decode()
+                if key == u"asOfDate":
+                    self.asOfDate = value
+
+            if self._expect(u",}") == u"}":
+                break
+
+        if self.asOfDate is None:
+            raise ValueError("Listing has no asOfDate.")
+
+    def iter_loans(self):
+        """Generator yielding each loan dictionary, decoded as it is read."""
+        if self._buffered_loans is not None:
+            loans, self._buffered_loans = self._buffered_loans, None
+            for loan in loans:
+                yield loan
+
+        while self._in_loans:
+            loan = self._next_loan()
+            if loan is not None:
+                yield loan
+
+        # Read the remainder, so that the connection may be reused.
+        while self._read():
+            pass
+
+    def iter_chunks(self, size):
+        """Generator yielding lists of up to `size` loan dictionaries."""
+        chunk = []
+        for loan in self.iter_loans():
+            chunk.append(loan)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
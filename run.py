@@ -4,8 +4,15 @@
 import argparse
 import config
 import logging
+import main.api
+import main.collector
+import main.compaction
+import main.database
+import main.dates
+import main.export
 import main.lc_commons
 import main.log
+import main.replay
 
 
 def positive_int(param):
@@ -21,6 +28,33 @@ def positive_int(param):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        default=config.POLLING_ADAPTIVE,
+        help="Poll faster around expected listing drops, within a budget."
+    )
+
+    parser.add_argument(
+        "--archive",
+        "-a",
+        default=config.ARCHIVE_PATH,
+        help="Directory to archive raw API responses to."
+    )
+
+    parser.add_argument(
+        "--async",
+        action="store_true",
+        dest="pipelined",
+        help="Overlap fetches with database writes, polling on fixed ticks."
+    )
+
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Downsample funding history of loans no longer listed, then exit."
+    )
+
     parser.add_argument(
         "--database",
         "-d",
@@ -36,6 +70,50 @@ if __name__ == "__main__":
         type=positive_int
     )
 
+    parser.add_argument(
+        "--export",
+        help="Write funding history to CSV (gzipped if .gz), then exit."
+    )
+
+    parser.add_argument(
+        "--export-end",
+        dest="export_end",
+        help="Latest asOfDate exported, as an epoch or date string."
+    )
+
+    parser.add_argument(
+        "--export-grade",
+        action="append",
+        dest="export_grades",
+        help="Loan grade to export; may be given more than once."
+    )
+
+    parser.add_argument(
+        "--export-raw",
+        action="store_true",
+        dest="export_raw",
+        help="Include the raw loan columns of each exported row."
+    )
+
+    parser.add_argument(
+        "--export-start",
+        dest="export_start",
+        help="Earliest asOfDate exported, as an epoch or date string."
+    )
+
+    parser.add_argument(
+        "--export-watermark",
+        dest="export_watermark",
+        help="File recording the last snapshot exported; exports only newer."
+    )
+
+    parser.add_argument(
+        "--freeze-partitions",
+        action="store_true",
+        dest="freeze_partitions",
+        help="Make partitions of past months read-only, then exit."
+    )
+
     parser.add_argument(
         "--log",
         "-l",
@@ -45,6 +123,12 @@ if __name__ == "__main__":
         nargs='?'
     )
 
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="Upgrade the database schema in place, then exit."
+    )
+
     parser.add_argument(
         "--number-requests",
         "-n",
@@ -55,6 +139,25 @@ if __name__ == "__main__":
         type=positive_int
     )
 
+    parser.add_argument(
+        "--partitions",
+        "-p",
+        default=config.PARTITION_PATH,
+        help="Directory of per-month snapshot databases to partition into."
+    )
+
+    parser.add_argument(
+        "--rebuild-summary",
+        action="store_true",
+        dest="rebuild_summary",
+        help="Recreate the loan funding summary from history, then exit."
+    )
+
+    parser.add_argument(
+        "--replay",
+        help="Ingest saved responses (archive, directory or file), then exit."
+    )
+
     parser.add_argument(
         "--token",
         "-t",
@@ -69,26 +172,160 @@ if __name__ == "__main__":
         help="Activates stream log. First flag will set to INFO, next to DEBUG."
     )
 
+    parser.add_argument(
+        "--workers",
+        "-w",
+        default=config.REPLAY_WORKERS,
+        help="The number of processes parsing responses when replaying.",
+        type=positive_int
+    )
+
     args = parser.parse_args()
 
+    if args.adaptive and args.pipelined:
+        parser.error(
+            "--adaptive cannot be used with --async, which polls on fixed "
+            "ticks."
+        )
+    if config.STREAM_LISTINGS and args.pipelined:
+        parser.error(
+            "--async cannot be used with STREAM_LISTINGS; responses are read "
+            "whole."
+        )
+
     # Set-up logging based on verbosity.
     if args.verbose > 1:
         main.log.setup_logging(
             stream=True,
             logfile=args.log,
-            stream_level=logging.DEBUG
+            stream_level=logging.DEBUG,
+            background=config.LOG_BACKGROUND
         )
     elif args.verbose == 1:
         main.log.setup_logging(
             stream=True,
             logfile=args.log,
-            stream_level=logging.INFO
+            stream_level=logging.INFO,
+            background=config.LOG_BACKGROUND
         )
     else:
-        main.log.setup_logging(stream=False, logfile=args.log)
+        main.log.setup_logging(
+            stream=False,
+            logfile=args.log,
+            background=config.LOG_BACKGROUND
+        )
+
+    # Every database opened below is partitioned accordingly.
+    config.PARTITION_PATH = args.partitions
+    # API requests are retried within a polling interval.
+    config.POLLING_INTERVAL = args.delay
+
+    if args.freeze_partitions:
+        if not args.partitions:
+            parser.error("--freeze-partitions requires --partitions.")
+        frozen = main.database.freeze_partitions(
+            args.partitions,
+            logger=main.log.get_logger(__name__)
+        )
+        parser.exit(message="Froze %s partitions.\n" % len(frozen))
+
+    if args.migrate:
+        with main.database.SqliteDatabase(path=args.database) as db_conn:
+            applied = main.database.migrate(
+                db_conn,
+                logger=main.log.get_logger(__name__)
+            )
+        parser.exit(message="Applied schema migrations: %s\n" % applied)
+
+    if args.compact:
+        before = main.compaction.get_cutoff()
+        with main.compaction.open_database(
+            path=args.database,
+            before=before
+        ) as db_conn:
+            main.database.check_schema_version(db_conn)
+            deleted = main.compaction.compact(
+                db_conn,
+                before=before,
+                logger=main.log.get_logger(__name__)
+            )
+        parser.exit(message="Compacted %s snapshot rows.\n" % deleted)
+
+    if args.export:
+        with main.database.get_database(
+            path=args.database,
+            start=main.dates.parse_date(args.export_start),
+            end=main.dates.parse_date(args.export_end)
+        ) as db_conn:
+            main.database.check_schema_version(db_conn)
+            count = main.export.export(
+                db_conn,
+                args.export,
+                start=args.export_start,
+                end=args.export_end,
+                grades=args.export_grades,
+                raw=args.export_raw,
+                watermark=args.export_watermark
+            )
+        parser.exit(message="Exported %s rows to %s.\n" % (count, args.export))
+
+    if args.rebuild_summary:
+        with main.database.get_database(path=args.database) as db_conn:
+            main.database.check_schema_version(db_conn)
+            count = main.database.rebuild_funding_summary(
+                db_conn,
+                logger=main.log.get_logger(__name__)
+            )
+        parser.exit(message="Rebuilt funding summary of %s loans.\n" % count)
+
+    if args.replay:
+        replayed, skipped = main.replay.replay(
+            args.replay,
+            db_path=args.database,
+            workers=args.workers
+        )
+        parser.exit(
+            message="Replayed %s snapshots (%s already recorded).\n" %
+            (replayed, skipped)
+        )
 
     request_count = 0
+    compactor = None
+
+    try:
+        main.lc_commons.get_archive(path=args.archive)
+
+        if config.COMPACT_INTERVAL:
+            compactor = main.compaction.Compactor(path=args.database)
+            compactor.start()
+
+        if args.pipelined:
+            main.collector.PipelinedCollector(
+                delay=args.delay,
+                token=args.token,
+                path=args.database
+            ).run(number_requests=args.number_requests)
+        else:
+            main.lc_commons.get_session(path=args.database)
+            if args.adaptive:
+                main.lc_commons.get_scheduler(delay=args.delay)
 
-    while not args.number_requests or request_count < args.number_requests:
-        main.lc_commons.execute_with_delay(delay=args.delay, token=args.token)
-        request_count += 1
+            while (
+                not args.number_requests or
+                request_count < args.number_requests
+            ):
+                if args.adaptive:
+                    main.lc_commons.execute_with_schedule(token=args.token)
+                else:
+                    main.lc_commons.execute_with_delay(
+                        delay=args.delay,
+                        token=args.token
+                    )
+                request_count += 1
+    finally:
+        if compactor:
+            compactor.stop()
+        main.lc_commons.close_session()
+        main.lc_commons.close_archive()
+        main.api.close_client()
+        main.log.shutdown_logging()
@@ -0,0 +1,79 @@
+
+import benchmarks.synthetic
+import main.analytics
+import main.database
+import main.dates
+import unittest
+
+from main.loans import LoanBatch
+
+
+class TestFundingVelocityClass(unittest.TestCase):
+    """Tests for FundingVelocity class on an in-memory database."""
+
+    def setUp(self):
+        self.db_conn = main.database.SqliteDatabase(path=":memory:")
+        main.database.migrate(self.db_conn)
+
+        # Snapshots 5 hours apart, so spans fall either side of a day.
+        for response in benchmarks.synthetic.make_snapshots(
+            50, 7, interval=5 * 3600
+        ):
+            batch = LoanBatch(
+                main.dates.get_epoch(response['asOfDate']),
+                response['loans']
+            )
+            with self.db_conn.transaction():
+                main.database.add_raw_loan_dates(batch.asOfDate, self.db_conn)
+                main.database.add_raw_loans(batch, self.db_conn)
+                main.database.add_loans_funded_as_of_date(batch, self.db_conn)
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def test_matches_loan_over_time(self):
+        velocity = main.analytics.FundingVelocity.from_database(
+            self.db_conn,
+            size=7
+        )
+        loans = list(main.database.iter_loans_over_time(self.db_conn))
+        self.assertEqual(len(velocity), len(loans))
+        self.assertEqual(velocity.ids, [loan.id for loan in loans])
+
+        for key, attribute in (
+            ('amountStart', 'amountStart'),
+            ('amountEnd', 'amountEnd'),
+            ('dateStart', 'dateStart'),
+            ('dateEnd', 'dateEnd'),
+            ('amountLeft', 'amountLeft'),
+            ('dateDifference', 'dateDifference'),
+            ('fundedRate', 'fundedRate')
+        ):
+            self.assertEqual(
+                velocity.column(key),
+                [getattr(loan, attribute) for loan in loans],
+                key
+            )
+
+        expected = dict(
+            (loan.id, loan.get_daily_funding_score()) for loan in loans
+        )
+        scores = velocity.get_daily_funding_scores()
+        self.assertEqual(scores, expected)
+        self.assertTrue(any(scores.values()))
+
+    def test_null_loan_amount(self):
+        self.db_conn.execute("UPDATE rawLoans SET loanAmount = NULL")
+        velocity = main.analytics.FundingVelocity.from_database(self.db_conn)
+
+        for left, score, difference in zip(
+            velocity.column('amountLeft'),
+            velocity.column('dailyFundingScore'),
+            velocity.column('dateDifference')
+        ):
+            self.assertEqual(left, None)
+            self.assertEqual(score, None if difference else 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 import config
 import main.api
 import mock
+import requests
 import unittest
 
 
@@ -9,56 +10,207 @@ class TestApiModuleMethods(unittest.TestCase):
     """Unit tests for api module methods."""
 
     def setUp(self):
-        pass
+        main.api._client = None
 
-    @mock.patch('requests.get')
-    def test_ok_response(self, requests_get_mock):
+    def tearDown(self):
+        main.api._client = None
+
+    @mock.patch('requests.Session')
+    def test_ok_response(self, session_mock):
+        session_get_mock = session_mock.return_value.get
         response_mock = mock.Mock()
         response_mock.status_code = 200
+        response_mock.content = "{}"
+        response_mock.raw.tell.return_value = 2
         response_json_mock = mock.Mock()
         response_mock.json.return_value = response_json_mock
-        requests_get_mock.return_value = response_mock
-        expected_headers = {
-            'Authorization': config.API_TOKEN,
-            'Content-type': "application/json"
-        }
+        session_get_mock.return_value = response_mock
+        expected_headers = {'Authorization': config.API_TOKEN}
+        expected_timeout = (config.API_CONNECT_TIMEOUT, config.API_READ_TIMEOUT)
 
         # Test with default param.
         resp = main.api.get_listed_loans()
-        requests_get_mock.assert_called_with(
+        session_get_mock.assert_called_with(
             config.API_URL + config.API_LOANS_URI,
             headers=expected_headers,
-            params={'showAll': True}
+            params={'showAll': True},
+            timeout=expected_timeout,
+            stream=False
         )
         response_mock.json.assert_called_with()
         self.assertEqual(resp, response_json_mock)
 
         # Test with explicit param.
         resp = main.api.get_listed_loans(show_all=False)
-        requests_get_mock.assert_called_with(
+        session_get_mock.assert_called_with(
             config.API_URL + config.API_LOANS_URI,
             headers=expected_headers,
-            params={'showAll': False}
+            params={'showAll': False},
+            timeout=expected_timeout,
+            stream=False
         )
         response_mock.json.assert_called_with()
         self.assertEqual(resp, response_json_mock)
 
+        # Session is reused.
+        self.assertEqual(session_mock.call_count, 1)
+        self.assertEqual(main.api.get_client().stats()['request_count'], 2)
+        self.assertEqual(main.api.get_client().stats()['total_bytes'], 4)
+
+    @mock.patch('requests.Session')
+    def test_archive_response(self, session_mock):
+        response_mock = mock.Mock()
+        response_mock.status_code = 200
+        response_mock.content = '{"asOfDate": "d1", "loans": []}'
+        response_mock.json.return_value = {'asOfDate': "d1", 'loans': []}
+        session_mock.return_value.get.return_value = response_mock
+        archive_mock = mock.Mock()
+
+        main.api.get_listed_loans(archive=archive_mock)
+        archive_mock.append.assert_called_with("d1", response_mock.content)
+
+        # Failing to archive does not lose the response.
+        archive_mock.append.side_effect = IOError("Disk full.")
+        resp = main.api.get_listed_loans(archive=archive_mock)
+        self.assertEqual(resp, response_mock.json.return_value)
+
     @mock.patch('logging.getLogger')
-    @mock.patch('requests.get')
-    def test_error_response(self, requests_get_mock, logging_get_mock):
+    @mock.patch('requests.Session')
+    def test_error_response(self, session_mock, logging_get_mock):
         response_mock = mock.Mock()
         response_mock.status_code = 403
         response_mock.text = "{'error': 'Unauthorized'}"
-        requests_get_mock.return_value = response_mock
+        response_mock.content = response_mock.text
+        session_mock.return_value.get.return_value = response_mock
         logger_mock = mock.Mock()
         logging_get_mock.return_value = logger_mock
 
         resp = main.api.get_listed_loans()
-        self.assertTrue(requests_get_mock.called)
+        self.assertEqual(session_mock.return_value.get.call_count, 1)
         self.assertFalse(response_mock.json.called)
-        logger_mock.error.assert_called_with(response_mock.text)
+        self.assertIn(
+            response_mock.text,
+            str(logger_mock.error.call_args[0][2])
+        )
         self.assertTrue(resp == None)
 
 
+    @mock.patch('requests.Session')
+    def test_stream_listed_loans(self, session_mock):
+        session_get_mock = session_mock.return_value.get
+        response_mock = mock.Mock()
+        response_mock.status_code = 200
+        response_mock.iter_content.return_value = iter([
+            '{"asOfDate": "d1", ', '"loans": [{"id": 1}]}'
+        ])
+        session_get_mock.return_value = response_mock
+
+        listing = main.api.stream_listed_loans()
+        self.assertEqual(session_get_mock.call_args[1]['stream'], True)
+        response_mock.iter_content.assert_called_with(config.STREAM_READ_SIZE)
+        self.assertEqual(listing.asOfDate, "d1")
+        self.assertEqual(list(listing.iter_loans()), [{"id": 1}])
+        listing.close()
+        self.assertTrue(response_mock.close.called)
+
+        # Error response.
+        response_mock.reset_mock()
+        response_mock.status_code = 500
+        response_mock.headers = {}
+        response_mock.text = ""
+        session_get_mock.side_effect = None
+        with mock.patch('time.sleep'):
+            self.assertEqual(main.api.stream_listed_loans(), None)
+        self.assertTrue(response_mock.close.called)
+
+
+class TestApiClientClass(unittest.TestCase):
+    """Unit tests for ApiClient class."""
+
+    def _response(self, status_code, headers=None):
+        response_mock = mock.Mock()
+        response_mock.status_code = status_code
+        response_mock.headers = headers or {}
+        response_mock.content = ""
+        return response_mock
+
+    @mock.patch('time.sleep')
+    @mock.patch('requests.Session')
+    def test_retry(self, session_mock, sleep_mock):
+        session_get_mock = session_mock.return_value.get
+        ok_mock = self._response(200)
+        session_get_mock.side_effect = [
+            self._response(503),
+            requests.Timeout(),
+            self._response(429, {'Retry-After': "2"}),
+            ok_mock
+        ]
+
+        client = main.api.ApiClient()
+        self.assertEqual(client.get("/uri"), ok_mock)
+        self.assertEqual(session_get_mock.call_count, 4)
+        self.assertEqual(sleep_mock.call_count, 3)
+        self.assertEqual(sleep_mock.call_args_list[2][0][0], 2.0)
+        for call in sleep_mock.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= config.API_BACKOFF_MAX)
+        self.assertEqual(client.stats()['retry_count'], 3)
+
+    @mock.patch('time.sleep')
+    @mock.patch('requests.Session')
+    def test_retries_exhausted(self, session_mock, sleep_mock):
+        session_get_mock = session_mock.return_value.get
+        client = main.api.ApiClient()
+
+        # Last response is returned.
+        session_get_mock.side_effect = None
+        session_get_mock.return_value = self._response(500)
+        self.assertEqual(client.get("/uri").status_code, 500)
+        self.assertEqual(session_get_mock.call_count, client.retries + 1)
+
+        # Last exception is raised.
+        session_get_mock.side_effect = requests.ConnectionError()
+        self.assertRaises(requests.ConnectionError, client.get, "/uri")
+        self.assertEqual(client.get_listed_loans(), None)
+
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    @mock.patch('requests.Session')
+    def test_deadline(self, session_mock, time_mock, sleep_mock):
+        # Waiting advances the clock; requests take no time.
+        clock = [1000.0]
+        time_mock.side_effect = lambda: clock[0]
+        sleep_mock.side_effect = lambda seconds: clock.__setitem__(
+            0, clock[0] + seconds
+        )
+        session_get_mock = session_mock.return_value.get
+        session_get_mock.return_value = self._response(
+            503, {'Retry-After': "10"}
+        )
+        client = main.api.ApiClient(deadline=25)
+
+        # Third retry would not start before the deadline.
+        self.assertEqual(client.get("/uri").status_code, 503)
+        self.assertEqual(session_get_mock.call_count, 3)
+        self.assertTrue(session_get_mock.call_count < client.retries + 1)
+        self.assertEqual(
+            session_get_mock.call_args[1]['timeout'],
+            (config.API_CONNECT_TIMEOUT, 5.0)
+        )
+
+        session_get_mock.reset_mock()
+        session_get_mock.side_effect = requests.ConnectionError()
+        with mock.patch('random.uniform', return_value=10.0):
+            self.assertRaises(requests.ConnectionError, client.get, "/uri")
+        self.assertEqual(session_get_mock.call_count, 3)
+
+    @mock.patch('requests.Session')
+    def test_no_retry(self, session_mock):
+        session_get_mock = session_mock.return_value.get
+        session_get_mock.return_value = self._response(404)
+        client = main.api.ApiClient()
+        self.assertEqual(client.get("/uri").status_code, 404)
+        self.assertEqual(session_get_mock.call_count, 1)
+
+
 if __name__ == "__main__":
     unittest.main()
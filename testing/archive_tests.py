@@ -0,0 +1,112 @@
+
+import main.archive
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestSnapshotArchiveClass(unittest.TestCase):
+    """Unit tests for SnapshotArchive class."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_append_read(self):
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            self.assertTrue(archive.append(1420162774, '{"loans": [1]}'))
+            self.assertTrue(
+                archive.append("2015-01-02T01:40:34.000Z", '{"loans": [2]}')
+            )
+            self.assertFalse(archive.append(1420162774, '{"loans": [3]}'))
+
+            self.assertEqual(len(archive), 2)
+            self.assertIn("2015-01-02T01:39:34Z", archive)
+            self.assertEqual(archive.read(1420162834), '{"loans": [2]}')
+
+        # Reopened from the index.
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            self.assertEqual(archive.dates(), [1420162774, 1420162834])
+            self.assertEqual(archive.read(1420162774), '{"loans": [1]}')
+            self.assertRaises(KeyError, archive.read, 1)
+
+    def test_rotation(self):
+        payload = os.urandom(100)
+        with main.archive.SnapshotArchive(
+            self.directory,
+            segment_bytes=250
+        ) as archive:
+            for asOfDate in xrange(1, 6):
+                archive.append(asOfDate, payload)
+
+            self.assertEqual(archive.segment, 3)
+            for asOfDate in xrange(1, 6):
+                self.assertEqual(archive.read(asOfDate), payload)
+
+        with main.archive.SnapshotArchive(
+            self.directory,
+            segment_bytes=250
+        ) as archive:
+            archive.append(6, payload)
+            self.assertEqual(archive.index[6][0], 3)
+
+    def test_partial_index(self):
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            archive.append(1, "first")
+
+        with open(os.path.join(self.directory, "index"), 'ab') as index_file:
+            index_file.write("2 1 ")
+
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            self.assertEqual(archive.dates(), [1])
+            archive.append(3, "third")
+
+        # The entry appended after recovery starts on a line of its own.
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            self.assertEqual(archive.dates(), [1, 3])
+            self.assertEqual(archive.read(3), "third")
+
+    def test_read_only(self):
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            archive.append(1, "first")
+        index_path = os.path.join(self.directory, "index")
+        with open(index_path, 'ab') as index_file:
+            index_file.write("2 1 ")
+        size = os.path.getsize(index_path)
+
+        with main.archive.SnapshotArchive(
+            self.directory,
+            read_only=True
+        ) as archive:
+            self.assertEqual(archive.read(1), "first")
+            self.assertRaises(IOError, archive.append, 2, "second")
+        self.assertEqual(os.path.getsize(index_path), size)
+
+        missing = os.path.join(self.directory, "missing")
+        with main.archive.SnapshotArchive(missing, read_only=True) as archive:
+            self.assertEqual(len(archive), 0)
+        self.assertFalse(os.path.exists(missing))
+
+    def test_tee(self):
+        with main.archive.SnapshotArchive(self.directory) as archive:
+            tee = archive.tee(iter(['{"asOfDate": 7, ', '"loans": []}']))
+            tee.asOfDate = 7
+            self.assertEqual(
+                "".join(tee),
+                '{"asOfDate": 7, "loans": []}'
+            )
+            self.assertTrue(tee.archived)
+            self.assertEqual(archive.read(7), '{"asOfDate": 7, "loans": []}')
+
+            # Not read in full: not archived.
+            tee = archive.tee(iter(["a", "b"]))
+            tee.asOfDate = 8
+            next(iter(tee))
+            self.assertNotIn(8, archive)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+
+import main.collector
+import main.metrics
+import mock
+import unittest
+
+
+class TestPipelinedCollectorClass(unittest.TestCase):
+    """Unit tests for PipelinedCollector class."""
+
+    def test_get_next_tick(self):
+        collector = main.collector.PipelinedCollector(delay=10)
+        self.assertEqual(collector._get_next_tick(100, 0, 105), 1)
+        self.assertEqual(collector._get_next_tick(100, 1, 110), 2)
+        self.assertEqual(collector.missed, 0)
+
+        # Fetch overran two ticks; they are skipped, not fetched in a burst.
+        self.assertEqual(collector._get_next_tick(100, 2, 145), 5)
+        self.assertEqual(collector.missed, 2)
+
+    @mock.patch('main.api.get_listed_loans')
+    def test_fetch_backpressure(self, get_listed_loans_mock):
+        get_listed_loans_mock.return_value = {'asOfDate': "d1", 'loans': []}
+        collector = main.collector.PipelinedCollector(delay=0, queue_size=1)
+
+        collector._fetch()
+        self.assertEqual(collector.fetched, 1)
+        self.assertEqual(collector.queue.qsize(), 1)
+
+        # Writer behind: fetch skipped.
+        collector._fetch()
+        self.assertEqual(get_listed_loans_mock.call_count, 1)
+        self.assertEqual(collector.skipped, 1)
+
+        # No response: nothing queued.
+        collector.queue.get()
+        get_listed_loans_mock.return_value = None
+        collector._fetch()
+        self.assertEqual(collector.fetched, 1)
+        self.assertTrue(collector.queue.empty())
+
+    @mock.patch('main.lc_commons.record')
+    @mock.patch('main.storage.get_storage')
+    @mock.patch('main.api.get_listed_loans')
+    def test_run(self, get_listed_loans_mock, session_mock, record_mock):
+        get_listed_loans_mock.return_value = {'asOfDate': "d1", 'loans': []}
+        record_mock.side_effect = [None, Exception("Meow!"), None]
+        collector = main.collector.PipelinedCollector(
+            delay=0,
+            path="test.db",
+            queue_size=3
+        )
+
+        cycles = main.metrics.STAGE_SECONDS.get(stage="cycle") or (0, 0.0)
+        collector.run(number_requests=3)
+        session_mock.assert_called_with(path="test.db")
+        self.assertEqual(
+            main.metrics.STAGE_SECONDS.get(stage="cycle")[0], cycles[0] + 3
+        )
+        self.assertEqual(record_mock.call_count, 3)
+        record_mock.assert_called_with(
+            get_listed_loans_mock.return_value,
+            session=session_mock.return_value
+        )
+        self.assertEqual(collector.written, 2)
+        self.assertTrue(session_mock.return_value.close.called)
+
+    @mock.patch('main.storage.get_storage')
+    @mock.patch('main.api.get_listed_loans')
+    def test_run_writer_error(self, get_listed_loans_mock, session_mock):
+        session_mock.side_effect = main.database.SchemaVersionError()
+        collector = main.collector.PipelinedCollector(delay=0)
+        self.assertRaises(main.database.SchemaVersionError, collector.run, 1)
+        self.assertFalse(get_listed_loans_mock.called)
+
+    @mock.patch('config.STREAM_LISTINGS', True)
+    @mock.patch('main.storage.get_storage')
+    def test_run_streaming(self, session_mock):
+        collector = main.collector.PipelinedCollector(delay=0)
+        self.assertRaises(ValueError, collector.run, 1)
+        self.assertFalse(session_mock.called)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+
+import benchmarks.synthetic
+import main.compaction
+import main.database
+import main.dates
+import main.storage
+import mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from main.loans import LoanBatch
+
+
+class TestCompactionModuleMethods(unittest.TestCase):
+    """Tests for compaction module methods on a temporary database."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+
+        # Snapshots 10 minutes apart over 5 hours; one hour is sampled.
+        self.snapshots = list(benchmarks.synthetic.make_snapshots(
+            20, 30, interval=600
+        ))
+        self.end = main.dates.get_epoch(self.snapshots[-1]['asOfDate'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _record(self):
+        with main.storage.SqliteStorage(path=self.path) as session:
+            for response in self.snapshots:
+                asOfDate = main.dates.get_epoch(response['asOfDate'])
+                session.record_snapshot(
+                    asOfDate, LoanBatch(asOfDate, response['loans'])
+                )
+
+    def _get_state(self, db_conn):
+        """Return tuple of scores by loan, the funding summary less its
+        snapshot counts, and the number of snapshot rows.
+        """
+        scores = dict(
+            (loan.id, loan.get_daily_funding_score())
+            for loan in main.database.iter_loans_over_time(db_conn)
+        )
+        summary = db_conn.select(
+            "SELECT id, dateStart, dateEnd, amountStart, amountEnd, "
+            "dailyFundingScore FROM loanFundingSummary ORDER BY id"
+        ).fetchall()
+        rows = db_conn.select(
+            "SELECT COUNT(*) FROM loansFundedAsOfDate"
+        ).fetchone()[0]
+        return scores, summary, rows
+
+    @mock.patch('config.COMPACT_PAUSE', 0)
+    def test_compact(self):
+        self._record()
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            scores, summary, rows = self._get_state(db_conn)
+            self.assertEqual(
+                main.compaction.compact(db_conn, before=self.end - 3600), 0
+            )
+
+            deleted = main.compaction.compact(
+                db_conn, before=self.end + 1, size=7
+            )
+            self.assertTrue(deleted)
+            self.assertEqual(
+                self._get_state(db_conn), (scores, summary, rows - deleted)
+            )
+            self.assertEqual(
+                main.compaction.compact(db_conn, before=self.end + 1), 0
+            )
+
+            # Summary snapshot counts follow the rows kept.
+            counts = db_conn.select(
+                "SELECT id, snapshots FROM loanFundingSummary ORDER BY id"
+            ).fetchall()
+            main.database.rebuild_funding_summary(db_conn)
+            self.assertEqual(
+                db_conn.select(
+                    "SELECT id, snapshots FROM loanFundingSummary "
+                    "ORDER BY id"
+                ).fetchall(),
+                counts
+            )
+
+            # Without samples, only change points, first and last remain.
+            main.compaction.compact(
+                db_conn, before=self.end + 1, interval=0
+            )
+            changes = db_conn.select(
+                "SELECT COUNT(*) FROM loansFundedAsOfDate"
+            ).fetchone()[0]
+            self.assertTrue(changes < rows - deleted)
+            self.assertEqual(self._get_state(db_conn)[:2], (scores, summary))
+
+    @mock.patch('config.COMPACT_PAUSE', 0)
+    def test_compact_partitioned(self):
+        with mock.patch(
+            'config.PARTITION_PATH', os.path.join(self.directory, "partitions")
+        ):
+            self._record()
+            with main.compaction.open_database(
+                path=self.path, before=self.end + 1
+            ) as db_conn:
+                scores, summary, rows = self._get_state(db_conn)
+                self.assertEqual(len(db_conn.attached), 1)
+
+                deleted = main.compaction.compact(db_conn, before=self.end + 1)
+                self.assertTrue(deleted)
+                self.assertEqual(
+                    self._get_state(db_conn), (scores, summary, rows - deleted)
+                )
+
+    @mock.patch('config.COMPACT_PAUSE', 0)
+    def test_compact_frozen(self):
+        directory = os.path.join(self.directory, "partitions")
+        with mock.patch('config.PARTITION_PATH', directory):
+            self._record()
+            for month, path in main.database.get_partitions(directory):
+                main.database.freeze_partition(path)
+
+            with main.compaction.open_database(
+                path=self.path, before=self.end + 1
+            ) as db_conn:
+                state = self._get_state(db_conn)
+                self.assertEqual(
+                    main.compaction.compact(db_conn, before=self.end + 1), 0
+                )
+                self.assertEqual(self._get_state(db_conn), state)
+
+    @mock.patch('config.COMPACT_PAUSE', 0)
+    def test_compactor(self):
+        self._record()
+        compactor = main.compaction.Compactor(path=self.path, interval=3600)
+        compactor.start()
+
+        deadline = time.time() + 10
+        while not compactor.deleted and time.time() < deadline:
+            time.sleep(0.01)
+        compactor.stop()
+        self.assertTrue(compactor.deleted)
+
+
+if __name__ == "__main__":
+    unittest.main()
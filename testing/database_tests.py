@@ -1,9 +1,21 @@
 
+import benchmarks.synthetic
 import config
+import main.analytics
 import main.database
+import main.dates
+import main.export
+import main.loans
+import main.storage
 import mock
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
 
+from main.loans import LoanBatch
+
 
 class TestDatabaseMethods(unittest.TestCase):
     """Unit tests for database module methods.
@@ -29,6 +41,31 @@ class TestDatabaseMethods(unittest.TestCase):
         self.assertIsInstance(call_args[0], str)
         self.assertEqual(call_args[1], [loan_tuple_mock])
 
+    def test_add_loan_funding_changes(self):
+        loan_mock = mock.Mock()
+        loan_mock.get_funded_tuple.return_value = ("d1", 25.0, 1)
+        db_conn_mock = mock.Mock()
+        tracker = main.database.FundingChangeTracker()
+        tracker.amounts = {1: 25.0, 2: 50.0}
+
+        resp = main.database.add_loan_funding_changes(
+            "d1", [loan_mock], db_conn_mock, tracker
+        )
+        self.assertEqual(resp, 1)
+        self.assertEqual(len(db_conn_mock.executemany.call_args_list), 1)
+        call_args = db_conn_mock.executemany.call_args_list[0][0]
+        self.assertIsInstance(call_args[0], str)
+        self.assertEqual(call_args[1], [("d1", None, 2, 0)])
+        self.assertEqual(tracker.amounts, {1: 25.0})
+
+        # No changes, nothing written.
+        db_conn_mock.reset_mock()
+        resp = main.database.add_loan_funding_changes(
+            "d2", [loan_mock], db_conn_mock, tracker
+        )
+        self.assertEqual(resp, 0)
+        self.assertFalse(db_conn_mock.executemany.called)
+
     def test_add_raw_loan_dates(self):
         date_string_mock = "2015-01-01T17:39:34.411-08:00"
         db_conn_mock = mock.Mock()
@@ -77,6 +114,553 @@ class TestDatabaseMethods(unittest.TestCase):
         self.assertEqual(resp, False)
 
 
+class TestFundingChangeTrackerClass(unittest.TestCase):
+    """Unit tests for FundingChangeTracker class."""
+
+    def setUp(self):
+        self.tracker = main.database.FundingChangeTracker()
+
+    def test_get_changes(self):
+        self.tracker.apply([])
+        changes = self.tracker.get_changes("d1", [("d1", 0.0, 1), ("d1", 5.0, 2)])
+        self.assertEqual(changes, [("d1", 0.0, 1, 1), ("d1", 5.0, 2, 1)])
+        self.tracker.apply(changes)
+
+        # Changed, unchanged, disappeared and appeared loans.
+        changes = self.tracker.get_changes("d2", [("d2", 10.0, 1), ("d2", 1.0, 3)])
+        self.assertEqual(
+            sorted(changes),
+            [("d2", None, 2, 0), ("d2", 1.0, 3, 1), ("d2", 10.0, 1, 1)]
+        )
+        self.tracker.apply(changes)
+        self.assertEqual(self.tracker.amounts, {1: 10.0, 3: 1.0})
+        self.assertEqual(
+            self.tracker.get_changes("d3", [("d3", 10.0, 1), ("d3", 1.0, 3)]),
+            []
+        )
+
+
+class TestRawLoanTrackerClass(unittest.TestCase):
+    """Tests for RawLoanTracker class."""
+
+    def setUp(self):
+        self.tracker = main.database.RawLoanTracker()
+        self.batch = LoanBatch(
+            1420162774, benchmarks.synthetic.make_loans(5)
+        )
+
+    def test_split(self):
+        new, known = self.tracker.split(self.batch)
+        self.assertIs(new, self.batch)
+        self.assertEqual(known, [])
+
+        self.tracker.apply(self.batch.take([1, 3]))
+        self.assertEqual(self.tracker.ids, set([2, 4]))
+        new, statuses = self.tracker.split(self.batch)
+        self.assertEqual(new.ids, [1, 3, 5])
+        expected = [
+            tuple(self.batch.column(key)[index]
+                  for key in main.loans.STATUS_FIELDS)
+            for index in (1, 3)
+        ]
+        self.assertEqual(statuses, expected)
+
+        loans = list(self.batch.get_records())
+        new, statuses = self.tracker.split(
+            [main.loans.Loan.from_record(record) for record in loans]
+        )
+        self.assertEqual([loan.id for loan in new], [1, 3, 5])
+        self.assertEqual(statuses, expected)
+
+        # Known only: no new loans are copied.
+        self.tracker.apply(self.batch)
+        new, statuses = self.tracker.split(self.batch)
+        self.assertIsInstance(new, LoanBatch)
+        self.assertEqual(len(new), 0)
+        self.assertEqual([status[-1] for status in statuses], [1, 2, 3, 4, 5])
+
+
+class TestFundingChangesReader(unittest.TestCase):
+    """Tests rebuilding snapshots from funding changes on a real database."""
+
+    def setUp(self):
+        self.db = main.database.SqliteDatabase(path=":memory:")
+        main.database.migrate(self.db)
+
+        columns = len(self.db.database.execute(
+            "PRAGMA table_info(rawLoans)"
+        ).fetchall())
+        for loan_id in (1, 2):
+            row = [None] * columns
+            row[25] = loan_id  # rawLoans.id
+            self.db.database.execute(
+                "INSERT INTO rawLoans VALUES(%s)" % ",".join("?" * columns),
+                row
+            )
+
+        tracker = main.database.FundingChangeTracker()
+        snapshots = [
+            ("d1", [("d1", 25.0, 1)]),
+            ("d2", [("d2", 25.0, 1), ("d2", 0.0, 2)]),
+            ("d3", [("d3", 50.0, 2)]),
+        ]
+        for asOfDate, funded in snapshots:
+            loans = []
+            for funded_tuple in funded:
+                loan = mock.Mock()
+                loan.get_funded_tuple.return_value = funded_tuple
+                loans.append(loan)
+            main.database.add_raw_loan_dates(asOfDate, self.db)
+            main.database.add_loan_funding_changes(
+                asOfDate, loans, self.db, tracker
+            )
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_get_loans_from_changes(self):
+        rows = [row[:3] for row in main.database.get_loans_from_changes(self.db)]
+        self.assertEqual(rows, [
+            ("d1", 25.0, 1),
+            ("d2", 25.0, 1),
+            ("d2", 0.0, 2),
+            ("d3", 50.0, 2),
+        ])
+
+        self.db.set_row_factory()
+        rows = list(main.database.get_loans_from_changes(self.db))
+        self.assertEqual(rows[-1]['fundedAmount'], 50.0)
+        self.assertEqual(rows[-1]['id'], 2)
+        self.assertIn('loanAmount', rows[-1])
+
+    def test_seed(self):
+        tracker = main.database.FundingChangeTracker()
+        tracker.seed(self.db)
+        self.assertEqual(tracker.amounts, {2: 50.0})
+
+
+class TestLoansOverTimeReader(unittest.TestCase):
+    """Tests streaming LoanOverTime instances from a real database."""
+
+    def setUp(self):
+        self.db = main.database.SqliteDatabase(path=":memory:")
+        main.database.migrate(self.db)
+
+        columns = len(self.db.database.execute(
+            "PRAGMA table_info(rawLoans)"
+        ).fetchall())
+        for loan_id in (1, 2, 4):
+            row = [None] * columns
+            row[25] = loan_id  # rawLoans.id
+            row[34] = 100.0  # rawLoans.loanAmount
+            self.db.database.execute(
+                "INSERT INTO rawLoans VALUES(%s)" % ",".join("?" * columns),
+                row
+            )
+
+        self.db.executemany(
+            "INSERT INTO loansFundedAsOfDate VALUES(?,?,?)",
+            [
+                (3600, 25.0, 2),
+                (7200, 50.0, 1),
+                (3600, 10.0, 1),
+                (3600, 10.0, 3),  # No rawLoans row.
+                (10800, 75.0, 1),
+            ]
+        )
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_iter_loans_over_time(self):
+        loans = list(main.database.iter_loans_over_time(self.db, size=2))
+        self.assertEqual([loan.id for loan in loans], [1, 2])
+        self.assertEqual(loans[0].loanAmount, 100.0)
+        self.assertEqual(loans[0].dates, [3600, 7200, 10800])
+        self.assertEqual(loans[0].amounts, [10.0, 50.0, 75.0])
+        self.assertEqual(loans[0].dateDifference, 7200)
+        self.assertEqual(loans[1].amounts, [25.0])
+
+
+class TestMigrations(unittest.TestCase):
+    """Tests upgrading a database in place."""
+
+    def setUp(self):
+        self.db = main.database.SqliteDatabase(path=":memory:")
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_migrate(self):
+        # Baseline layout, as formerly created by hand.
+        self.db.database.executescript(main.database.MIGRATIONS[0][1])
+        self.db.executemany(
+            "INSERT INTO rawLoanDates VALUES(?)",
+            [("2015-01-01T17:39:34.411-08:00",), ("2015-01-01T17:40:34.411-08:00",)]
+        )
+        self.db.executemany(
+            "INSERT INTO loansFundedAsOfDate VALUES(?,?,?)",
+            [
+                ("2015-01-01T17:39:34.411-08:00", 25.0, 1),
+                ("2015-01-01T17:40:34.411-08:00", 50.0, 1),
+            ]
+        )
+        self.assertEqual(main.database.get_schema_version(self.db), 0)
+
+        applied = main.database.migrate(self.db)
+        self.assertEqual(applied, range(1, main.database.SCHEMA_VERSION + 1))
+        main.database.check_schema_version(self.db)
+        self.assertEqual(
+            self.db.execute(
+                "SELECT snapshotId, asOfDate FROM rawLoanDates",
+                results='fetchall'
+            ),
+            [(1, 1420162774), (2, 1420162834)]
+        )
+        self.assertEqual(
+            self.db.execute(
+                "SELECT * FROM loansFundedAsOfDate",
+                results='fetchall'
+            ),
+            [(1420162774, 25.0, 1), (1420162834, 50.0, 1)]
+        )
+        self.assertTrue(main.database.has_been_recorded(1420162774, self.db))
+        self.assertEqual(
+            self.db.execute(
+                "SELECT id, dateStart, dateEnd, amountStart, amountEnd, "
+                "snapshots FROM loanFundingSummary",
+                results='fetchall'
+            ),
+            [(1, 1420162774, 1420162834, 25.0, 50.0, 2)]
+        )
+
+        # Nothing further to apply.
+        self.assertEqual(main.database.migrate(self.db), [])
+
+    def test_migrate_newer(self):
+        self.db.execute("PRAGMA user_version = 9999")
+        self.assertRaises(
+            main.database.SchemaVersionError,
+            main.database.migrate,
+            self.db
+        )
+        self.assertRaises(
+            main.database.SchemaVersionError,
+            main.database.check_schema_version,
+            self.db
+        )
+
+    def test_migrate_old_sqlite(self):
+        with mock.patch("main.database.sqlite3.sqlite_version_info", (3, 8, 2)):
+            self.assertRaises(
+                main.database.SchemaVersionError,
+                main.database.migrate,
+                self.db
+            )
+        self.assertEqual(main.database.get_schema_version(self.db), 0)
+
+    def test_migrate_rollback(self):
+        # Pre-existing table clashing with the second migration.
+        self.db.database.executescript(main.database.MIGRATIONS[0][1])
+        self.db.execute("CREATE TABLE rawLoanDatesV2(x)")
+        self.assertRaises(sqlite3.Error, main.database.migrate, self.db)
+        self.assertEqual(main.database.get_schema_version(self.db), 1)
+        self.db.execute("INSERT INTO rawLoanDates VALUES(?)", ("d1",))
+
+
+class TestFundingSummary(unittest.TestCase):
+    """Tests for `loanFundingSummary` maintenance on a temporary database."""
+
+    columns = (
+        'id', 'loanAmount', 'dateStart', 'dateEnd', 'amountStart',
+        'amountEnd', 'snapshots', 'dailyFundingScore'
+    )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+        self.session = main.storage.SqliteStorage(path=self.path)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory)
+
+    def _record(self):
+        # Snapshots 5 hours apart, so spans fall either side of a day.
+        for response in benchmarks.synthetic.make_snapshots(
+            30, 6, interval=5 * 3600
+        ):
+            asOfDate = main.dates.get_epoch(response['asOfDate'])
+            self.session.record_snapshot(
+                asOfDate, LoanBatch(asOfDate, response['loans'])
+            )
+
+    def _summary(self):
+        sql = "SELECT %s FROM loanFundingSummary ORDER BY id" % (
+            ", ".join(self.columns)
+        )
+        return self.session.db_conn.execute(sql, results='fetchall')
+
+    def test_incremental(self):
+        self._record()
+        summary = self._summary()
+
+        velocity = main.analytics.FundingVelocity.from_database(
+            self.session.db_conn
+        )
+        self.assertEqual(
+            summary,
+            zip(*[
+                velocity.column(key) for key in self.columns[:-2] + (
+                    'snapshots', 'dailyFundingScore'
+                )
+            ])
+        )
+        self.assertTrue(any(row[-1] for row in summary))
+
+        fastest = main.database.get_fastest_funded(
+            self.session.db_conn, limit=3
+        )
+        self.assertEqual(
+            [row[-1] for row in fastest],
+            sorted([row[-1] for row in summary], reverse=True)[:3]
+        )
+
+        # Rebuilding from history gives the same summary.
+        self.assertEqual(
+            main.database.rebuild_funding_summary(self.session.db_conn),
+            len(summary)
+        )
+        self.assertEqual(self._summary(), summary)
+
+    @mock.patch('config.FUNDING_CHANGES_ONLY', True)
+    def test_funding_changes_only(self):
+        self._record()
+        summary = self._summary()
+        self.assertTrue(summary)
+
+        self.session.db_conn.set_row_factory()
+        main.database.rebuild_funding_summary(self.session.db_conn)
+        self.session.db_conn.set_row_factory(None)
+        self.assertEqual(self._summary(), summary)
+
+        # Readers rebuild snapshots from the changes.
+        velocity = main.analytics.FundingVelocity.from_database(
+            self.session.db_conn
+        )
+        self.assertEqual(
+            summary,
+            zip(*[
+                velocity.column(key) for key in self.columns[:-2] + (
+                    'snapshots', 'dailyFundingScore'
+                )
+            ])
+        )
+        self.assertEqual(
+            [
+                (loan.id, loan.get_daily_funding_score()) for loan in
+                main.database.iter_loans_over_time(self.session.db_conn)
+            ],
+            [(row[0], row[-1]) for row in summary]
+        )
+
+
+class TestPartitionedDatabaseClass(unittest.TestCase):
+    """Tests for per-month partitions on a temporary database."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        self.partitions = os.path.join(self.directory, "partitions")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+
+        # Three snapshots 15 days apart, from 2015-01-02 into February.
+        self.snapshots = list(benchmarks.synthetic.make_snapshots(
+            10, 3, interval=15 * 86400
+        ))
+        self.patcher = mock.patch('config.PARTITION_PATH', self.partitions)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def _record(self, snapshots):
+        with main.storage.SqliteStorage(path=self.path) as session:
+            for response in snapshots:
+                asOfDate = main.dates.get_epoch(response['asOfDate'])
+                session.record_snapshot(
+                    asOfDate, LoanBatch(asOfDate, response['loans'])
+                )
+            return dict(session.db_conn.attached)
+
+    def _count(self, db_conn, table):
+        sql = "SELECT COUNT(*) FROM %s" % table
+        return db_conn.select(sql).fetchone()[0]
+
+    def test_record_snapshot(self):
+        attached = self._record(self.snapshots)
+        self.assertEqual(sorted(attached), [(2015, 1), (2015, 2)])
+        self.assertEqual(
+            [os.path.basename(path) for _, path in
+             main.database.get_partitions(self.partitions)],
+            ["snapshots-2015-01.db", "snapshots-2015-02.db"]
+        )
+
+        with main.database.get_database(path=self.path) as db_conn:
+            self.assertEqual(self._count(db_conn, "loansFundedAsOfDate"), 30)
+            self.assertEqual(
+                self._count(db_conn, "main.loansFundedAsOfDate"), 0
+            )
+            self.assertEqual(len(db_conn.attached), 2)
+            self.assertEqual(len(main.database.get_loans(db_conn)), 30)
+
+        # Only partitions overlapping the range are attached.
+        with main.database.get_database(
+            path=self.path,
+            start=main.dates.get_epoch("2015-02-01T00:00:00Z")
+        ) as db_conn:
+            self.assertEqual(self._count(db_conn, "loansFundedAsOfDate"), 10)
+
+    @mock.patch('main.database.MAX_PARTITIONS', 1)
+    def test_attach_partition(self):
+        attached = self._record(self.snapshots)
+        self.assertEqual(list(attached), [(2015, 2)])
+
+        with main.database.PartitionedDatabase(
+            path=self.path,
+            start=main.dates.get_epoch("2015-02-01T00:00:00Z")
+        ) as db_conn:
+            with db_conn.transaction():
+                self.assertRaises(
+                    sqlite3.OperationalError,
+                    db_conn.attach_partition,
+                    main.dates.get_epoch("2015-03-01T00:00:00Z")
+                )
+
+    def _summary(self, db_conn):
+        sql = "SELECT * FROM loanFundingSummary ORDER BY id"
+        return db_conn.select(sql).fetchall()
+
+    def _check_groups(self):
+        # A year of monthly snapshots, one partition each.
+        self.snapshots = list(benchmarks.synthetic.make_snapshots(
+            5, 12, interval=31 * 86400
+        ))
+        attached = self._record(self.snapshots)
+        self.assertEqual(len(main.database.get_partitions(self.partitions)), 12)
+        self.assertEqual(len(attached), 10)
+
+        with main.database.get_database(path=self.path) as db_conn:
+            # The latest partitions are attached on connecting.
+            self.assertEqual(self._count(db_conn, "rawLoanDates"), 12)
+            self.assertEqual(sorted(db_conn.attached), sorted(attached))
+
+            # Reads of the whole history go through every partition.
+            self.assertEqual(len(main.database.get_loans(db_conn)), 60)
+            self.assertEqual(
+                sum(
+                    len(loan.dates) for loan in
+                    main.database.iter_loans_over_time(db_conn)
+                ),
+                60
+            )
+            self.assertEqual(
+                sum(
+                    row[-1] for rows in
+                    main.database.iter_funding_stats(db_conn) for row in rows
+                ),
+                60
+            )
+
+            summary = self._summary(db_conn)
+            self.assertEqual(
+                main.database.rebuild_funding_summary(db_conn), len(summary)
+            )
+            self.assertEqual(self._summary(db_conn), summary)
+            self.assertEqual(sorted(db_conn.attached), sorted(attached))
+
+    def test_partition_groups(self):
+        self._check_groups()
+
+        path = os.path.join(self.directory, "export.csv")
+        with main.database.get_database(path=self.path) as db_conn:
+            self.assertEqual(main.export.export(db_conn, path), 60)
+
+    @mock.patch('config.FUNDING_CHANGES_ONLY', True)
+    def test_partition_groups_changes_only(self):
+        self._check_groups()
+
+        # The loans of the first snapshot, listed again and then unchanged in
+        # later months, each recorded by a new session.
+        for date in ("2016-01-02", "2016-02-02", "2016-03-02"):
+            self._record([
+                dict(self.snapshots[0], asOfDate=date + "T00:00:00Z")
+            ])
+
+        sql = """
+            SELECT COUNT(*)
+              FROM loanFundingChanges
+             WHERE asOfDate >= ?
+        """
+        with main.database.get_database(
+            path=self.path,
+            start=main.dates.get_epoch("2016-01-01T00:00:00Z")
+        ) as db_conn:
+            self.assertEqual(
+                db_conn.select(
+                    sql, (main.dates.get_epoch("2016-01-02T00:00:00Z"),)
+                ).fetchone()[0],
+                # Listed again; those of December 2015 delisted.
+                2 * len(self.snapshots[0]['loans'])
+            )
+            self.assertEqual(
+                db_conn.select(
+                    sql, (main.dates.get_epoch("2016-02-02T00:00:00Z"),)
+                ).fetchone()[0],
+                0
+            )
+
+    def test_no_partition(self):
+        with main.database.PartitionedDatabase(path=self.path) as db_conn:
+            self.assertRaises(
+                sqlite3.IntegrityError,
+                main.database.add_loans_funded_as_of_date,
+                [mock.Mock(**{'get_funded_tuple.return_value': (1, 2, 3)})],
+                db_conn
+            )
+
+    def test_freeze_partitions(self):
+        self._record(self.snapshots[:2])
+        february = main.dates.get_epoch("2015-02-01T00:00:00Z")
+        frozen = main.database.freeze_partitions(
+            self.partitions, before=february
+        )
+        self.assertEqual(
+            frozen,
+            [main.database.get_partition_path(self.partitions, february - 1)]
+        )
+        self.assertTrue(main.database.is_frozen(frozen[0]))
+        self.assertEqual(
+            main.database.freeze_partitions(self.partitions, before=february),
+            []
+        )
+
+        # Frozen partitions are read, but not written.
+        self._record(self.snapshots[2:])
+        with main.database.get_database(path=self.path) as db_conn:
+            self.assertEqual(self._count(db_conn, "loansFundedAsOfDate"), 30)
+            db_conn.execute("DELETE FROM loansFundedAsOfDate")
+            self.assertEqual(self._count(db_conn, "loansFundedAsOfDate"), 20)
+
+        response = dict(self.snapshots[0])
+        response['asOfDate'] = "2015-01-03T00:00:00.000Z"
+        self.assertRaises(sqlite3.OperationalError, self._record, [response])
+
+
 class TestSqliteDatabaseClass(unittest.TestCase):
     """Unit tests for Database class."""
 
@@ -100,6 +684,46 @@ class TestSqliteDatabaseClass(unittest.TestCase):
             self.assertFalse(db_close_mock.called)
         self.assertTrue(db_close_mock.called)
 
+    @mock.patch('sqlite3.connect')
+    def test_pragmas(self, sqlite_connect_mock):
+        connection_mock = mock.Mock()
+        sqlite_connect_mock.return_value = connection_mock
+
+        db = main.database.SqliteDatabase(
+            path="other.db",
+            pragmas=[('synchronous', 'NORMAL')]
+        )
+        db.database
+        sqlite_connect_mock.assert_called_with("other.db")
+        connection_mock.execute.assert_called_with("PRAGMA synchronous = NORMAL")
+
+    @mock.patch('sqlite3.connect')
+    def test_transaction(self, sqlite_connect_mock):
+        connection_mock = mock.Mock()
+        sqlite_connect_mock.return_value = connection_mock
+        db = main.database.SqliteDatabase()
+
+        # Single commit for all statements.
+        with db.transaction():
+            db.execute("select 1")
+            db.executemany("select ?", [(1,), (2,)])
+            self.assertFalse(connection_mock.commit.called)
+        self.assertEqual(connection_mock.commit.call_count, 1)
+        self.assertFalse(connection_mock.rollback.called)
+        connection_mock.reset_mock()
+
+        # Rolled back and closed on exception.
+        def fail():
+            with db.transaction():
+                db.execute("select 1")
+                raise Exception("Meow!")
+
+        self.assertRaises(Exception, fail)
+        self.assertFalse(connection_mock.commit.called)
+        self.assertTrue(connection_mock.rollback.called)
+        self.assertTrue(connection_mock.close.called)
+        self.assertEqual(db._database, None)
+
     def test_close(self):
         db = main.database.SqliteDatabase()
         db_conn_mock = mock.Mock()
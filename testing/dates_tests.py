@@ -0,0 +1,54 @@
+
+import main.dates
+import unittest
+
+
+class TestDatesModuleMethods(unittest.TestCase):
+    """Unit tests for dates module methods."""
+
+    def test_parse_epoch(self):
+        # 2015-01-02T01:39:34Z
+        expected = 1420162774
+        for date_string in (
+            "2015-01-01T17:39:34.411-08:00",
+            "2015-01-01T17:39:34-0800",
+            "2015-01-02T01:39:34.000Z",
+            "2015-01-02T03:39:34+02:00",
+            "2015-01-02T01:39:34",
+            "Jan 2 2015 01:39:34",
+            "2015-01-01 17:39:34 -08:00",
+        ):
+            self.assertEqual(
+                main.dates._parse_epoch(date_string), expected, date_string
+            )
+
+
+class TestEpochCacheClass(unittest.TestCase):
+    """Unit tests for EpochCache class."""
+
+    def test_get_epoch(self):
+        cache = main.dates.EpochCache(maxsize=2)
+        self.assertEqual(cache.get_epoch("1970-01-01T00:00:01Z"), 1)
+        self.assertEqual(cache.get_epoch("1970-01-01T00:00:01Z"), 1)
+        self.assertEqual(cache.info()['hits'], 1)
+        self.assertEqual(cache.info()['misses'], 1)
+
+        # Least recently used is evicted.
+        cache.get_epoch("1970-01-01T00:00:02Z")
+        cache.get_epoch("1970-01-01T00:00:01Z")
+        cache.get_epoch("1970-01-01T00:00:03Z")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(
+            sorted(cache._cache),
+            ["1970-01-01T00:00:01Z", "1970-01-01T00:00:03Z"]
+        )
+        self.assertEqual(cache.info()['misses'], 3)
+
+        cache.clear()
+        self.assertEqual(cache.info(), {
+            'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
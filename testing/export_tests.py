@@ -0,0 +1,124 @@
+
+import benchmarks.synthetic
+import csv
+import gzip
+import main.database
+import main.dates
+import main.export
+import main.storage
+import os
+import shutil
+import tempfile
+import unittest
+
+from main.loans import LoanBatch
+
+
+class TestExportModuleMethods(unittest.TestCase):
+    """Tests for export module methods on a temporary database."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+        self.session = main.storage.SqliteStorage(path=self.path)
+        self.snapshots = list(
+            benchmarks.synthetic.make_snapshots(20, 4, interval=3600)
+        )
+        self.epochs = [
+            main.dates.get_epoch(response['asOfDate'])
+            for response in self.snapshots
+        ]
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory)
+
+    def _record(self, snapshots):
+        for response in snapshots:
+            asOfDate = main.dates.get_epoch(response['asOfDate'])
+            self.session.record_snapshot(
+                asOfDate, LoanBatch(asOfDate, response['loans'])
+            )
+
+    def _read(self, path):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rb') as export_file:
+            return list(csv.reader(export_file))
+
+    def test_export(self):
+        self._record(self.snapshots)
+        output = os.path.join(self.directory, "export.csv.gz")
+
+        rows = main.export.export(self.session.db_conn, output, size=7)
+        exported = self._read(output)
+        self.assertEqual(exported[0], ['asOfDate', 'fundedAmount', 'id'])
+        self.assertEqual(rows, len(exported) - 1)
+        self.assertEqual(rows, 80)
+
+        # Ordered by id, then asOfDate, as `export_csv.sh` was.
+        keys = [(int(row[2]), int(row[0])) for row in exported[1:]]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_export_filters(self):
+        self._record(self.snapshots)
+        output = os.path.join(self.directory, "export.csv")
+
+        rows = main.export.export(
+            self.session.db_conn,
+            output,
+            start=self.snapshots[1]['asOfDate'],
+            end=str(self.epochs[2]),
+            grades=['A', 'B'],
+            raw=True
+        )
+        exported = self._read(output)
+        header = exported[0]
+        self.assertEqual(header[:3], ['asOfDate', 'fundedAmount', 'id'])
+        self.assertIn('grade', header)
+        self.assertEqual(rows, len(exported) - 1)
+        self.assertTrue(rows)
+
+        for row in exported[1:]:
+            self.assertIn(int(row[0]), self.epochs[1:3])
+            self.assertIn(row[header.index('grade')], ('A', 'B'))
+
+    def test_export_watermark(self):
+        watermark = os.path.join(self.directory, "watermark")
+        output = os.path.join(self.directory, "export.csv")
+        self.assertEqual(main.export.get_watermark(watermark), 0)
+
+        self._record(self.snapshots[:2])
+        self.assertEqual(
+            main.export.export(
+                self.session.db_conn, output, watermark=watermark
+            ),
+            40
+        )
+        self.assertEqual(main.export.get_watermark(watermark), 2)
+
+        # Only snapshots recorded since are exported.
+        self._record(self.snapshots[2:])
+        self.assertEqual(
+            main.export.export(
+                self.session.db_conn, output, watermark=watermark
+            ),
+            40
+        )
+        self.assertEqual(
+            set(int(row[0]) for row in self._read(output)[1:]),
+            set(self.epochs[2:])
+        )
+
+        self.assertEqual(
+            main.export.export(
+                self.session.db_conn, output, watermark=watermark
+            ),
+            0
+        )
+        self.assertEqual(main.export.get_watermark(watermark), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+
+import main.database
+import mock
+import unittest
+
+from main.lc_commons import DROP_BUCKET, DROP_LEAD, PollScheduler
+
+
+class TestPollSchedulerClass(unittest.TestCase):
+    """Tests for PollScheduler class."""
+
+    def setUp(self):
+        self.day = 1420070400  # 2015-01-01T00:00:00Z.
+        self.scheduler = PollScheduler(
+            interval=60, min_interval=10, max_interval=300, budget=60
+        )
+        self.scheduler.tokens = 60.0
+
+    def test_backoff(self):
+        self.scheduler.observe(self.day, 100)
+        self.assertEqual(self.scheduler.get_delay(self.day), 60)
+
+        for _ in xrange(10):
+            self.scheduler.observe(self.day, 100)
+        self.assertEqual(self.scheduler.get_delay(self.day), 300)
+
+        self.scheduler.observe(self.day + 60, 100)
+        self.assertEqual(self.scheduler.get_delay(self.day), 60)
+
+    def test_listing_drops(self):
+        drop = 14 * 3600  # Listings jump at 14:00 each day.
+        for day in (0, 1):
+            start = self.day + day * 86400 + drop - 120
+            self.scheduler.observe(start, 100)
+            self.scheduler.observe(start + 60, 100)
+            self.scheduler.observe(start + 180, 150)
+        self.assertEqual(self.scheduler.drops, {drop // DROP_BUCKET: 2})
+
+        now = self.day + 2 * 86400 + drop
+        self.assertEqual(self.scheduler.get_next_drop(now), 0)
+        self.assertEqual(self.scheduler.get_delay(now), 10)
+        self.assertEqual(
+            self.scheduler.get_next_drop(now - DROP_LEAD - 30), 30
+        )
+        self.assertEqual(self.scheduler.get_delay(now - DROP_LEAD - 30), 30)
+        self.assertEqual(self.scheduler.get_delay(now - 3600), 60)
+
+    def test_budget(self):
+        self.scheduler.tokens = 1.0
+        self.scheduler.drops[0] = 2
+        now = self.day
+        requests = 0
+
+        while now < self.day + 2 * 3600:
+            now += self.scheduler.get_delay(now)
+            self.scheduler.record_request(now)
+            requests += 1
+        self.assertTrue(requests <= 2 * 60 + 1)
+        self.assertTrue(self.scheduler.tokens > -1e-9)
+
+    def test_seed(self):
+        with main.database.SqliteDatabase(path=":memory:") as db_conn:
+            main.database.migrate(db_conn)
+            rows = []
+            for day in (0, 1):
+                for minute, count in ((0, 10), (1, 10), (2, 20)):
+                    asOfDate = self.day + day * 86400 + 3600 + minute * 60
+                    rows.extend(
+                        (asOfDate, 25.0, loan_id)
+                        for loan_id in xrange(count)
+                    )
+            db_conn.executemany(
+                "INSERT INTO loansFundedAsOfDate VALUES(?,?,?)", rows
+            )
+
+            self.scheduler.seed(db_conn, now=self.day + 2 * 86400)
+        self.assertEqual(
+            self.scheduler.drops, {(3600 + 120) // DROP_BUCKET: 2}
+        )
+
+    @mock.patch('config.FUNDING_CHANGES_ONLY', True)
+    def test_seed_funding_changes(self):
+        tracker = main.database.FundingChangeTracker()
+        with main.database.SqliteDatabase(path=":memory:") as db_conn:
+            main.database.migrate(db_conn)
+            for day in (0, 1):
+                for minute, count in ((0, 10), (1, 10), (2, 20)):
+                    asOfDate = self.day + day * 86400 + 3600 + minute * 60
+                    main.database.add_raw_loan_dates(asOfDate, db_conn)
+                    changes = tracker.get_changes(asOfDate, [
+                        (asOfDate, 25.0, day * 100 + loan_id)
+                        for loan_id in xrange(count)
+                    ])
+                    db_conn.executemany(
+                        "INSERT INTO loanFundingChanges VALUES(?,?,?,?)",
+                        changes
+                    )
+                    tracker.apply(changes)
+
+            self.scheduler.seed(db_conn, now=self.day + 2 * 86400)
+        self.assertEqual(
+            self.scheduler.drops, {(3600 + 120) // DROP_BUCKET: 2}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+
+import main.loans
+import unittest
+
+from benchmarks.synthetic import make_response
+
+
+class TestLoanClass(unittest.TestCase):
+    """Unit tests for Loan class and its LoanRecord."""
+
+    def setUp(self):
+        self.response_json = make_response(2)
+        self.asOfDate = self.response_json['asOfDate']
+        self.loan = main.loans.Loan(
+            self.asOfDate, self.response_json['loans'][0]
+        )
+
+    def test_record(self):
+        record = self.loan.record
+        self.assertIsInstance(record, main.loans.LoanRecord)
+        self.assertEqual(type(record).__slots__, ())
+        self.assertEqual(record._fields, tuple(main.loans.Loan.attributes))
+        self.assertEqual(record[0], record.acceptD)
+        self.assertEqual(self.loan.asOfDate, self.asOfDate)
+        self.assertEqual(self.loan.id, 1)
+        self.assertEqual(dict(self.loan.iteritems()), self.loan.values)
+
+    def test_tuples(self):
+        values = self.loan.values
+        self.assertEqual(
+            self.loan.get_raw_loans_tuple(),
+            tuple(
+                values[key] for key in main.loans.Loan.attributes
+                if key not in ('asOfDate', 'fundedAmount')
+            )
+        )
+        self.assertEqual(
+            self.loan.get_funded_tuple(),
+            (self.asOfDate, values['fundedAmount'], 1)
+        )
+
+    def test_from_record(self):
+        loan = main.loans.Loan.from_record(self.loan.record)
+        self.assertEqual(loan.values, self.loan.values)
+
+
+class TestLoanOverTimeClass(unittest.TestCase):
+    """Unit tests for LoanOverTime class."""
+
+    def setUp(self):
+        self.loan_json = make_response(1)['loans'][0]
+        self.loan_json['loanAmount'] = 1000
+        self.loans = [
+            main.loans.Loan(asOfDate, dict(self.loan_json, fundedAmount=amount))
+            for asOfDate, amount in (
+                ("2015-01-01T12:00:00.000-08:00", 250),
+                ("2015-01-01T00:00:00.000-08:00", 100),
+                ("2015-01-01T06:00:00.000-08:00", 175),
+            )
+        ]
+
+    def test_load(self):
+        loan_over_time = main.loans.LoanOverTime()
+        self.assertEqual(loan_over_time.id, None)
+        loan_over_time.load(*self.loans)
+        self.assertEqual(loan_over_time.id, 1)
+        self.assertEqual(loan_over_time.asOfDate, None)
+        self.assertEqual(loan_over_time.fundedAmount, None)
+        self.assertEqual(loan_over_time.loanAmount, 1000)
+        self.assertEqual(loan_over_time.amountStart, 100)
+        self.assertEqual(loan_over_time.amountEnd, 250)
+        self.assertEqual(loan_over_time.dateStart, self.loans[1].asOfDate)
+        self.assertEqual(loan_over_time.dateEnd, self.loans[0].asOfDate)
+        self.assertEqual(loan_over_time.dateDifference, 12 * 60 * 60)
+        self.assertEqual(loan_over_time.fundedRate, 0.25)
+        self.assertEqual(loan_over_time.get_daily_funding_score(), 0.5)
+
+        # Already loaded dates are skipped.
+        loan_over_time.load(self.loans[0])
+        self.assertEqual(len(loan_over_time.dates), 3)
+        self.assertEqual(loan_over_time.amounts, [250, 100, 175])
+
+        self.assertRaises(TypeError, loan_over_time.load, self.loan_json)
+
+    def test_add_snapshot(self):
+        loan_over_time = main.loans.LoanOverTime()
+        self.assertEqual(loan_over_time.amountStart, None)
+        self.assertEqual(loan_over_time.dateDifference, None)
+        self.assertEqual(loan_over_time.get_daily_funding_score(), 0)
+        self.assertTrue(loan_over_time.add_snapshot(90000, 50.0))
+        self.assertTrue(loan_over_time.add_snapshot(3600, 25.0))
+        self.assertFalse(loan_over_time.add_snapshot(3600, 75.0))
+        self.assertEqual(loan_over_time.amountStart, 25.0)
+        self.assertEqual(loan_over_time.amountEnd, 50.0)
+        self.assertEqual(loan_over_time.dateDifference, 86400)
+
+    def test_unfunded_snapshots(self):
+        # Unfunded amounts are recorded as NoneType.
+        loan_over_time = main.loans.LoanOverTime.from_record(
+            main.loans.Loan("2015-01-01T00:00:00.000-08:00", dict(
+                make_response(1)['loans'][0], loanAmount=1000
+            )).record
+        )
+        loan_over_time.add_snapshot(3600, None)
+        loan_over_time.add_snapshot(90000, None)
+        self.assertEqual(loan_over_time.amountEnd, None)
+        self.assertEqual(loan_over_time.amountLeft, 1000)
+        self.assertEqual(loan_over_time.get_daily_funding_score(), 0)
+
+        loan_over_time.add_snapshot(46800, 500.0)
+        loan_over_time.add_snapshot(50400, 250.0)
+        self.assertEqual(loan_over_time.amounts, [None, None, 500.0, 250.0])
+        self.assertEqual(loan_over_time.amountStart, None)
+        self.assertEqual(loan_over_time.amountEnd, 500.0)
+        self.assertEqual(loan_over_time.fundedRate, 0.5)
+        self.assertEqual(loan_over_time.get_daily_funding_score(), 0.5)
+
+
+class TestLoanBatchClass(unittest.TestCase):
+    """Unit tests for LoanBatch class."""
+
+    def setUp(self):
+        self.response_json = make_response(20)
+        self.response_json['loans'][0]['desc'] = None
+        self.response_json['loans'][0]['dti'] = 0
+        self.response_json['loans'][1]['acceptD'] = None
+        self.asOfDate = self.response_json['asOfDate']
+        self.loans = [
+            main.loans.Loan(self.asOfDate, loan)
+            for loan in self.response_json['loans']
+        ]
+        self.batch = main.loans.LoanBatch(
+            self.asOfDate, self.response_json['loans']
+        )
+
+    def test_len(self):
+        self.assertEqual(len(self.batch), 20)
+
+    def test_nulls(self):
+        self.assertEqual(self.batch.nulls['desc'][0], 1)
+        self.assertEqual(self.batch.nulls['dti'][0], 1)
+        self.assertEqual(self.batch.nulls['acceptD'][1], 1)
+        self.assertEqual(self.batch.column('dti')[0], None)
+        self.assertEqual(self.batch.column('acceptD')[1], None)
+
+    def test_get_raw_loans_tuples(self):
+        self.assertEqual(
+            list(self.batch.get_raw_loans_tuples()),
+            [loan.get_raw_loans_tuple() for loan in self.loans]
+        )
+
+    def test_get_funded_tuples(self):
+        self.assertEqual(
+            list(self.batch.get_funded_tuples()),
+            [loan.get_funded_tuple() for loan in self.loans]
+        )
+        self.assertEqual(self.batch.ids, range(1, 21))
+
+
+if __name__ == "__main__":
+    unittest.main()
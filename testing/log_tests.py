@@ -0,0 +1,85 @@
+
+import Queue
+import hashlib
+import logging
+import main.log
+import mock
+import unittest
+
+
+class TestLogModuleMethods(unittest.TestCase):
+    """Unit tests for log module methods."""
+
+    def test_lazy(self):
+        function = mock.Mock(return_value="result")
+        lazy = main.log.Lazy(function, 1, key=2)
+        self.assertFalse(function.called)
+        self.assertEqual(str(lazy), "result")
+        function.assert_called_once_with(1, key=2)
+
+    def test_lazy_not_formatted_when_disabled(self):
+        function = mock.Mock(return_value="result")
+        logger = logging.getLogger("testing.lazy")
+        logger.setLevel(logging.INFO)
+        logger.debug("Value: %s", main.log.Lazy(function))
+        self.assertFalse(function.called)
+
+    def test_summarize(self):
+        payload = "x" * 1000
+        summary = str(main.log.summarize(payload))
+        self.assertIn("1000 bytes", summary)
+        self.assertIn(hashlib.sha1(payload).hexdigest(), summary)
+        self.assertTrue(len(summary) < 300)
+
+        self.assertEqual(str(main.log.summarize(payload, full=True)), payload)
+        self.assertEqual(str(main.log.summarize("short")), "short")
+
+    def test_summarize_response(self):
+        response = mock.Mock()
+        response.content = "{}"
+        self.assertEqual(str(main.log.summarize(response)), "{}")
+
+
+class TestQueueHandlerClass(unittest.TestCase):
+    """Unit tests for QueueHandler and QueueListener classes."""
+
+    def setUp(self):
+        self.logger = logging.getLogger("testing.queue")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        self.logger.handlers = []
+
+    def test_listener(self):
+        queue = Queue.Queue()
+        handler = main.log.QueueHandler(queue)
+        self.logger.addHandler(handler)
+
+        target = mock.Mock()
+        target.level = logging.INFO
+        listener = main.log.QueueListener(queue, target)
+        listener.start()
+
+        self.logger.info("Added %s loans.", 5)
+        self.logger.debug("Not written.")
+        listener.stop()
+
+        self.assertEqual(target.handle.call_count, 1)
+        record = target.handle.call_args[0][0]
+        self.assertEqual(record.getMessage(), "Added 5 loans.")
+        self.assertTrue(record.args is None)
+
+    def test_full_queue(self):
+        queue = Queue.Queue(maxsize=1)
+        handler = main.log.QueueHandler(queue)
+        self.logger.addHandler(handler)
+
+        self.logger.info("First.")
+        self.logger.info("Second.")
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(handler.dropped, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
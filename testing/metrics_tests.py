@@ -0,0 +1,73 @@
+
+import main.metrics
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestMetricsClasses(unittest.TestCase):
+    """Unit tests for metric and Registry classes."""
+
+    def setUp(self):
+        self.registry = main.metrics.Registry()
+
+    def test_counter(self):
+        counter = self.registry.add(main.metrics.Counter(
+            "test_total", "Test counter.", ("outcome",)
+        ))
+        self.assertEqual(counter.get(outcome="ok"), None)
+        counter.inc(outcome="ok")
+        counter.inc(2, outcome="ok")
+        counter.inc(outcome="error")
+        self.assertEqual(counter.get(outcome="ok"), 3)
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP test_total Test counter.\n"
+            "# TYPE test_total counter\n"
+            'test_total{outcome="error"} 1.0\n'
+            'test_total{outcome="ok"} 3.0\n'
+        )
+
+    def test_gauge(self):
+        gauge = self.registry.add(main.metrics.Gauge("test", "Test gauge."))
+        gauge.set(5)
+        gauge.set(2.5)
+        self.assertEqual(gauge.get(), 2.5)
+        self.assertIn("test 2.5\n", self.registry.render())
+
+    def test_histogram(self):
+        histogram = self.registry.add(main.metrics.Histogram(
+            "test_seconds", "Test histogram.", ("stage",), buckets=(0.5, 1.0)
+        ))
+        histogram.observe(0.25, stage="fetch")
+        histogram.observe(0.75, stage="fetch")
+        histogram.observe(2.0, stage="fetch")
+        with histogram.time(stage="write"):
+            pass
+
+        self.assertEqual(histogram.get(stage="fetch"), (3, 3.0))
+        self.assertEqual(histogram.get(stage="write")[0], 1)
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('test_seconds_bucket{stage="fetch",le="0.5"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="fetch",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="fetch",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_sum{stage="fetch"} 3.0', lines)
+        self.assertIn('test_seconds_count{stage="fetch"} 3', lines)
+
+    def test_write_textfile(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "lc_commons.prom")
+        try:
+            self.registry.add(main.metrics.Counter("test_total", "Test.")).inc()
+            self.registry.write_textfile(path)
+            with open(path) as metrics_file:
+                self.assertEqual(metrics_file.read(), self.registry.render())
+            self.assertEqual(os.listdir(directory), ["lc_commons.prom"])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+
+import benchmarks.synthetic
+import main.database
+import main.dates
+import main.query
+import main.storage
+import os
+import shutil
+import tempfile
+import unittest
+
+from main.loans import LoanBatch
+
+
+class TestQueryModuleMethods(unittest.TestCase):
+    """Tests for query module methods on a temporary database."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+        self.session = main.storage.SqliteStorage(path=self.path)
+        self.db_conn = self.session.db_conn
+
+        self.batches = [
+            LoanBatch(main.dates.get_epoch(response['asOfDate']),
+                      response['loans'])
+            for response in benchmarks.synthetic.make_snapshots(
+                50, 3, interval=3600
+            )
+        ]
+        self.records = {}
+        for batch in self.batches:
+            self.records.update(
+                (record.id, record) for record in batch.get_records()
+            )
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory)
+
+    def _record(self, batches):
+        for batch in batches:
+            self.session.record_snapshot(batch.asOfDate, batch)
+
+    def test_filters(self):
+        self._record(self.batches)
+        listed = sorted(record.listD for record in self.records.itervalues())
+        start, end = listed[len(listed) // 4], listed[-len(listed) // 4]
+
+        rows = list(main.query.iter_loans(
+            self.db_conn,
+            size=3,
+            columns=['grade', 'intRate', 'listD'],
+            grades=['A', 'B', 'C'],
+            listed_start=start,
+            listed_end=end,
+            rate_min=7.0,
+            rate_max=15.0
+        ))
+        expected = [
+            (record.id, record.grade, record.intRate, record.listD)
+            for _, record in sorted(self.records.iteritems())
+            if record.grade in ('A', 'B', 'C') and
+            start <= record.listD <= end and
+            7.0 <= record.intRate <= 15.0
+        ]
+        self.assertTrue(expected)
+        self.assertEqual(rows, expected)
+
+        record = self.records[min(self.records)]
+        rows = list(main.query.iter_loans(
+            self.db_conn,
+            columns=['subGrade', 'snapshots'],
+            sub_grades=[record.subGrade],
+            terms=[record.term],
+            states=[record.addrState]
+        ))
+        self.assertIn((record.id, record.subGrade, 3), rows)
+
+        self.assertRaises(
+            ValueError, main.query.get_query, columns=['grade', 'password']
+        )
+
+    def test_get_page(self):
+        self._record(self.batches)
+        ids = []
+        after_id = 0
+
+        while True:
+            page = main.query.get_page(
+                self.db_conn, limit=7, after_id=after_id, columns=['id']
+            )
+            if not page:
+                break
+            self.assertTrue(len(page) <= 7)
+            ids.extend(row[0] for row in page)
+            after_id = page[-1][0]
+        self.assertEqual(ids, sorted(self.records))
+
+    def test_query_cache(self):
+        self._record(self.batches[:2])
+        cache = main.query.QueryCache(self.db_conn, size=2)
+
+        page = cache.get_page(limit=5, grades=['A', 'B'])
+        self.assertEqual(cache.get_page(limit=5, grades=['A', 'B']), page)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Pages returned are copies.
+        page = cache.get_page(limit=5, grades=['A', 'B'])
+        del page[:]
+        self.assertEqual(len(cache.get_page(limit=5, grades=['A', 'B'])), 5)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+        # Least recently used pages are evicted.
+        cache.get_page(limit=5, grades=['C'])
+        cache.get_page(limit=5, grades=['D'])
+        self.assertEqual(len(cache.results), 2)
+        cache.get_page(limit=5, grades=['A', 'B'])
+        self.assertEqual((cache.hits, cache.misses), (3, 4))
+
+        # Recording a new snapshot invalidates every page.
+        cache.get_page(limit=5, columns=['snapshots'])
+        self._record(self.batches[2:])
+        cache.get_page(limit=5, columns=['snapshots'])
+        self.assertEqual((cache.hits, cache.misses), (3, 6))
+        self.assertEqual(len(cache.results), 1)
+
+        # So do writes through this connection, or any other.
+        main.database.rebuild_funding_summary(self.db_conn)
+        cache.get_page(limit=5, columns=['snapshots'])
+        self.assertEqual((cache.hits, cache.misses), (3, 7))
+
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            db_conn.execute("UPDATE loanFundingSummary SET snapshots = 1")
+        page = cache.get_page(limit=5, columns=['snapshots'])
+        self.assertEqual((cache.hits, cache.misses), (3, 8))
+        self.assertEqual(set(row[1] for row in page), set([1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+
+import benchmarks.synthetic
+import gzip
+import json
+import main.archive
+import main.database
+import main.replay
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestReplayModuleMethods(unittest.TestCase):
+    """Tests for replay module methods on a temporary database."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+
+        self.responses = []
+        for minute in xrange(3):
+            self.responses.append(json.dumps({
+                'asOfDate': "2015-01-02T01:%02d:00.000Z" % minute,
+                'loans': benchmarks.synthetic.make_loans(5, seed=minute)
+            }))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _count(self, table):
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            sql = "SELECT COUNT(*) FROM %s" % table
+            return db_conn.execute(sql, results='fetchone')[0]
+
+    def test_replay_directory(self):
+        responses = os.path.join(self.directory, "responses")
+        os.makedirs(responses)
+        for i, response in enumerate(self.responses):
+            if i % 2:
+                with gzip.open(
+                    os.path.join(responses, "%s.json.gz" % i), 'wb'
+                ) as response_file:
+                    response_file.write(response)
+            else:
+                with open(
+                    os.path.join(responses, "%s.json" % i), 'wb'
+                ) as response_file:
+                    response_file.write(response)
+
+        sources = main.replay.get_sources(responses)
+        self.assertEqual(
+            [os.path.basename(source) for source in sources],
+            ["0.json", "1.json.gz", "2.json"]
+        )
+
+        self.assertEqual(
+            main.replay.replay(
+                responses,
+                db_path=self.path,
+                workers=2,
+                transaction_size=2
+            ),
+            (3, 0)
+        )
+        self.assertEqual(self._count("rawLoanDates"), 3)
+        self.assertEqual(self._count("loansFundedAsOfDate"), 15)
+
+        # Already recorded.
+        self.assertEqual(
+            main.replay.replay(responses, db_path=self.path, workers=2),
+            (0, 3)
+        )
+
+    def test_replay_archive(self):
+        archive_path = os.path.join(self.directory, "archive")
+        with main.archive.SnapshotArchive(archive_path) as archive:
+            for response in self.responses:
+                archive.append(json.loads(response)['asOfDate'], response)
+
+        self.assertEqual(
+            main.replay.replay(archive_path, db_path=self.path, workers=2),
+            (3, 0)
+        )
+        self.assertEqual(self._count("loansFundedAsOfDate"), 15)
+
+        # Recorded dates are not even read from the archive.
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            recorded = main.database.get_recorded_dates(db_conn)
+        self.assertEqual(main.replay.get_sources(archive_path, recorded), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
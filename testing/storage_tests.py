@@ -0,0 +1,178 @@
+
+import benchmarks.synthetic
+import main.analytics
+import main.database
+import main.dates
+import main.storage
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from main.loans import LoanBatch
+
+
+class TestStorageClass(unittest.TestCase):
+    """Tests for the Storage interface."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+
+        self.snapshots = list(
+            benchmarks.synthetic.make_snapshots(20, 4, interval=3600)
+        )
+        self.batches = [
+            LoanBatch(main.dates.get_epoch(response['asOfDate']),
+                      response['loans'])
+            for response in self.snapshots
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, main.storage.Storage)
+
+    def test_get_storage(self):
+        with main.storage.get_storage(path=self.path) as storage:
+            self.assertIsInstance(storage, main.storage.SqliteStorage)
+
+    def test_record_through_interface(self):
+        with main.storage.SqliteStorage(path=self.path) as storage:
+            batches = self.batches[:2]
+            with mock.patch.object(
+                storage,
+                'add_raw_loans',
+                wraps=storage.add_raw_loans
+            ) as add_raw_loans_mock, mock.patch.object(
+                storage,
+                'add_loans_funded_as_of_date',
+                wraps=storage.add_loans_funded_as_of_date
+            ) as add_funded_mock:
+                self.assertEqual(
+                    storage.record_snapshot_batches(
+                        batches[0].asOfDate, batches[:1]
+                    ),
+                    20
+                )
+            add_raw_loans_mock.assert_called_once_with(batches[0])
+            add_funded_mock.assert_called_once_with(batches[0])
+
+            for batch in self.batches:
+                storage.record_snapshot(batch.asOfDate, batch)
+            self.assertEqual(len(storage.get_loans()), 80)
+            self.assertEqual(
+                main.analytics.FundingVelocity.from_storage(storage)
+                .get_daily_funding_scores(),
+                main.analytics.FundingVelocity.from_database(storage.db_conn)
+                .get_daily_funding_scores()
+            )
+
+
+class TestSqliteStorageClass(unittest.TestCase):
+    """Tests for SqliteStorage class on a temporary database."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            main.database.migrate(db_conn)
+        self.session = main.storage.SqliteStorage(path=self.path)
+
+        self.loans = []
+        for loan_id in (1, 2):
+            loan = mock.Mock()
+            raw_tuple = [None] * 84
+            raw_tuple[25] = loan_id
+            loan.get_raw_loans_tuple.return_value = tuple(raw_tuple)
+            loan.get_funded_tuple.return_value = ("d1", 25.0, loan_id)
+            loan.get_status_tuple.return_value = (loan_id, None, None, loan_id)
+            loan.id = loan_id
+            self.loans.append(loan)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory)
+
+    def test_stale_schema(self):
+        with main.database.SqliteDatabase(path=self.path) as db_conn:
+            db_conn.execute("PRAGMA user_version = 1")
+        self.assertRaises(
+            main.database.SchemaVersionError,
+            main.storage.SqliteStorage,
+            path=self.path
+        )
+
+    def _count(self, table):
+        sql = "SELECT COUNT(*) FROM %s" % table
+        return self.session.db_conn.execute(sql, results='fetchone')[0]
+
+    def test_record_snapshot(self):
+        self.assertEqual(self.session.record_snapshot("d1", self.loans), 2)
+        self.assertEqual(self._count("rawLoanDates"), 1)
+        self.assertEqual(self._count("rawLoans"), 2)
+        self.assertEqual(self._count("loansFundedAsOfDate"), 2)
+
+        # Already recorded.
+        self.assertEqual(self.session.record_snapshot("d1", self.loans), None)
+        self.assertEqual(self._count("loansFundedAsOfDate"), 2)
+
+    def test_record_snapshot_known_loans(self):
+        self.assertEqual(self.session.record_snapshot("d1", self.loans), 2)
+        self.loans[0].get_status_tuple.return_value = (5, u"APPROVED", 9, 1)
+        for loan in self.loans:
+            loan.get_funded_tuple.return_value = ("d2", 50.0, loan.id)
+
+        self.assertEqual(self.session.record_snapshot("d2", self.loans), 2)
+        self.assertEqual(self.session.raw_loan_tracker.ids, set([1, 2]))
+        for loan in self.loans:
+            self.assertEqual(loan.get_raw_loans_tuple.call_count, 1)
+        self.assertEqual(
+            self.session.db_conn.execute(
+                "SELECT investorCount, reviewStatus, reviewStatusD, id "
+                "FROM rawLoans ORDER BY id",
+                results='fetchall'
+            ),
+            [(5, u"APPROVED", 9, 1), (2, None, None, 2)]
+        )
+
+    def test_record_snapshot_atomic(self):
+        self.loans[1].get_funded_tuple.side_effect = Exception("Meow!")
+        self.assertRaises(
+            Exception, self.session.record_snapshot, "d1", self.loans
+        )
+        self.assertEqual(self.session.db_conn._database, None)
+
+    def test_record_snapshot_batches(self):
+        batches = iter([self.loans[:1], self.loans[1:]])
+        self.assertEqual(self.session.record_snapshot_batches("d1", batches), 2)
+        self.assertEqual(self._count("rawLoans"), 2)
+
+        # Already recorded: batches are not consumed.
+        batches = iter([self.loans])
+        self.assertEqual(self.session.record_snapshot_batches("d1", batches), None)
+        self.assertEqual(list(batches), [self.loans])
+
+    @mock.patch('config.FUNDING_CHANGES_ONLY', True)
+    def test_record_snapshot_batches_funding_changes(self):
+        batches = [self.loans[:1], self.loans[1:]]
+        self.assertEqual(self.session.record_snapshot_batches("d1", batches), 2)
+        self.assertEqual(self.session.record_snapshot_batches("d2", batches), 0)
+        self.assertEqual(
+            self.session.record_snapshot_batches("d3", batches[:1]), 1
+        )
+
+    @mock.patch('config.FUNDING_CHANGES_ONLY', True)
+    def test_record_snapshot_funding_changes(self):
+        self.assertEqual(self.session.record_snapshot("d1", self.loans), 2)
+        self.assertEqual(self.session.record_snapshot("d2", self.loans), 0)
+        self.assertEqual(self._count("loanFundingChanges"), 2)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
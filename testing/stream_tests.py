@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import json
+import main.stream
+import unittest
+
+from benchmarks.synthetic import make_response
+
+
+def _chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class TestListingStreamClass(unittest.TestCase):
+    """Unit tests for ListingStream class."""
+
+    def setUp(self):
+        self.response_json = make_response(20)
+        self.response_json['loans'][3]['desc'] = u"café ☃"
+        self.body = u'{"asOfDate": %s, "loans": %s}' % (
+            json.dumps(self.response_json['asOfDate']),
+            json.dumps(self.response_json['loans'], ensure_ascii=False)
+        )
+        self.body = self.body.encode('utf-8')
+
+    def test_iter_loans(self):
+        for size in (7, 64, len(self.body)):
+            listing = main.stream.ListingStream(_chunked(self.body, size))
+            self.assertEqual(listing.asOfDate, self.response_json['asOfDate'])
+            self.assertEqual(
+                list(listing.iter_loans()), self.response_json['loans']
+            )
+            self.assertEqual(listing.bytes_read, len(self.body))
+
+    def test_iter_chunks(self):
+        listing = main.stream.ListingStream(_chunked(self.body, 100))
+        chunks = list(listing.iter_chunks(8))
+        self.assertEqual([len(chunk) for chunk in chunks], [8, 8, 4])
+        self.assertEqual(chunks[2], self.response_json['loans'][16:])
+
+    def test_lazy(self):
+        chunks = iter(_chunked(self.body, 100))
+        listing = main.stream.ListingStream(chunks)
+        self.assertEqual(listing.asOfDate, self.response_json['asOfDate'])
+        self.assertTrue(len(list(chunks)) > 0)  # Loans not yet read.
+
+    def test_loans_before_as_of_date(self):
+        body = '{"loans": [{"a": 1}, {"a": 2}], "x": 12345, "asOfDate": "d"}'
+        for size in (1, 3, len(body)):
+            listing = main.stream.ListingStream(_chunked(body, size))
+            self.assertEqual(listing.asOfDate, "d")
+            self.assertEqual(list(listing.iter_loans()), [{"a": 1}, {"a": 2}])
+
+    def test_empty(self):
+        listing = main.stream.ListingStream(['{"asOfDate": "d", "loans": [ ]}'])
+        self.assertEqual(list(listing.iter_loans()), [])
+
+    def test_invalid(self):
+        self.assertRaises(
+            ValueError, main.stream.ListingStream, ['{"loans": []}']
+        )
+        self.assertRaises(
+            ValueError, main.stream.ListingStream, ['{"asOfDate": "d", ']
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()